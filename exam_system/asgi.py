@@ -4,5 +4,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'exam_system.settings')
 
-# Это и есть ваше ASGI-приложение, которое нужно передать Uvicorn
-application = get_asgi_application()
\ No newline at end of file
+# HTTP-приложение Django (инициализирует настройки и приложения)
+django_application = get_asgi_application()
+
+from exams.consumers import exam_websocket  # noqa: E402  (после django.setup)
+
+
+async def application(scope, receive, send):
+    """Это и есть ваше ASGI-приложение, которое нужно передать Uvicorn: HTTP — в Django, WebSocket — в канал экзамена"""
+    if scope['type'] == 'websocket':
+        return await exam_websocket(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -0,0 +1,43 @@
+# cache.py
+"""
+Общий для всех воркеров кэш на одной машине: DatabaseCache в отдельной SQLite-базе (алиас 'cache'
+в DATABASES, таблицу туда направляет db_router.CacheRouter).
+
+LocMemCache у каждого процесса свой: карточки вопросов рендерились бы в каждом воркере заново,
+а очередь допуска (exams/admission.py) считала бы студентов отдельно в каждом процессе.
+База кэша в режиме WAL: чтения не ждут записей. Пишущие транзакции IMMEDIATE сразу берут замок базы,
+поэтому add (замок очереди допуска) атомарен между процессами, а incr (номера очереди, версия
+расписания) выполняется в одной транзакции с чтением.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import BaseDatabaseCache, DatabaseCache
+from django.core.management import call_command
+from django.db import router, transaction
+
+
+class SharedDatabaseCache(DatabaseCache):
+
+    def _write_db(self):
+        return router.db_for_write(self.cache_model_class)
+
+    def incr(self, key, delta=1, version=None):
+        # В DatabaseCache incr — это get и set: без общей транзакции два процесса получили бы одно значение
+        with transaction.atomic(using=self._write_db()):
+            return super().incr(key, delta, version)
+
+    def set_many(self, data, timeout=None, version=None):
+        # Карточки вопросов страницы — одной транзакцией, а не отдельной на каждый ключ
+        with transaction.atomic(using=self._write_db()):
+            return super().set_many(data, timeout, version)
+
+
+def create_cache_tables():
+    """Таблицы кэшей на базе данных — каждая в базе, куда ее направляет роутер; существующие не меняются"""
+    for alias in settings.CACHES:
+        backend = caches[alias]
+        if isinstance(backend, BaseDatabaseCache):
+            call_command(
+                'createcachetable', backend._table,
+                database=router.db_for_write(backend.cache_model_class), verbosity=0,
+            )
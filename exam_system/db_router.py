@@ -0,0 +1,144 @@
+# db_router.py
+"""
+Маршрутизация чтения на реплику (алиас 'replica' в DATABASES).
+
+На реплику уходят только чтения моделей exams в помеченных запросах: страницы результатов
+(декоратор replica_reads) и GET-запросы админки (ReplicaMiddleware). Прохождение экзамена,
+сессии и пользователи всегда читаются с основной базы, все записи идут в основную базу.
+После собственной записи клиент на REPLICA_STICKY_SECONDS закрепляется за основной базой
+(cookie), чтобы сразу видеть свои изменения несмотря на отставание реплики.
+
+Таблица общего кэша (exam_system/cache.py) живет в отдельной базе 'cache' (CacheRouter).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.urls import reverse
+
+REPLICA = 'replica'
+CACHE = 'cache'
+CACHE_APP = 'django_cache'  # app_label модели таблицы DatabaseCache
+REPLICA_APPS = {'exams'}
+STICKY_COOKIE = 'primary_sticky'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_read_db = ContextVar('read_db', default=None)
+
+
+def replica_enabled():
+    return REPLICA in settings.DATABASES
+
+
+def sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+
+
+@contextmanager
+def read_from_replica():
+    """Чтения моделей exams внутри блока идут на реплику (если она настроена)"""
+    token = _read_db.set(REPLICA if replica_enabled() else None)
+    try:
+        yield
+    finally:
+        _read_db.reset(token)
+
+
+@contextmanager
+def read_from_primary():
+    """Принудительное чтение с основной базы внутри блока на реплике"""
+    token = _read_db.set(None)
+    try:
+        yield
+    finally:
+        _read_db.reset(token)
+
+
+def stick_to_primary(request):
+    """Отмечает запрос, который писал в базу, хотя метод безопасный (например, начало экзамена)"""
+    request.wrote_to_primary = True
+
+
+def can_use_replica(request):
+    return (
+        replica_enabled()
+        and request.method in SAFE_METHODS
+        and not request.COOKIES.get(STICKY_COOKIE)
+    )
+
+
+def replica_reads(view_func):
+    """Декоратор для отчетных представлений: читают с реплики, если клиент не писал только что"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not can_use_replica(request):
+            return view_func(request, *args, **kwargs)
+        with read_from_replica():
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaMiddleware:
+    """GET-запросы админки читают с реплики; после записи ставит cookie закрепления за основной базой"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if can_use_replica(request) and request.path.startswith(reverse('admin:index')):
+            with read_from_replica():
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+
+        if replica_enabled() and (request.method not in SAFE_METHODS or getattr(request, 'wrote_to_primary', False)):
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=sticky_seconds(), httponly=True, samesite='Lax'
+            )
+        return response
+
+
+class ReplicaRouter:
+    """Чтения exams — на реплику в помеченных запросах, иначе и все записи — в основную базу"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in REPLICA_APPS:
+            return _read_db.get() or 'default'
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Явно: иначе объект, прочитанный с реплики, сохранялся бы в нее же
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', REPLICA}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплики приходит из основной базы через репликацию
+        if db == REPLICA:
+            return False
+        return None
+
+
+class CacheRouter:
+    """Таблица DatabaseCache — в базе 'cache' (если она настроена), других моделей там нет"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == CACHE_APP and CACHE in settings.DATABASES:
+            return CACHE
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if CACHE not in settings.DATABASES:
+            return None
+        if app_label == CACHE_APP:
+            return db == CACHE
+        if db == CACHE:
+            return False
+        return None
@@ -0,0 +1,98 @@
+# logs.py
+"""
+Неблокирующая запись логов (LOGGING в settings.py).
+
+Поток запроса только кладет запись в очередь (QueueFileHandler), в файл ее пишет фоновый поток
+QueueListener: JSON-строка на запись, ротация по размеру (RotatingFileHandler). Поля из extra
+(event, attempt, exam, student и т.д.) попадают в JSON как есть, значения без JSON-представления — строкой.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Атрибуты самой LogRecord: все остальное в __dict__ записи пришло из extra
+RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна JSON-строка: время (UTC), уровень, логгер, сообщение, поля extra, исключение"""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRS)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class QueueFileHandler(QueueHandler):
+    """
+    Обработчик для dictConfig: записи уходят в очередь без ограничения размера, файл с ротацией
+    пишет фоновый поток. Недописанные записи сбрасываются при выходе; после fork (воркеры сервера)
+    у дочернего процесса своя очередь и свой поток.
+    """
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, backup_count=5):
+        super().__init__(queue.SimpleQueue())
+        self.file_handler = RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+        )
+        self.file_handler.setFormatter(JsonFormatter())
+        self.listener = QueueListener(self.queue, self.file_handler, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.stop_listener)
+        # На время fork файл не пишется: дочерний процесс не унаследует недописанный буфер и занятый замок
+        os.register_at_fork(
+            before=self.file_handler.acquire,
+            after_in_parent=self.file_handler.release,
+            after_in_child=self.restart_listener,
+        )
+
+    def restart_listener(self):
+        # Поток родителя в дочерний процесс не переходит, а записи в скопированной очереди родитель допишет сам;
+        # замок обработчика logging пересоздает сам, файл дочерний процесс откроет заново
+        stream, self.file_handler.stream = self.file_handler.stream, None
+        if stream is not None:
+            stream.close()
+        self.queue = self.listener.queue = queue.SimpleQueue()
+        self.listener._thread = None
+        self.listener.start()
+
+    def stop_listener(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def prepare(self, record):
+        """
+        В потоке запроса — только подстановка аргументов и текст исключения (объекты traceback
+        не должны жить в очереди); JSON собирается в фоновом потоке
+        """
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def setFormatter(self, fmt):
+        # Формат задается файлу: JsonFormatter по умолчанию или formatter из LOGGING
+        self.file_handler.setFormatter(fmt)
+
+    def close(self):
+        self.stop_listener()
+        self.file_handler.close()
+        super().close()
@@ -25,6 +25,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'exam_system.db_router.ReplicaMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -53,9 +54,29 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # WAL: чтения не блокируют запись ответов; IMMEDIATE: пишущая транзакция сразу берет замок
+        # и ждет его до timeout, а не падает с "database is locked" посреди транзакции при наплыве стартов
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
+# Общий кэш воркеров (exam_system/cache.py): отдельный файл, чтобы запись кэша не ждала замка основной базы.
+# Таблица кэша создается после migrate и при старте gunicorn (exam_system/cache.create_cache_tables)
+DATABASES['cache'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': BASE_DIR / 'cache.sqlite3',
+    'CONN_MAX_AGE': None,
+    'OPTIONS': {
+        'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 20,
+    },
+}
+
 # Для продакшена - PostgreSQL (закомментировано)
 # DATABASES = {
 #     'default': {
@@ -68,6 +89,41 @@ DATABASES = {
 #     }
 # }
 
+# Реплика только для чтения: страницы результатов и админка (см. exam_system/db_router.py).
+# Локально можно открыть ту же SQLite-базу только на чтение:
+#   DB_REPLICA_NAME="file:/path/to/db.sqlite3?mode=ro"
+# Для PostgreSQL задаются DB_REPLICA_ENGINE=django.db.backends.postgresql и DB_REPLICA_HOST и т.д.
+if os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': os.environ.get('DB_REPLICA_ENGINE', DATABASES['default']['ENGINE']),
+        'NAME': os.environ['DB_REPLICA_NAME'],
+        'USER': os.environ.get('DB_REPLICA_USER', ''),
+        'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', ''),
+        'HOST': os.environ.get('DB_REPLICA_HOST', ''),
+        'PORT': os.environ.get('DB_REPLICA_PORT', ''),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['exam_system.db_router.CacheRouter', 'exam_system.db_router.ReplicaRouter']
+
+# Сколько секунд после записи клиент читает с основной базы (read-your-writes)
+REPLICA_STICKY_SECONDS = 5
+
+# Кэш (карточки вопросов и другие фрагменты страниц экзамена, очередь допуска) — общий для всех
+# воркеров на машине: таблица exam_cache в базе 'cache'
+CACHES = {
+    'default': {
+        'BACKEND': 'exam_system.cache.SharedDatabaseCache',
+        'LOCATION': 'exam_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    }
+}
+
+# Карточки вопросов версионируются, поэтому могут жить долго
+QUESTION_CARD_CACHE_TIMEOUT = 60 * 60 * 24  # секунд
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -110,15 +166,55 @@ SESSION_SAVE_EVERY_REQUEST = True
 # Настройки для автосохранения
 AUTOSAVE_INTERVAL = 30  # секунд
 
-# Логирование
+# Сколько секунд процесс держит свою копию состояния попытки для проверки сохранений (exams/attempt_state.py)
+ATTEMPT_STATE_LOCAL_SECONDS = 5
+
+# Как часто сервер присылает оставшееся время по WebSocket
+EXAM_WS_TIMER_INTERVAL = 15  # секунд
+
+# Размер страницы истории результатов студента
+RESULTS_PER_PAGE = 20
+
+# Сколько браузер может держать страницу завершенного результата без перепроверки
+RESULT_PAGE_MAX_AGE = 300  # секунд
+
+# Минимальный процент для зачета (статистика экзаменов)
+EXAM_PASS_PERCENTAGE = 60
+
+# Через сколько дней после завершения ответы попытки переносятся в архив (manage.py archive_attempts)
+EXAM_ARCHIVE_AFTER_DAYS = 180
+
+# Допуск к началу экзамена (exams/admission.py): сколько попыток в секунду создается по одному
+# экзамену, сколько может начаться разом без очереди и как часто страница ожидания спрашивает очередь.
+# EXAM_ADMISSION_RATE = 0 — без ограничения
+EXAM_ADMISSION_RATE = 10
+EXAM_ADMISSION_BURST = 20
+EXAM_ADMISSION_POLL_SECONDS = 3
+
+# Процессов пула для ведомостей результатов (exams/reports.py); None — по числу ядер, но не больше 4
+EXAM_REPORT_WORKERS = None
+
+# Бюджет запуска воркера (manage.py bench_startup): время импорта приложения с URLconf и пиковая память.
+# Тяжелые библиотеки импорта/экспорта грузятся только при первом обращении (exams/excel.py)
+WORKER_IMPORT_BUDGET_MS = 600
+WORKER_RSS_BUDGET_MB = 64
+WORKER_LAZY_MODULES = ['pandas', 'numpy', 'openpyxl']
+
+# Логирование: поток запроса только ставит запись в очередь, JSON-строки в файл с ротацией
+# пишет фоновый поток (exam_system/logs.py). События экзамена — поле event (start, save, finish,
+# expire, import) с id попытки в attempt. Файл — EXAM_LOG_FILE или exam_system.log в корне проекта;
+# тесты в него не пишут (exam_system/test_runner.py)
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': 'exam_system.log',
+            # Фабрикой, а не 'class': подклассы QueueHandler dictConfig настраивает по-своему
+            '()': 'exam_system.logs.QueueFileHandler',
+            'filename': os.environ.get('EXAM_LOG_FILE', BASE_DIR / 'exam_system.log'),
+            'max_bytes': 10 * 1024 * 1024,
+            'backup_count': 5,
         },
     },
     'loggers': {
@@ -130,6 +226,8 @@ LOGGING = {
     },
 }
 
+TEST_RUNNER = 'exam_system.test_runner.TestRunner'
+
 # Security settings for production
 if not DEBUG:
     SECURE_BROWSER_XSS_FILTER = True
@@ -0,0 +1,21 @@
+# test_runner.py
+"""
+Запуск тестов (TEST_RUNNER в settings.py): логи приложения во время тестов не пишутся в файл проекта.
+"""
+import copy
+import logging.config
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        # Те же логгеры и уровни, но файловые обработчики заменены пустыми: записи проходят, файл не растет
+        config = copy.deepcopy(settings.LOGGING)
+        handlers = config.get('handlers', {})
+        for name, handler in handlers.items():
+            if 'filename' in handler:
+                handlers[name] = {'class': 'logging.NullHandler'}
+        logging.config.dictConfig(config)
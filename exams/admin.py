@@ -1,11 +1,48 @@
 # admin.py
 from django.contrib import admin
 from django.urls import path
-from django.shortcuts import redirect
+from django.shortcuts import redirect, render
 from django.utils.html import format_html
 from django.urls import reverse
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.utils.text import smart_split, unescape_string_literal
 from .models import *
-from .views import import_students_view
+from .pagination import KeysetChangeList, with_percentage
+from . import search
+from .enrollment import enroll_students
+from .regrade import diff_rows, exams_with_questions, regrade
+from .views import (
+    enroll_students_view, grading_question_view, grading_queue_view, import_students_view, result_reports_response,
+)
+
+REGRADE_PREVIEW_ROWS = 50
+
+def regrade_action(model_admin, request, exams, question_ids=None):
+    """
+    Перепроверка экзаменов из действия админки: первый шаг — пробный прогон с разницей на промежуточной
+    странице, второй — запись
+    """
+    if 'apply' not in request.POST:
+        report = regrade(exams, question_ids, dry_run=True)
+        return render(request, 'admin/exams/regrade.html', {
+            **model_admin.admin_site.each_context(request),
+            'title': 'Перепроверка ответов',
+            'opts': model_admin.model._meta,
+            'report': [
+                (exam, diff['answers'], len(diff['results']), diff_rows(diff, REGRADE_PREVIEW_ROWS))
+                for exam, diff in report
+            ],
+            'preview_rows': REGRADE_PREVIEW_ROWS,
+            'action': request.POST['action'],
+            'selected': request.POST.getlist(admin.helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+        })
+    report = regrade(exams, question_ids)
+    model_admin.message_user(
+        request,
+        f'Перепроверено экзаменов: {len(report)}, изменено ответов: {sum(diff["answers"] for _, diff in report)}, '
+        f'попыток: {sum(len(diff["results"]) for _, diff in report)}',
+    )
 
 class StudentAdmin(admin.ModelAdmin):
     list_display = ['student_id', 'last_name', 'first_name', 'group', 'email', 'is_active', 'created_at']
@@ -24,12 +61,31 @@ class StudentAdmin(admin.ModelAdmin):
         }),
     )
     
+    actions = ['enroll_to_course']
+    
     def get_urls(self):
         urls = super().get_urls()
         custom_urls = [
             path('import-students/', import_students_view, name='import_students'),
         ]
         return custom_urls + urls
+    
+    def enroll_to_course(self, request, queryset):
+        # Первый шаг — выбор курса на промежуточной странице, второй — запись
+        course = Course.objects.filter(pk=request.POST.get('course') or None).first()
+        if 'apply' not in request.POST or course is None:
+            return render(request, 'admin/exams/student/enroll_to_course.html', {
+                **self.admin_site.each_context(request),
+                'title': 'Запись студентов на курс',
+                'opts': self.model._meta,
+                'courses': Course.objects.order_by('name'),
+                'students_count': queryset.count(),
+                'selected': request.POST.getlist(admin.helpers.ACTION_CHECKBOX_NAME),
+                'select_across': request.POST.get('select_across', '0'),
+            })
+        created = enroll_students(course, queryset.values_list('id', flat=True))
+        self.message_user(request, f'На курс «{course.name}» записано новых студентов: {created}')
+    enroll_to_course.short_description = 'Записать выбранных студентов на курс'
 
 class CourseStudentInline(admin.TabularInline):
     model = CourseStudent
@@ -43,6 +99,14 @@ class CourseAdmin(admin.ModelAdmin):
     list_display = ['name', 'students_count', 'subjects_count', 'created_at']
     search_fields = ['name', 'description']
     inlines = [SubjectInline, CourseStudentInline]
+    change_form_template = 'admin/exams/course/change_form.html'
+    
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('<int:course_id>/enroll/', enroll_students_view, name='exams_course_enroll'),
+        ]
+        return custom_urls + urls
     
     def students_count(self, obj):
         return obj.coursestudent_set.count()
@@ -52,6 +116,50 @@ class CourseAdmin(admin.ModelAdmin):
         return obj.subjects.count()
     subjects_count.short_description = 'Количество предметов'
 
+def field_search(fields, search_term):
+    """Условие обычного поиска админки (icontains) по полям fields"""
+    lookups = [f'{field}__icontains' for field in fields]
+    condition = Q()
+    for bit in smart_split(search_term):
+        if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+            bit = unescape_string_literal(bit)
+        condition &= Q.create([(lookup, bit) for lookup in lookups], connector=Q.OR)
+    return condition
+
+class FullTextSearchMixin:
+    """
+    Поиск по полнотекстовому индексу (exams/search.py) с сортировкой по релевантности.
+    Остальные поля search_fields — поля связанной модели ('subject__name'): сначала находятся id
+    связанных записей (текст вопроса — тоже по индексу, остальное — в небольшой связанной таблице),
+    затем записи списка с этими id по индексу внешнего ключа. LIKE по самой таблице списка не выполняется.
+    """
+    search_kind = None
+    search_indexed_fields = ['text_md', 'text']
+    
+    def related_search(self, queryset, field, search_term):
+        relation, name = field.split('__', 1)
+        foreign_key = self.opts.get_field(relation)
+        model = foreign_key.related_model
+        ids = search.question_text_ids(search_term, queryset.db) if model is Question and name == 'text_md' else None
+        if ids is None:
+            ids = list(model._default_manager.using(queryset.db).filter(
+                field_search([name], search_term)
+            ).values_list('pk', flat=True))
+        return Q(**{f'{foreign_key.attname}__in': ids})
+    
+    def get_search_results(self, request, queryset, search_term):
+        found = search.matches(queryset, self.search_kind, search_term)
+        if found is None:
+            return super().get_search_results(request, queryset, search_term)
+        condition, rank = found
+        for field in self.get_search_fields(request):
+            if field not in self.search_indexed_fields:
+                condition |= self.related_search(queryset, field, search_term)
+        return queryset.filter(condition).annotate(search_rank=rank), False
+    
+    def get_changelist(self, request, **kwargs):
+        return search.RankedChangeList
+
 class QuestionInline(admin.TabularInline):
     model = Question
     extra = 0
@@ -74,14 +182,31 @@ class SubjectAdmin(admin.ModelAdmin):
         return f"Л:{easy} С:{medium} Т:{hard}"
     get_difficulty_distribution.short_description = 'Легких:Средних:Тяжелых'
 
+class DuplicateClusterFilter(admin.SimpleListFilter):
+    """Группы почти одинаковых вопросов (manage.py find_duplicate_questions)"""
+    title = 'Дубликаты'
+    parameter_name = 'duplicate_cluster'
+    
+    def lookups(self, request, model_admin):
+        return [('any', 'Есть похожие вопросы')]
+    
+    def queryset(self, request, queryset):
+        if self.value() == 'any':
+            return queryset.filter(signature__cluster__isnull=False)
+        if self.value() and self.value().isdigit():
+            return queryset.filter(signature__cluster=int(self.value()))
+        return queryset
+
 class AnswerInline(admin.TabularInline):
     model = Answer
     extra = 2
     fields = ['text_md', 'is_correct']
 
-class QuestionAdmin(admin.ModelAdmin):
-    list_display = ['preview_text', 'subject', 'difficulty', 'question_type', 'answers_count', 'correct_answers_count']
-    list_filter = ['difficulty', 'question_type', 'subject', 'subject__course']
+class QuestionAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    search_kind = 'question'
+    list_display = ['preview_text', 'subject', 'difficulty', 'question_type', 'answers_count', 'correct_answers_count',
+                    'duplicate_cluster']
+    list_filter = ['difficulty', 'question_type', DuplicateClusterFilter, 'subject', 'subject__course']
     search_fields = ['text_md', 'text', 'subject__name']
     inlines = [AnswerInline]
     
@@ -95,24 +220,56 @@ class QuestionAdmin(admin.ModelAdmin):
         }),
     )
     
+    show_full_result_count = False
+    actions = ['regrade_answers']
+    
+    def regrade_answers(self, request, queryset):
+        question_ids = list(queryset.values_list('id', flat=True))
+        return regrade_action(self, request, exams_with_questions(question_ids), question_ids)
+    regrade_answers.short_description = 'Перепроверить ответы на выбранные вопросы'
+    
+    def get_queryset(self, request):
+        # Подзапросы считаются только для строк страницы, без GROUP BY по всему банку
+        answers = Answer.objects.filter(question=OuterRef('pk')).values('question')
+        return super().get_queryset(request).select_related('subject__course', 'signature').annotate(
+            answers_total=Subquery(answers.annotate(count=Count('id')).values('count')),
+            correct_total=Subquery(answers.filter(is_correct=True).annotate(count=Count('id')).values('count')),
+        )
+    
     def preview_text(self, obj):
         text = obj.text_md or obj.text or "Без текста"
         return text[:100] + "..." if len(text) > 100 else text
     preview_text.short_description = 'Текст вопроса'
     
     def answers_count(self, obj):
-        return obj.answers.count()
+        return obj.answers_total or 0
     answers_count.short_description = 'Всего ответов'
     
     def correct_answers_count(self, obj):
-        return obj.answers.filter(is_correct=True).count()
+        return obj.correct_total or 0
     correct_answers_count.short_description = 'Правильных'
+    
+    def duplicate_cluster(self, obj):
+        signature = getattr(obj, 'signature', None)
+        if signature is None or signature.cluster is None:
+            return '-'
+        return format_html(
+            '<a href="?duplicate_cluster={}">Группа #{}</a> ({})',
+            signature.cluster, signature.cluster, f'{signature.similarity:.0%}',
+        )
+    duplicate_cluster.short_description = 'Похожие вопросы'
+    duplicate_cluster.admin_order_field = 'signature__cluster'
 
-class AnswerAdmin(admin.ModelAdmin):
+class AnswerAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    search_kind = 'answer'
+    show_full_result_count = False
     list_display = ['preview_text', 'question_preview', 'is_correct']
     list_filter = ['is_correct', 'question__subject', 'question__difficulty']
     search_fields = ['text_md', 'text', 'question__text_md']
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('question')
+    
     def preview_text(self, obj):
         text = obj.text_md or obj.text or "Без текста"
         return text[:50] + "..." if len(text) > 50 else text
@@ -134,6 +291,17 @@ class ExamAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description', 'course__name']
     date_hierarchy = 'open_time'
     inlines = [ExamSubjectInline]
+    actions = ['regrade_results', 'download_reports']
+    
+    def regrade_results(self, request, queryset):
+        return regrade_action(self, request, queryset)
+    regrade_results.short_description = 'Перепроверить ответы и пересчитать баллы'
+    
+    def download_reports(self, request, queryset):
+        exams = list(queryset)
+        filename = f'Ведомости {exams[0].name}.zip' if len(exams) == 1 else 'Ведомости.zip'
+        return result_reports_response(request, ExamResult.objects.filter(exam__in=exams), filename)
+    download_reports.short_description = 'Скачать ведомости студентов (ZIP)'
     
     def is_active(self, obj):
         if obj.is_open():
@@ -151,21 +319,56 @@ class StudentAnswerInline(admin.TabularInline):
     fields = ['question', 'is_correct', 'points_earned', 'answered_at']
 
 class ExamResultAdmin(admin.ModelAdmin):
-    list_display = ['student', 'exam', 'status', 'score', 'max_score', 'percentage_score', 'start_time', 'attempt_number']
-    list_filter = ['status', 'exam', 'exam__course', 'start_time']
+    list_display = ['student', 'exam', 'status', 'score', 'max_score', 'percentage', 'start_time', 'attempt']
+    list_filter = [
+        'status', 'exam', 'exam__course', 'student__group', 'start_time', ('archived_at', admin.EmptyFieldListFilter),
+    ]
     search_fields = ['student__first_name', 'student__last_name', 'student__student_id', 'exam__name']
-    readonly_fields = ['percentage_score', 'attempt_number']
-    date_hierarchy = 'start_time'
+    readonly_fields = ['percentage_score', 'attempt_number', 'archived_at', 'seed', 'bank_snapshot']
     inlines = [StudentAnswerInline]
+    actions = ['download_reports']
+    # Keyset-пагинация по (start_time, id): без COUNT(*) и OFFSET, сортировка фиксирована
+    ordering = ['-start_time', '-id']
+    sortable_by = ()
+    show_full_result_count = False
+    change_list_template = 'admin/exams/examresult/change_list.html'
+    
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+    
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('grading/', grading_queue_view, name='exams_grading_queue'),
+            path('grading/<int:question_id>/', grading_question_view, name='exams_grading_question'),
+        ]
+        return custom_urls + urls
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('student', 'exam')
+        queryset = super().get_queryset(request).select_related('student', 'exam__course')
+        attempts = ExamResult.objects.filter(
+            exam=OuterRef('exam'), student=OuterRef('student'), id__lte=OuterRef('id')
+        ).values('exam').annotate(count=Count('id')).values('count')
+        return with_percentage(queryset).annotate(attempt=Subquery(attempts))
+    
+    def percentage(self, obj):
+        return obj.percentage
+    percentage.short_description = 'Результат %'
+    
+    def attempt(self, obj):
+        return obj.attempt
+    attempt.short_description = 'Попытка №'
+    
+    def download_reports(self, request, queryset):
+        # Выборка целиком (в том числе «выбрать все» по фильтру группы или экзамена), без аннотаций списка
+        return result_reports_response(request, ExamResult.objects.filter(pk__in=queryset.values('pk')), 'Ведомости.zip')
+    download_reports.short_description = 'Скачать ведомости выбранных результатов (ZIP)'
 
 class StudentAnswerAdmin(admin.ModelAdmin):
     list_display = ['student_name', 'exam_name', 'question_preview', 'is_correct', 'points_earned', 'answered_at']
     list_filter = ['is_correct', 'exam_result__exam', 'question__difficulty', 'answered_at']
     search_fields = ['exam_result__student__first_name', 'exam_result__student__last_name', 'question__text_md']
-    readonly_fields = ['answered_at']
+    readonly_fields = ['selected_display', 'answered_at', 'graded_by', 'graded_at']
     
     def student_name(self, obj):
         return obj.exam_result.student.full_name
@@ -179,6 +382,34 @@ class StudentAnswerAdmin(admin.ModelAdmin):
         text = obj.question.text_md or obj.question.text or "Без текста"
         return text[:50] + "..." if len(text) > 50 else text
     question_preview.short_description = 'Вопрос'
+    
+    def selected_display(self, obj):
+        texts = [
+            (answer.text_md or answer.text or "Без текста")[:50]
+            for answer in obj.question.answers.all() if answer.id in obj.selected_ids
+        ]
+        return '; '.join(texts) or '—'
+    selected_display.short_description = 'Выбранные варианты'
+
+class ExamStatsAdmin(admin.ModelAdmin):
+    list_display = ['exam', 'subject_name', 'results_count', 'average_score', 'std_deviation', 'average_percentage', 'pass_rate', 'histogram_display', 'updated_at']
+    list_filter = ['exam__course', 'exam']
+    search_fields = ['exam__name', 'subject__name']
+    readonly_fields = ['exam', 'subject', 'results_count', 'passed_count', 'score_sum', 'score_sq_sum', 'max_score_sum', 'histogram', 'updated_at']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('exam__course', 'subject')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def subject_name(self, obj):
+        return obj.subject.name if obj.subject else 'Итого'
+    subject_name.short_description = 'Предмет'
+    
+    def histogram_display(self, obj):
+        return ' '.join(str(count) for count in obj.histogram)
+    histogram_display.short_description = 'Распределение по 10%'
 
 class StudentImportAdmin(admin.ModelAdmin):
     list_display = ['imported_at', 'imported_by', 'students_count', 'success', 'short_error']
@@ -200,6 +431,7 @@ admin.site.register(Answer, AnswerAdmin)
 admin.site.register(Exam, ExamAdmin)
 admin.site.register(ExamResult, ExamResultAdmin)
 admin.site.register(StudentAnswer, StudentAnswerAdmin)
+admin.site.register(ExamStats, ExamStatsAdmin)
 admin.site.register(StudentImport, StudentImportAdmin)
 
 # Настройки админки
@@ -0,0 +1,171 @@
+# admission.py
+"""
+Допуск к началу экзамена: очередь ожидания с ограничением скорости создания попыток.
+
+Студент, начинающий экзамен, получает номер в очереди экзамена. Граница допуска продвигается маркерным
+ведром (token bucket). Маркеры копятся со скоростью EXAM_ADMISSION_RATE в секунду, но не больше
+EXAM_ADMISSION_BURST, и каждый маркер пропускает следующий номер очереди. Без наплыва студент
+проходит сразу. В час пик он ждет на странице waiting_room, которая опрашивает admission_status.
+Номер очереди для опросов передается подписанным, поэтому опрос не читает и не сохраняет сессию
+и не обращается к базе.
+
+Через допуск проходит только создание попытки. save_answer и остальные запросы начатых попыток
+его не касаются, а число записей стартов в секунду ограничено, поэтому волна стартов не вытесняет
+сохранение ответов.
+
+Состояние хранится в кэше по умолчанию: с LocMemCache — отдельно в каждом процессе, с общим кэшем —
+одно на все процессы. Изменение ведра защищено коротким замком через cache.add.
+"""
+import math
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+STATE_TIMEOUT = 60 * 60 * 6  # очередь живет не дольше экзаменационного дня
+LOCK_TIMEOUT = 2  # секунд: замок не переживет упавший процесс
+LOCK_ATTEMPTS = 20
+LOCK_WAIT = 0.005  # секунд между попытками взять замок
+MAX_POLL_SECONDS = 30
+TOKEN_SALT = 'exams.admission'
+
+ADMITTED = {'admitted': True, 'position': 0, 'wait_seconds': 0, 'retry_after': 0}
+
+
+def rate():
+    """Попыток в секунду на экзамен; 0 — без ограничения"""
+    return getattr(settings, 'EXAM_ADMISSION_RATE', 0)
+
+
+def burst():
+    return max(getattr(settings, 'EXAM_ADMISSION_BURST', 1), 1)
+
+
+def poll_seconds():
+    return getattr(settings, 'EXAM_ADMISSION_POLL_SECONDS', 3)
+
+
+def session_key(exam_id):
+    return f'admission_ticket_{exam_id}'
+
+
+def _tickets_key(exam_id):
+    return f'admission:{exam_id}:tickets'
+
+
+def _state_key(exam_id):
+    return f'admission:{exam_id}:state'
+
+
+@contextmanager
+def _locked(exam_id):
+    """Замок на ведро экзамена; отдает False, если взять его не удалось"""
+    key = f'admission:{exam_id}:lock'
+    for _ in range(LOCK_ATTEMPTS):
+        if cache.add(key, 1, LOCK_TIMEOUT):
+            try:
+                yield True
+            finally:
+                cache.delete(key)
+            return
+        time.sleep(LOCK_WAIT)
+    yield False
+
+
+def take_ticket(exam_id):
+    """Следующий номер в очереди экзамена"""
+    key = _tickets_key(exam_id)
+    cache.add(key, 0, STATE_TIMEOUT)
+    try:
+        return cache.incr(key)
+    except ValueError:  # ключ вытеснен между add и incr
+        cache.set(key, 1, STATE_TIMEOUT)
+        return 1
+
+
+def issued_tickets(exam_id):
+    return cache.get(_tickets_key(exam_id), 0)
+
+
+def admitted_until(exam_id):
+    """
+    Продвигает границу допуска на накопившиеся маркеры; возвращает наибольший допущенный номер
+    или None, если ведро занято другим запросом.
+    """
+    with _locked(exam_id) as locked:
+        if not locked:
+            return None
+        now = time.time()  # общие для процессов часы
+        state = cache.get(_state_key(exam_id)) or {'tokens': float(burst()), 'updated': now, 'admitted': 0}
+        tokens = min(float(burst()), state['tokens'] + (now - state['updated']) * rate())
+        waiting = issued_tickets(exam_id) - state['admitted']
+        granted = max(min(int(tokens), waiting), 0)
+        state = {'tokens': tokens - granted, 'updated': now, 'admitted': state['admitted'] + granted}
+        cache.set(_state_key(exam_id), state, STATE_TIMEOUT)
+        return state['admitted']
+
+
+def status(ticket, exam_id):
+    """{'admitted', 'position', 'wait_seconds'} для номера очереди"""
+    admitted = (cache.get(_state_key(exam_id)) or {}).get('admitted', 0)
+    if ticket > admitted:  # уже допущенному номеру ведро трогать не нужно
+        # Если ведро занято другим запросом — позиция по последнему известному состоянию
+        admitted = admitted_until(exam_id) or admitted
+    if ticket <= admitted:
+        return dict(ADMITTED)
+    position = max(ticket - admitted, 1)
+    wait_seconds = math.ceil(position / rate()) if rate() else 0
+    return {
+        'admitted': False,
+        'position': position,
+        'wait_seconds': wait_seconds,
+        # Дальние в очереди спрашивают реже: опросы не должны сами создавать наплыв
+        'retry_after': min(max(wait_seconds // 2, poll_seconds()), MAX_POLL_SECONDS),
+    }
+
+
+def admit(request, exam_id):
+    """
+    Можно ли создать попытку сейчас. Номер очереди хранится в сессии до release(),
+    поэтому повторные запросы студента не ставят его в конец очереди.
+    """
+    if not rate():
+        return True
+    ticket = request.session.get(session_key(exam_id))
+    if ticket is None or ticket > issued_tickets(exam_id):  # нет номера или очередь сброшена
+        ticket = take_ticket(exam_id)
+        request.session[session_key(exam_id)] = ticket
+    return status(ticket, exam_id)['admitted']
+
+
+def request_status(request, exam_id):
+    """Состояние очереди для страницы ожидания; без номера — допуск (номер выдаст start_exam)"""
+    return ticket_status(exam_id, request.session.get(session_key(exam_id)))
+
+
+def ticket_status(exam_id, ticket):
+    if not rate() or ticket is None or ticket > issued_tickets(exam_id):
+        return dict(ADMITTED)
+    return status(ticket, exam_id)
+
+
+def ticket_token(request, exam_id):
+    """Подписанный номер очереди для опросов: они обходятся без сессии (и без ее записи в базу)"""
+    ticket = request.session.get(session_key(exam_id))
+    return signing.dumps([exam_id, ticket], salt=TOKEN_SALT) if ticket is not None else ''
+
+
+def token_status(exam_id, token):
+    """Состояние очереди по подписанному номеру; неверный номер — допуск (start_exam проверит по сессии)"""
+    try:
+        token_exam_id, ticket = signing.loads(token, salt=TOKEN_SALT, max_age=STATE_TIMEOUT)
+    except signing.BadSignature:
+        return dict(ADMITTED)
+    return ticket_status(exam_id, ticket if token_exam_id == exam_id else None)
+
+
+def release(request, exam_id):
+    """Попытка создана или создать ее нельзя: номер очереди больше не нужен"""
+    request.session.pop(session_key(exam_id), None)
@@ -0,0 +1,161 @@
+# archive.py
+"""
+Архивирование старых завершенных попыток.
+
+Ответы попытки (StudentAnswer) переносятся в одну строку ArchivedAttempt
+сжатым JSON, а из живых таблиц удаляются — индексы горячего пути не растут от семестра к семестру.
+Счет, статистика и разбор остаются в ExamResult; страницы результатов читают ответы через load_answers.
+"""
+import json
+import zlib
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .breakdown import store_breakdowns
+from .models import FINISHED_STATUSES, ArchivedAttempt, ExamResult, Question, StudentAnswer
+
+
+def archive_after_days():
+    return getattr(settings, 'EXAM_ARCHIVE_AFTER_DAYS', 180)
+
+
+def pack(answers):
+    return zlib.compress(json.dumps(answers, separators=(',', ':')).encode(), 9)
+
+
+def unpack(data):
+    return json.loads(zlib.decompress(bytes(data)))
+
+
+# ----------------------
+# Чтение
+# ----------------------
+
+def live_answers(exam_result):
+    return list(
+        exam_result.student_answers.select_related('question', 'question__subject')
+        .prefetch_related('question__answers').order_by('id')
+    )
+
+
+def archived_answers(exam_result):
+    """Несохраняемые StudentAnswer, восстановленные из архива"""
+    rows = unpack(exam_result.archive.data)
+    questions = Question.objects.select_related('subject').prefetch_related('answers').in_bulk(
+        [row['question'] for row in rows]
+    )
+    answers = []
+    for row in rows:
+        question = questions.get(row['question'])
+        if question is None:  # вопрос удален вместе с ответами
+            continue
+        answer = StudentAnswer(
+            exam_result=exam_result,
+            question=question,
+            answer_text=row['answer_text'],
+            selected_mask=row['selected_mask'],
+            is_correct=row['is_correct'],
+            points_earned=row['points_earned'],
+            answered_at=parse_datetime(row['answered_at']),
+        )
+        answers.append(answer)
+    return answers
+
+
+def load_answers(exam_result):
+    """Ответы попытки (с вопросами и вариантами) — из живых таблиц или из архива"""
+    if exam_result.archived_at:
+        return archived_answers(exam_result)
+    return live_answers(exam_result)
+
+
+def load_answers_bulk(exam_results):
+    """load_answers для нескольких попыток {result_id: [StudentAnswer]}: живые ответы — одним запросом"""
+    answers = {exam_result.id: [] for exam_result in exam_results}
+    live = StudentAnswer.objects.filter(
+        exam_result_id__in=[exam_result.id for exam_result in exam_results if not exam_result.archived_at]
+    ).select_related('question', 'question__subject').prefetch_related('question__answers').order_by('id')
+    for answer in live:
+        answers[answer.exam_result_id].append(answer)
+    for exam_result in exam_results:
+        if exam_result.archived_at:
+            answers[exam_result.id] = archived_answers(exam_result)
+    return answers
+
+
+def archived_subject_points(result_ids):
+    """Баллы архивных попыток по предметам: {(result_id, subject_id): points}"""
+    archives = {
+        archive.exam_result_id: unpack(archive.data)
+        for archive in ArchivedAttempt.objects.filter(exam_result_id__in=result_ids)
+    }
+    if not archives:
+        return {}
+    question_ids = {row['question'] for rows in archives.values() for row in rows}
+    subjects = dict(Question.objects.filter(id__in=question_ids).values_list('id', 'subject_id'))
+
+    points = defaultdict(float)
+    for result_id, rows in archives.items():
+        for row in rows:
+            if row['question'] in subjects:
+                points[(result_id, subjects[row['question']])] += row['points_earned'] or 0
+    return points
+
+
+# ----------------------
+# Архивирование
+# ----------------------
+
+def archive_batch(cutoff, batch_size):
+    """Переносит в архив одну пачку попыток, завершенных до cutoff; возвращает их количество"""
+    with transaction.atomic():
+        ids = list(
+            ExamResult.objects.filter(
+                status__in=FINISHED_STATUSES, archived_at__isnull=True, end_time__lt=cutoff
+            ).select_for_update(skip_locked=True).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+
+        # Разбор считается по живым ответам, поэтому сохраняем его до переноса
+        store_breakdowns(list(ExamResult.objects.filter(id__in=ids, breakdown__isnull=True).values_list('id', flat=True)))
+
+        rows = list(StudentAnswer.objects.filter(exam_result_id__in=ids).order_by('id').values(
+            'exam_result_id', 'question_id', 'answer_text', 'selected_mask', 'is_correct', 'points_earned', 'answered_at'
+        ))
+        attempts = {result_id: [] for result_id in ids}
+        for row in rows:
+            attempts[row['exam_result_id']].append({
+                'question': row['question_id'],
+                'answer_text': row['answer_text'],
+                'selected_mask': row['selected_mask'],
+                'is_correct': row['is_correct'],
+                'points_earned': row['points_earned'],
+                'answered_at': row['answered_at'].isoformat() if row['answered_at'] else None,
+            })
+
+        ArchivedAttempt.objects.bulk_create([
+            ArchivedAttempt(exam_result_id=result_id, data=pack(answers), answers_count=len(answers))
+            for result_id, answers in attempts.items()
+        ])
+
+        StudentAnswer.objects.filter(exam_result_id__in=ids).delete()
+        ExamResult.objects.filter(id__in=ids).update(archived_at=timezone.now())
+    return len(ids)
+
+
+def archive_attempts(older_than_days=None, batch_size=200):
+    """Архивирует все попытки, завершенные раньше заданного возраста; возвращает их количество"""
+    days = archive_after_days() if older_than_days is None else older_than_days
+    cutoff = timezone.now() - timedelta(days=days)
+    total = 0
+    while True:
+        archived = archive_batch(cutoff, batch_size)
+        total += archived
+        if archived < batch_size:
+            return total
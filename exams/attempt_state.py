@@ -0,0 +1,133 @@
+# attempt_state.py
+"""
+Состояние незавершенной попытки для проверки сохранений ответа без чтения базы.
+
+Чтобы пропустить или отклонить сохранение (save_answer, sync_answers, WebSocket), нужно знать:
+- владельца и статус попытки;
+- окно экзамена (Exam.is_open);
+- отведенное время (ExamResult.is_expired);
+- id ответов (StudentAnswer) попытки.
+Все это меняется только при завершении попытки и при изменении экзамена.
+
+Состояние хранится в общем кэше до конца попытки и сбрасывается (forget_attempts):
+- сигналы ExamResult — завершение через finalize_exam, правка и удаление в админке;
+- фоновое завершение (expiry.py);
+- сохранение экзамена (сигнал Exam).
+Дополнительно каждый процесс держит копию несколько секунд (ATTEMPT_STATE_LOCAL_SECONDS), чтобы
+частые сохранения не ходили даже в кэш. Устаревшая копия не дает изменить завершенную попытку:
+запись ответа проверяет статус в самом UPDATE (views.store_answer).
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ExamResult, StudentAnswer
+
+STATE_FORMAT = 1  # меняется вместе с составом состояния
+CLOSED_TIMEOUT = 60  # секунд: состояние завершенной попытки нужно только запоздавшим запросам
+LOCAL_MAX_ENTRIES = 10000
+
+_local = {}  # {exam_result_id: (состояние, до какого time.monotonic() копия действительна)}
+
+
+def local_seconds():
+    return getattr(settings, 'ATTEMPT_STATE_LOCAL_SECONDS', 5)
+
+
+def state_key(exam_result_id):
+    return f'attempt_state:{STATE_FORMAT}:{exam_result_id}'
+
+
+def load_state(exam_result_id):
+    """Состояние попытки из базы (два запроса) или None, если попытки нет"""
+    row = ExamResult.objects.filter(pk=exam_result_id).values_list(
+        'student_id', 'status', 'start_time', 'deadline', 'exam__duration_minutes', 'exam__open_time',
+        'exam__close_time',
+    ).first()
+    if row is None:
+        return None
+    student_id, status, start_time, deadline, duration_minutes, open_time, close_time = row
+    # Как ExamResult.is_expired: крайний срок попытки, без него — по продолжительности экзамена
+    if deadline is None and start_time and duration_minutes:
+        deadline = start_time + timedelta(minutes=duration_minutes)
+    return {
+        'student_id': student_id,
+        'status': status,
+        'open_time': open_time,
+        'close_time': close_time,
+        'deadline': deadline,
+        'answers': frozenset(
+            StudentAnswer.objects.filter(exam_result_id=exam_result_id).values_list('id', flat=True)
+        ),
+    }
+
+
+def state_timeout(state):
+    """Незавершенная попытка — до конца отведенного времени или закрытия экзамена, завершенная — недолго"""
+    if state['status'] != 'in_progress':
+        return CLOSED_TIMEOUT
+    ends = min(filter(None, [state['deadline'], state['close_time']]))
+    return max((ends - timezone.now()).total_seconds(), 0) + CLOSED_TIMEOUT
+
+
+def get_attempt_state(exam_result_id):
+    """Состояние попытки: копия процесса, общий кэш или база; None — попытки нет"""
+    entry = _local.get(exam_result_id)
+    if entry is not None and entry[1] > time.monotonic():
+        return entry[0]
+
+    key = state_key(exam_result_id)
+    state = cache.get(key)
+    if state is None:
+        state = load_state(exam_result_id)
+        if state is None:
+            return None
+        cache.set(key, state, state_timeout(state))
+
+    if len(_local) >= LOCAL_MAX_ENTRIES:
+        _local.clear()
+    _local[exam_result_id] = (state, time.monotonic() + local_seconds())
+    return state
+
+
+def writable(state, student_id):
+    """Попытка есть, принадлежит студенту и не завершена"""
+    return state is not None and state['student_id'] == student_id and state['status'] == 'in_progress'
+
+
+def time_error(state, now=None):
+    """Текст ошибки, если время экзамена или попытки вышло (как Exam.is_open и ExamResult.is_expired), иначе None"""
+    now = now or timezone.now()
+    if not state['open_time'] <= now <= state['close_time']:
+        return 'Время проведения экзамена истекло'
+    if state['deadline'] and now > state['deadline']:
+        return 'Время истекло'
+    return None
+
+
+def forget_attempts(exam_result_ids):
+    """
+    Сброс состояния попыток после фиксации текущей транзакции: до нее другой запрос
+    еще прочитал бы из базы прежнее состояние и положил его в кэш
+    """
+    exam_result_ids = list(exam_result_ids)
+    if not exam_result_ids:
+        return
+    for exam_result_id in exam_result_ids:
+        _local.pop(exam_result_id, None)
+
+    def forget():
+        for exam_result_id in exam_result_ids:
+            _local.pop(exam_result_id, None)
+        cache.delete_many([state_key(exam_result_id) for exam_result_id in exam_result_ids])
+
+    transaction.on_commit(forget)
+
+
+def forget_exam_attempts(exam_id):
+    """Окно или продолжительность экзамена могли измениться: сброс состояния его незавершенных попыток"""
+    forget_attempts(ExamResult.objects.filter(exam_id=exam_id, status='in_progress').values_list('id', flat=True))
@@ -0,0 +1,179 @@
+# bank.py
+"""
+Импорт и экспорт банков вопросов курса в формате JSONL — один вопрос на строку:
+
+    {"subject": "Python Basics", "type": "single_choice", "difficulty": "easy",
+     "text_md": "Что выведет `print(1 + 1)`?", "text": "",
+     "answers": [{"text_md": "2", "text": "", "correct": true},
+                 {"text_md": "11", "text": "", "correct": false}]}
+
+type — значение из Question.TYPE_CHOICES, difficulty — из Question.DIFFICULTY_CHOICES,
+text и answers могут отсутствовать (для open/text вариантов нет). Недостающие предметы курса
+создаются по имени. Вопрос, уже существующий в предмете с тем же содержимым
+(Question.content_hash), повторно не добавляется, поэтому импорт можно запускать многократно.
+"""
+import json
+import logging
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Prefetch
+
+from .caching import bump_question_bank_version
+from .models import MAX_ANSWER_POSITION, Answer, Question, Subject, answers_mask, question_content_hash
+from .search import index_answers, index_questions
+
+logger = logging.getLogger(__name__)
+
+QUESTION_TYPES = {value for value, _ in Question.TYPE_CHOICES}
+DIFFICULTIES = {value for value, _ in Question.DIFFICULTY_CHOICES}
+
+
+# ----------------------
+# Экспорт
+# ----------------------
+
+def question_record(question):
+    record = {
+        'subject': question.subject.name,
+        'type': question.question_type,
+        'difficulty': question.difficulty,
+        'text_md': question.text_md,
+        'text': question.text,
+    }
+    if question.question_type not in ['open', 'text'] or question.answers.all():
+        record['answers'] = [
+            {'text_md': answer.text_md, 'text': answer.text, 'correct': answer.is_correct}
+            for answer in question.answers.all()
+        ]
+    return record
+
+
+def export_bank(course, subject=None, chunk_size=1000):
+    """Строки JSONL банка курса (или одного предмета); вопросы читаются порциями"""
+    questions = Question.objects.filter(subject__course=course)
+    if subject is not None:
+        questions = questions.filter(subject=subject)
+    questions = questions.select_related('subject').prefetch_related(
+        Prefetch('answers', queryset=Answer.objects.order_by('position'))
+    ).order_by('subject__name', 'id')
+    for question in questions.iterator(chunk_size=chunk_size):
+        yield json.dumps(question_record(question), ensure_ascii=False) + '\n'
+
+
+# ----------------------
+# Импорт
+# ----------------------
+
+def parse_record(record):
+    """Проверяет запись и приводит ее к (subject, Question-поля, [(text_md, text, is_correct)])"""
+    if not isinstance(record, dict):
+        raise ValueError('ожидается JSON-объект')
+    subject = str(record.get('subject') or '').strip()
+    question_type = record.get('type', 'single_choice')
+    difficulty = record.get('difficulty', 'medium')
+    text_md = record.get('text_md') or ''
+    text = record.get('text') or ''
+    if not subject:
+        raise ValueError('не указан предмет')
+    if question_type not in QUESTION_TYPES:
+        raise ValueError(f'неизвестный тип вопроса: {question_type}')
+    if difficulty not in DIFFICULTIES:
+        raise ValueError(f'неизвестная сложность: {difficulty}')
+    if not (text_md or text):
+        raise ValueError('пустой текст вопроса')
+
+    answers = [
+        (answer.get('text_md') or '', answer.get('text') or '', bool(answer.get('correct')))
+        for answer in record.get('answers') or []
+    ]
+    if len(answers) > MAX_ANSWER_POSITION + 1:
+        raise ValueError(f'больше {MAX_ANSWER_POSITION + 1} вариантов ответа')
+    if question_type in ['single_choice', 'multiple_choice'] and not any(correct for _, _, correct in answers):
+        raise ValueError('нет правильного варианта ответа')
+    return subject, {
+        'question_type': question_type,
+        'difficulty': difficulty,
+        'text_md': text_md,
+        'text': text,
+    }, answers
+
+
+def read_records(lines, errors):
+    """Разбирает строки JSONL; ошибки пишутся в errors как (номер строки, текст)"""
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield (line_number, *parse_record(json.loads(line)))
+        except ValueError as e:
+            errors.append((line_number, str(e)))
+
+
+def import_chunk(course, subjects, records):
+    """Добавляет новые вопросы порции несколькими пакетными запросами; возвращает (создано, пропущено)"""
+    for name in {subject for _, subject, _, _ in records} - subjects.keys():
+        subjects[name] = Subject.objects.create(course=course, name=name)
+
+    hashed = []
+    for _, subject, fields, answers in records:
+        content_hash = question_content_hash(
+            fields['question_type'], fields['difficulty'], fields['text_md'], fields['text'], answers
+        )
+        hashed.append((subjects[subject], fields, answers, content_hash))
+
+    existing = set(Question.objects.filter(
+        subject__in={subject.id for subject, _, _, _ in hashed},
+        content_hash__in={content_hash for _, _, _, content_hash in hashed},
+    ).values_list('subject_id', 'content_hash'))
+
+    new = []
+    for subject, fields, answers, content_hash in hashed:
+        if (subject.id, content_hash) in existing:
+            continue
+        existing.add((subject.id, content_hash))  # повтор внутри самого файла
+        new.append((Question(
+            subject=subject,
+            content_hash=content_hash,
+            correct_mask=answers_mask(position for position, (_, _, correct) in enumerate(answers) if correct),
+            next_answer_position=len(answers),
+            **fields,
+        ), answers))
+
+    with transaction.atomic():
+        questions = Question.objects.bulk_create([question for question, _ in new])
+        created_answers = Answer.objects.bulk_create([
+            Answer(question=question, position=position, text_md=text_md, text=text, is_correct=is_correct)
+            for question, (_, answers) in zip(questions, new)
+            for position, (text_md, text, is_correct) in enumerate(answers)
+        ])
+        # bulk_create не вызывает сигналы — поисковый индекс и версию банка обновляем сами
+        index_questions([question.id for question in questions])
+        index_answers([answer.id for answer in created_answers])
+        if questions:
+            transaction.on_commit(bump_question_bank_version)
+    return len(new), len(records) - len(new)
+
+
+def import_bank(course, lines, chunk_size=1000):
+    """
+    Потоковый импорт банка вопросов курса из строк JSONL.
+    Возвращает {'created': N, 'skipped': N, 'errors': [(номер строки, текст)]}.
+    """
+    result = {'created': 0, 'skipped': 0, 'errors': []}
+    subjects = {subject.name: subject for subject in course.subjects.all()}
+    records = read_records(lines, result['errors'])
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            logger.info('Импорт банка вопросов', extra={
+                'event': 'import', 'course': course.id, 'questions_created': result['created'],
+                'questions_skipped': result['skipped'], 'errors': len(result['errors']),
+            })
+            return result
+        created, skipped = import_chunk(course, subjects, chunk)
+        result['created'] += created
+        result['skipped'] += skipped
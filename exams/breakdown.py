@@ -0,0 +1,48 @@
+# breakdown.py
+"""Разбор результата по предметам и сложности, сохраняемый в ExamResult.breakdown при завершении"""
+from django.db.models import Count, Q, Sum
+
+from .models import ExamResult, Question, StudentAnswer
+
+
+def _add(group, key, row):
+    stats = group.setdefault(key, {'correct': 0, 'total': 0, 'points': 0})
+    stats['correct'] += row['correct']
+    stats['total'] += row['total']
+    stats['points'] += row['points'] or 0
+
+
+def compute_breakdowns(result_ids):
+    """{result_id: {'subjects': {...}, 'difficulty': {...}}} одним сгруппированным запросом"""
+    breakdowns = {result_id: {'subjects': {}, 'difficulty': {}} for result_id in result_ids}
+    rows = StudentAnswer.objects.filter(exam_result_id__in=result_ids).values(
+        'exam_result_id', 'question__subject__name', 'question__difficulty'
+    ).annotate(
+        total=Count('id'),
+        correct=Count('id', filter=Q(is_correct=True)),
+        points=Sum('points_earned'),
+    ).order_by('question__subject__name', 'question__difficulty')
+    for row in rows:
+        breakdown = breakdowns[row['exam_result_id']]
+        _add(breakdown['subjects'], row['question__subject__name'] or 'Без предмета', row)
+        _add(breakdown['difficulty'], row['question__difficulty'], row)
+    return breakdowns
+
+
+def store_breakdowns(result_ids, batch_size=500):
+    """Пересчитывает и сохраняет разбор для указанных результатов"""
+    breakdowns = compute_breakdowns(result_ids)
+    ExamResult.objects.bulk_update(
+        [ExamResult(id=result_id, breakdown=breakdown) for result_id, breakdown in breakdowns.items()],
+        ['breakdown'],
+        batch_size=batch_size,
+    )
+
+
+def difficulty_rows(breakdown):
+    """Статистика по сложности в порядке Question.DIFFICULTY_CHOICES: [(название, stats)]"""
+    return [
+        (label, breakdown['difficulty'][key])
+        for key, label in Question.DIFFICULTY_CHOICES
+        if key in breakdown['difficulty']
+    ]
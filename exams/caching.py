@@ -0,0 +1,144 @@
+# caching.py
+"""Кэш фрагментов страниц экзамена"""
+import hashlib
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Answer, Exam, Student, mask_positions
+
+CHECKED_RE = re.compile(r'__CHECKED_\d+__')
+CARD_FORMAT = 3  # меняется вместе с разметкой карточки (__CHECKED_<позиция>__, __SEQ__)
+
+
+def card_timeout():
+    return getattr(settings, 'QUESTION_CARD_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def question_card_key(question):
+    """Ключ карточки: версия содержимого меняется при любом изменении вопроса, его ответов или предмета"""
+    return f'question_card:{CARD_FORMAT}:{question.id}:{question.content_version}'
+
+
+def render_question_card(question, answers):
+    return render_to_string('exams/_question_card.html', {
+        'question': question,
+        'answers': answers,
+    })
+
+
+def get_question_cards(questions):
+    """
+    HTML карточек по вопросам {question_id: html}.
+    Из кэша берется одним get_many; варианты ответов загружаются только для промахов.
+    """
+    keys = {question_card_key(question): question for question in questions}
+    cards = {keys[key].id: html for key, html in cache.get_many(keys).items()}
+
+    missing = [question for question in questions if question.id not in cards]
+    if missing:
+        answers = {question.id: [] for question in missing}
+        for answer in Answer.objects.filter(question__in=missing).order_by('id'):
+            answers[answer.question_id].append(answer)
+        rendered = {}
+        for question in missing:
+            cards[question.id] = render_question_card(question, answers[question.id])
+            rendered[question_card_key(question)] = cards[question.id]
+        cache.set_many(rendered, card_timeout())
+    return cards
+
+
+def apply_card_overlay(card, number, student_answer):
+    """Накладывает на общую карточку состояние конкретного студента"""
+    for position in mask_positions(student_answer.selected_mask):
+        card = card.replace(f'__CHECKED_{position}__', 'checked')
+    card = CHECKED_RE.sub('', card)
+    card = card.replace('__SA_ID__', str(student_answer.id))
+    card = card.replace('__SEQ__', str(student_answer.client_seq))
+    card = card.replace('__NUMBER__', str(number))
+    card = card.replace('__ANSWER_TEXT__', escape(student_answer.answer_text))
+    return mark_safe(card)
+
+
+def student_question_cards(student_answers):
+    """Готовые карточки попытки в порядке student_answers"""
+    student_answers = list(student_answers)
+    cards = get_question_cards([sa.question for sa in student_answers])
+
+    return [
+        apply_card_overlay(cards[sa.question_id], number, sa)
+        for number, sa in enumerate(student_answers, start=1)
+    ]
+
+
+# ----------------------
+# Версии для условных GET (ETag)
+# ----------------------
+
+CATALOG_VERSION_KEY = 'exam_catalog_version'
+BANK_VERSION_KEY = 'question_bank_version'
+
+
+def bump_results_version(student_ids):
+    """Результаты студентов изменились: их страницы нужно отдать заново"""
+    Student.objects.filter(id__in=student_ids).update(results_version=F('results_version') + 1)
+
+
+def cache_version(key):
+    """
+    Счетчик версии в общем кэше.
+    Начальное значение — текущее время, чтобы после очистки кэша версия не повторилась.
+    """
+    version = cache.get(key)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_cache_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache_version(key)
+
+
+def exam_catalog_version():
+    """Версия расписания экзаменов и записей на курсы"""
+    return cache_version(CATALOG_VERSION_KEY)
+
+
+def bump_exam_catalog_version():
+    bump_cache_version(CATALOG_VERSION_KEY)
+
+
+def question_bank_version():
+    """Версия банка вопросов: меняется при добавлении, изменении и удалении вопросов и ExamSubject"""
+    return cache_version(BANK_VERSION_KEY)
+
+
+def bump_question_bank_version():
+    bump_cache_version(BANK_VERSION_KEY)
+
+
+def student_exam_schedule(student):
+    """Экзамены курсов студента [(id, open_time, close_time)], кэшируются до смены версии расписания"""
+    key = f'exam_schedule:{student.id}:{exam_catalog_version()}'
+    schedule = cache.get(key)
+    if schedule is None:
+        schedule = list(Exam.objects.filter(
+            course__coursestudent__student=student
+        ).order_by('id').values_list('id', 'open_time', 'close_time'))
+        cache.set(key, schedule, card_timeout())
+    return schedule
+
+
+def make_etag(*parts):
+    return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
@@ -0,0 +1,216 @@
+# consumers.py
+"""
+WebSocket-канал попытки экзамена: /ws/exams/<exam_result_id>/
+
+Клиент -> сервер:
+    {"type": "answer", "ref": 1, "student_answer_id": 10, "seq": 4, "answer_ids": [3], "answer_text": ""}
+    {"type": "sync", "ref": 2, "base_version": 7, "answers": [{"student_answer_id": 10, "seq": 5, ...}]}
+    {"type": "finish"}
+Сервер -> клиент:
+    {"type": "state", "status": "in_progress", "remaining": 1795}   — при подключении
+    {"type": "time", "remaining": 1780}                              — периодически
+    {"type": "ack", "ref": 1, "success": true, "saved": true, "seq": 4}  — saved: false для повтора и устаревшего seq
+    {"type": "synced", "ref": 2, "success": true, "version": 8, "acks": {...}, "changed": [...]}  — см. process_sync
+    {"type": "finished", "reason": "finished" | "time_expired", "url": "/exams/results/5/"}
+    {"type": "error", "ref": 3, "error": "..."}                       — некорректное сообщение или ошибка завершения
+"""
+import asyncio
+import json
+import re
+from datetime import timedelta
+from http.cookies import SimpleCookie
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .attempt_state import get_attempt_state, time_error, writable
+from .models import ExamResult
+from .views import finalize_exam, process_answer, process_sync
+
+PATH_RE = re.compile(r'^/ws/exams/(?P<exam_result_id>\d+)/$')
+
+
+def timer_interval():
+    return getattr(settings, 'EXAM_WS_TIMER_INTERVAL', 15)
+
+
+def get_header(scope, name):
+    for key, value in scope.get('headers', []):
+        if key.decode('latin1').lower() == name:
+            return value.decode('latin1')
+    return ''
+
+
+def same_origin(scope):
+    """
+    Защита от подключения со сторонних сайтов (cross-site WebSocket hijacking). Браузер всегда
+    передает Origin при открытии WebSocket, поэтому подключение без него тоже отклоняется.
+    """
+    origin = get_header(scope, 'origin')
+    if not origin:
+        return False
+    return origin.split('://', 1)[-1] == get_header(scope, 'host')
+
+
+def session_student_id(scope):
+    """ID студента из сессии Django по cookie подключения"""
+    cookie = SimpleCookie()
+    cookie.load(get_header(scope, 'cookie'))
+    morsel = cookie.get(settings.SESSION_COOKIE_NAME)
+    if morsel is None:
+        return None
+    engine = import_module(settings.SESSION_ENGINE)
+    return engine.SessionStore(morsel.value).get('student_id')
+
+
+def attempt_state(student_id, exam_result_id):
+    """Статус попытки и оставшееся время; истекшую попытку сразу завершает"""
+    exam_result = ExamResult.objects.select_related('exam').filter(
+        pk=exam_result_id, student_id=student_id, student__is_active=True
+    ).first()
+    if exam_result is None:
+        return None
+    if exam_result.status == 'in_progress' and (not exam_result.exam.is_open() or exam_result.is_expired()):
+        finalize_exam(exam_result, 'time_expired')
+        exam_result.refresh_from_db(fields=['status'])
+    remaining = exam_result.time_remaining()
+    return {
+        'status': exam_result.status,
+        'remaining': int(remaining.total_seconds()) if remaining is not None else 0,
+    }
+
+
+def current_time(student_id, exam_result_id):
+    """
+    Как attempt_state, но по закэшированному состоянию попытки (attempt_state.py): база читается,
+    только когда время вышло или попытка уже не идет — чтобы завершить ее и узнать итоговый статус
+    """
+    state = get_attempt_state(exam_result_id)
+    if not writable(state, student_id) or time_error(state):
+        return attempt_state(student_id, exam_result_id)
+    remaining = max(state['deadline'] - timezone.now(), timedelta(0)) if state['deadline'] else None
+    return {
+        'status': state['status'],
+        'remaining': int(remaining.total_seconds()) if remaining is not None else 0,
+    }
+
+
+def finish_attempt(student_id, exam_result_id):
+    exam_result = ExamResult.objects.select_related('exam').get(pk=exam_result_id, student_id=student_id)
+    finalize_exam(exam_result, 'finished')
+
+
+class ExamSocket:
+    """Одно WebSocket-подключение к попытке"""
+
+    def __init__(self, scope, receive, send):
+        self.scope = scope
+        self.receive = receive
+        self._send = send
+        self.send_lock = asyncio.Lock()
+        self.student_id = None
+        self.exam_result_id = None
+        self.remaining = 0
+        self.closed = False
+
+    async def send_json(self, data):
+        async with self.send_lock:
+            if not self.closed:
+                await self._send({'type': 'websocket.send', 'text': json.dumps(data)})
+
+    async def close(self, code=1000):
+        async with self.send_lock:
+            if not self.closed:
+                self.closed = True
+                await self._send({'type': 'websocket.close', 'code': code})
+
+    async def finished(self, reason):
+        await self.send_json({
+            'type': 'finished',
+            'reason': reason,
+            'url': reverse('exam_result_detail', args=[self.exam_result_id]),
+        })
+        await self.close()
+
+    async def run(self):
+        message = await self.receive()
+        if message['type'] != 'websocket.connect':
+            return
+
+        match = PATH_RE.match(self.scope['path'])
+        self.student_id = await sync_to_async(session_student_id)(self.scope)
+        if not match or not self.student_id or not same_origin(self.scope):
+            await self._send({'type': 'websocket.close', 'code': 4403})
+            return
+        self.exam_result_id = int(match.group('exam_result_id'))
+
+        state = await sync_to_async(attempt_state)(self.student_id, self.exam_result_id)
+        if state is None:
+            await self._send({'type': 'websocket.close', 'code': 4404})
+            return
+
+        await self._send({'type': 'websocket.accept'})
+        await self.send_json({'type': 'state', **state})
+        self.remaining = state['remaining']
+        if state['status'] != 'in_progress':
+            await self.finished(state['status'])
+            return
+
+        timer = asyncio.create_task(self.push_time())
+        try:
+            while not self.closed:
+                message = await self.receive()
+                if message['type'] == 'websocket.disconnect':
+                    self.closed = True
+                    break
+                if message['type'] == 'websocket.receive':
+                    await self.handle(message.get('text') or '')
+        finally:
+            timer.cancel()
+
+    async def handle(self, text):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            await self.send_json({'type': 'error', 'error': 'Некорректное сообщение'})
+            return
+
+        if data.get('type') == 'answer':
+            try:
+                result = await sync_to_async(process_answer)(self.student_id, self.exam_result_id, data)
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+            await self.send_json({'type': 'ack', 'ref': data.get('ref'), **result})
+        elif data.get('type') == 'sync':
+            try:
+                result = await sync_to_async(process_sync)(self.student_id, self.exam_result_id, data)
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+            await self.send_json({'type': 'synced', 'ref': data.get('ref'), **result})
+        elif data.get('type') == 'finish':
+            try:
+                await sync_to_async(finish_attempt)(self.student_id, self.exam_result_id)
+            except Exception as e:
+                await self.send_json({'type': 'error', 'ref': data.get('ref'), 'error': str(e)})
+                return
+            await self.finished('finished')
+
+    async def push_time(self):
+        """Периодически отправляет оставшееся время; по истечении завершает попытку"""
+        while not self.closed:
+            # Ближе к концу просыпаемся ровно к истечению времени
+            await asyncio.sleep(min(timer_interval(), self.remaining + 1))
+            state = await sync_to_async(current_time)(self.student_id, self.exam_result_id)
+            if state is None or state['status'] != 'in_progress':
+                await self.finished(state['status'] if state else 'time_expired')
+                return
+            self.remaining = state['remaining']
+            await self.send_json({'type': 'time', 'remaining': self.remaining})
+
+
+async def exam_websocket(scope, receive, send):
+    """ASGI-приложение для WebSocket-подключений"""
+    await ExamSocket(scope, receive, send).run()
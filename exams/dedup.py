@@ -0,0 +1,233 @@
+# dedup.py
+"""
+Поиск почти одинаковых вопросов внутри предмета: MinHash + LSH вместо попарного сравнения.
+
+Текст вопроса (text_md, text) вместе с текстами вариантов приводится к нижнему регистру, «ё» → «е»,
+пунктуация и разметка Markdown отбрасываются. Из результата берутся символьные шинглы длины SHINGLE_SIZE.
+Подпись — NUM_PERM минимумов хэшей шинглов (QuestionSignature.minhash, uint32). Доля совпадающих
+позиций двух подписей оценивает коэффициент Жаккара множеств шинглов.
+
+Кандидаты — вопросы предмета, у которых совпала хотя бы одна из BANDS полос подписи по ROWS значений.
+Вероятность попасть в кандидаты при сходстве s равна 1 - (1 - s^ROWS)^BANDS: ~0.2 при s=0.5,
+~0.9 при s=0.7 и почти 1 при s ≥ 0.8. Поэтому порог ниже ~0.6 находит лишь часть пар. Кандидаты
+проверяются по оценке сходства, и связанные пары объединяются в группы (QuestionSignature.cluster).
+
+Расчет инкрементальный. Подписи пересчитываются только для новых вопросов, вопросов
+с изменившимся content_hash и вопросов, перенесенных в другой предмет. Группы заново строятся
+только в затронутых предметах: manage.py find_duplicate_questions.
+"""
+import re
+import zlib
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Answer, Question, QuestionSignature
+
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+DEFAULT_THRESHOLD = 0.8
+PAIRWISE_LIMIT = 64  # корзины больше сравниваются только с первым вопросом корзины
+BATCH_SIZE = 1000
+
+WORD_RE = re.compile(r'\w+')
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Фиксированное зерно: подписи, посчитанные в разных запусках, должны быть сравнимы
+_random = np.random.RandomState(20261019)
+PERM_A = _random.randint(1, 1 << 61, size=NUM_PERM, dtype=np.uint64)
+PERM_B = _random.randint(0, 1 << 61, size=NUM_PERM, dtype=np.uint64)
+
+
+# ----------------------
+# Подписи
+# ----------------------
+
+def normalize(text):
+    return ' '.join(WORD_RE.findall(text.lower().replace('ё', 'е')))
+
+
+def shingles(text):
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text):
+    """MinHash-подпись нормализованного текста: массив uint32 длины NUM_PERM"""
+    items = shingles(text)
+    hashes = np.fromiter((zlib.crc32(item.encode()) for item in items), dtype=np.uint64, count=len(items))
+    # Переполнение uint64 при умножении допустимо: нужна лишь детерминированная перестановка
+    permuted = (np.outer(PERM_A, hashes) + PERM_B[:, None]) % MERSENNE_PRIME & MAX_HASH
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def question_document(text_md, text, answers):
+    """Нормализованный текст вопроса с вариантами ответов: answers — [(text_md, text)] по позиции"""
+    parts = [text_md, text]
+    for answer_md, answer_text in answers:
+        parts.extend([answer_md, answer_text])
+    return normalize(' '.join(parts))
+
+
+def stale_questions():
+    """Вопросы без подписи или с подписью, посчитанной для другого содержимого или предмета"""
+    return Question.objects.exclude(
+        signature__content_hash=F('content_hash'),
+        signature__subject=F('subject'),
+    )
+
+
+def update_signatures(questions, batch_size=BATCH_SIZE):
+    """Пересчитывает подписи вопросов; возвращает (число вопросов, id затронутых предметов)"""
+    count, subjects = 0, set()
+    rows = questions.order_by('id').values_list('id', 'subject_id', 'content_hash', 'text_md', 'text')
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) == batch_size:
+            subjects |= _store_signatures(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        subjects |= _store_signatures(batch)
+        count += len(batch)
+    return count, subjects
+
+
+def _store_signatures(batch):
+    answers = {}
+    for question_id, text_md, text in Answer.objects.filter(
+        question_id__in=[row[0] for row in batch]
+    ).order_by('question_id', 'position').values_list('question_id', 'text_md', 'text'):
+        answers.setdefault(question_id, []).append((text_md, text))
+
+    subjects = {row[1] for row in batch}
+    # Старый предмет перенесенного вопроса тоже нужно перегруппировать
+    subjects.update(QuestionSignature.objects.filter(
+        question_id__in=[row[0] for row in batch]
+    ).values_list('subject_id', flat=True))
+
+    QuestionSignature.objects.bulk_create(
+        [
+            QuestionSignature(
+                question_id=question_id,
+                subject_id=subject_id,
+                content_hash=content_hash,
+                minhash=minhash(question_document(text_md, text, answers.get(question_id, []))).tobytes(),
+            )
+            for question_id, subject_id, content_hash, text_md, text in batch
+        ],
+        update_conflicts=True,
+        unique_fields=['question'],
+        update_fields=['subject', 'content_hash', 'minhash'],
+    )
+    return subjects
+
+
+# ----------------------
+# Группы дубликатов
+# ----------------------
+
+def _find(parents, item):
+    while parents[item] != item:
+        parents[item] = parents[parents[item]]
+        item = parents[item]
+    return item
+
+
+def _union(parents, first, second):
+    first, second = _find(parents, first), _find(parents, second)
+    if first != second:
+        parents[max(first, second)] = min(first, second)
+
+
+def _candidate_buckets(signatures):
+    """Индексы вопросов, совпавших хотя бы в одной полосе подписи (по корзинам)"""
+    for band in range(BANDS):
+        keys = np.ascontiguousarray(signatures[:, band * ROWS:(band + 1) * ROWS]).view(f'V{ROWS * 4}').ravel()
+        _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        shared = np.flatnonzero(counts[inverse] > 1)
+        if not len(shared):
+            continue
+        shared = shared[np.argsort(inverse[shared], kind='stable')]
+        boundaries = np.flatnonzero(np.diff(inverse[shared])) + 1
+        yield from np.split(shared, boundaries)
+
+
+def find_clusters(signatures, threshold=DEFAULT_THRESHOLD):
+    """
+    Группы почти одинаковых подписей (матрица n × NUM_PERM).
+    Возвращает (корень группы для каждой строки, наибольшее сходство строки с другой строкой группы).
+    """
+    parents = list(range(len(signatures)))
+    best = np.zeros(len(signatures))
+    for members in _candidate_buckets(signatures):
+        if len(members) <= PAIRWISE_LIMIT:
+            block = signatures[members]
+            similarity = (block[:, None, :] == block[None, :, :]).mean(axis=2)
+            np.fill_diagonal(similarity, 0)
+            left, right = np.nonzero(np.triu(similarity >= threshold))
+            pairs = zip(members[left], members[right], similarity[left, right])
+        else:
+            first, rest = members[0], members[1:]
+            similarity = (signatures[rest] == signatures[first]).mean(axis=1)
+            matched = similarity >= threshold
+            pairs = ((first, other, value) for other, value in zip(rest[matched], similarity[matched]))
+        for first, second, value in pairs:
+            _union(parents, int(first), int(second))
+            best[first] = max(best[first], value)
+            best[second] = max(best[second], value)
+    return [_find(parents, item) for item in range(len(signatures))], best
+
+
+def cluster_subject(subject_id, threshold=DEFAULT_THRESHOLD):
+    """Заново строит группы дубликатов предмета; возвращает число групп"""
+    rows = list(QuestionSignature.objects.filter(subject_id=subject_id).order_by('question_id').values_list(
+        'question_id', 'minhash', 'cluster', 'similarity'
+    ))
+    if not rows:
+        return 0
+    signatures = np.frombuffer(b''.join(bytes(row[1]) for row in rows), dtype=np.uint32).reshape(len(rows), NUM_PERM)
+    roots, best = find_clusters(signatures, threshold)
+
+    sizes = {}
+    for root in roots:
+        sizes[root] = sizes.get(root, 0) + 1
+    changed = []
+    for (question_id, _, cluster, similarity), root, value in zip(rows, roots, best):
+        # Строки отсортированы по id, поэтому корень группы — ее наименьший id
+        new_cluster = rows[root][0] if sizes[root] > 1 else None
+        new_similarity = round(float(value), 3) if new_cluster else None
+        if (new_cluster, new_similarity) != (cluster, similarity):
+            changed.append(QuestionSignature(question_id=question_id, cluster=new_cluster, similarity=new_similarity))
+    QuestionSignature.objects.bulk_update(changed, ['cluster', 'similarity'], batch_size=BATCH_SIZE)
+    return sum(1 for size in sizes.values() if size > 1)
+
+
+def find_duplicates(subject_ids=None, threshold=DEFAULT_THRESHOLD, rebuild=False):
+    """
+    Пересчитывает устаревшие подписи и группы затронутых предметов (rebuild — все подписи и группы).
+    subject_ids ограничивает расчет предметами. Возвращает {'signatures': N, 'subjects': N, 'clusters': N}.
+    """
+    questions = Question.objects.all() if rebuild else stale_questions()
+    signatures = QuestionSignature.objects.all()
+    if subject_ids is not None:
+        questions = questions.filter(subject_id__in=subject_ids)
+        signatures = signatures.filter(subject_id__in=subject_ids)
+
+    with transaction.atomic():
+        count, subjects = update_signatures(questions)
+        if rebuild or subject_ids is not None:
+            subjects |= set(signatures.values_list('subject_id', flat=True).distinct())
+        # Группы, от которых после удаления вопросов остался один вопрос
+        subjects |= set(signatures.filter(cluster__isnull=False).values('subject_id', 'cluster').annotate(
+            size=Count('question')
+        ).filter(size=1).values_list('subject_id', flat=True))
+
+        clusters = sum(cluster_subject(subject_id, threshold) for subject_id in sorted(subjects))
+    return {'signatures': count, 'subjects': len(subjects), 'clusters': clusters}
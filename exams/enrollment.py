@@ -0,0 +1,61 @@
+# enrollment.py
+"""
+Массовая запись студентов на курс: по группам (Student.group), по списку из файла или по выборке в админке.
+Записи CourseStudent создаются пакетами bulk_create(ignore_conflicts=True), уже записанные студенты
+пропускаются. bulk_create не вызывает сигналы, поэтому версия расписания экзаменов обновляется здесь.
+"""
+from django.db.models import Count
+
+from .caching import bump_exam_catalog_version
+from .models import CourseStudent, Student
+
+CHUNK_SIZE = 1000
+
+
+def enroll_students(course, student_ids, chunk_size=CHUNK_SIZE):
+    """Записывает студентов (по id) на курс; возвращает число новых записей"""
+    student_ids = sorted(set(student_ids))
+    created = 0
+    for start in range(0, len(student_ids), chunk_size):
+        chunk = student_ids[start:start + chunk_size]
+        enrolled = set(CourseStudent.objects.filter(
+            course=course, student_id__in=chunk
+        ).values_list('student_id', flat=True))
+        new = [CourseStudent(course=course, student_id=student_id) for student_id in chunk if student_id not in enrolled]
+        # ignore_conflicts — на случай параллельной записи тех же студентов
+        CourseStudent.objects.bulk_create(new, ignore_conflicts=True)
+        created += len(new)
+    if created:
+        bump_exam_catalog_version()
+    return created
+
+
+def enroll_groups(course, groups):
+    """Записывает на курс активных студентов групп; возвращает {'matched': N, 'created': N}"""
+    student_ids = list(Student.objects.filter(group__in=groups, is_active=True).values_list('id', flat=True))
+    return {'matched': len(student_ids), 'created': enroll_students(course, student_ids)}
+
+
+def enroll_roster(course, numbers, chunk_size=CHUNK_SIZE):
+    """
+    Записывает на курс студентов по номерам (Student.student_id).
+    Возвращает {'matched': N, 'created': N, 'missing': [номера без студента]}.
+    """
+    numbers = sorted(set(numbers))
+    found = {}
+    for start in range(0, len(numbers), chunk_size):
+        found.update(Student.objects.filter(
+            student_id__in=numbers[start:start + chunk_size]
+        ).values_list('student_id', 'id'))
+    return {
+        'matched': len(found),
+        'created': enroll_students(course, found.values(), chunk_size),
+        'missing': [number for number in numbers if number not in found],
+    }
+
+
+def student_groups():
+    """Группы активных студентов с их количеством [(группа, N)]"""
+    return list(Student.objects.filter(is_active=True).exclude(group='').values_list('group').annotate(
+        count=Count('id')
+    ).order_by('group'))
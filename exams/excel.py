@@ -0,0 +1,140 @@
+# excel.py
+"""
+Чтение и запись таблиц Excel/CSV: импорт студентов, запись на курс, ведомости результатов (reports.py).
+
+pandas и openpyxl импортируются внутри функций при первом обращении: вместе они добавляют
+сотни миллисекунд и десятки мегабайт к запуску каждого воркера, а нужны только страницам
+импорта (manage.py bench_startup следит, чтобы они не попали в импорт приложения).
+"""
+import io
+import os
+
+STUDENT_COLUMNS = ['student_id', 'first_name', 'last_name', 'group', 'email']
+REQUIRED_STUDENT_COLUMNS = ['student_id', 'first_name', 'last_name']
+TEMPLATE_ROWS = [
+    ['STU001', 'Иван', 'Иванов', 'ИСТ-21', 'ivan@example.com'],
+    ['STU002', 'Мария', 'Петрова', 'ИСТ-21', 'maria@example.com'],
+    ['STU003', 'Петр', 'Сидоров', 'ИСТ-22', 'petr@example.com'],
+]
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def read_table(source, name=None):
+    """
+    Таблица .xlsx/.xls/.csv как DataFrame строк (пустые ячейки — NaN);
+    source — путь или загруженный файл, name — имя файла для определения формата.
+    """
+    import pandas as pd
+
+    name = name or getattr(source, 'name', None) or str(source)
+    if hasattr(source, 'seek'):
+        source.seek(0)  # загруженный файл мог быть уже прочитан при сохранении (StudentImport.uploaded_file)
+    if os.path.splitext(name)[1].lower() == '.csv':
+        return pd.read_csv(source, dtype=str)
+    return pd.read_excel(source, dtype=str)
+
+
+def read_roster(roster, name=None):
+    """Номера студентов (колонка student_id) из списка .xlsx/.xls/.csv"""
+    df = read_table(roster, name)
+    if 'student_id' not in df.columns:
+        raise ValueError('Отсутствует колонка student_id')
+    return [value.strip() for value in df['student_id'].dropna() if value.strip()]
+
+
+def read_students(source, name=None):
+    """
+    Строки файла импорта студентов: [(номер строки в файле, {колонка: значение})],
+    значения без пробелов по краям, пустые ячейки и отсутствующие необязательные колонки — ''.
+    ValueError — если нет обязательных колонок.
+    """
+    df = read_table(source, name)
+    missing_columns = [column for column in REQUIRED_STUDENT_COLUMNS if column not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Отсутствуют колонки: {', '.join(missing_columns)}")
+
+    columns = [column for column in STUDENT_COLUMNS if column in df.columns]
+    df = df[columns].fillna('')
+    return [
+        (index + 2, {column: str(row.get(column, '')).strip() for column in STUDENT_COLUMNS})
+        for index, row in zip(df.index, df.to_dict('records'))
+    ]
+
+
+def students_template():
+    """Шаблон .xlsx для импорта студентов с примером заполнения (байты файла)"""
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Студенты"
+    ws.append(STUDENT_COLUMNS)
+    for row in TEMPLATE_ROWS:
+        ws.append(row)
+
+    # Ширина колонок по самому длинному значению
+    for column in ws.columns:
+        width = max(len(str(cell.value)) for cell in column)
+        ws.column_dimensions[column[0].column_letter].width = min(width + 2, 50)
+
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+def result_sheet(report):
+    """
+    Ведомость попытки .xlsx (байты файла) из данных reports.report_data.
+    Выполняется в процессах пула ведомостей: только openpyxl, без Django и базы.
+    """
+    from openpyxl import Workbook
+    from openpyxl.styles import Alignment, Font
+
+    bold = Font(bold=True)
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Результат"
+    ws.append([report['exam']])
+    ws['A1'].font = Font(bold=True, size=14)
+    for label, value in [
+        ('Курс', report['course']),
+        ('Студент', report['student']),
+        ('ID студента', report['student_id']),
+        ('Группа', report['group']),
+        ('Попытка', report['attempt']),
+        ('Статус', report['status']),
+        ('Начало', report['start_time']),
+        ('Завершение', report['end_time']),
+        ('Баллы', f"{report['score']}/{report['max_score']}"),
+        ('Процент', report['percentage']),
+    ]:
+        ws.append([label, value])
+        ws.cell(ws.max_row, 1).font = bold
+
+    for title, rows in [('Предмет', report['subjects']), ('Сложность', report['difficulty'])]:
+        ws.append([])
+        ws.append([title, 'Правильных', 'Всего', 'Баллов'])
+        for cell in ws[ws.max_row]:
+            cell.font = bold
+        for row in rows:
+            ws.append(list(row))
+
+    answers = wb.create_sheet("Ответы")
+    answers.append(['№', 'Предмет', 'Сложность', 'Вопрос', 'Ответ студента', 'Правильный ответ', 'Оценка', 'Баллы'])
+    for cell in answers[1]:
+        cell.font = bold
+    for row in report['answers']:
+        answers.append(list(row))
+
+    ws.column_dimensions['A'].width = 20
+    ws.column_dimensions['B'].width = 40
+    for letter, width in zip('ABCDEFGH', [5, 20, 12, 60, 40, 40, 14, 8]):
+        answers.column_dimensions[letter].width = width
+    wrap = Alignment(wrap_text=True, vertical='top')
+    for row in answers.iter_rows(min_row=2, min_col=4, max_col=6):
+        for cell in row:
+            cell.alignment = wrap
+
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
@@ -0,0 +1,84 @@
+# expiry.py
+"""Фоновое завершение попыток, у которых истекло время или закрылся экзамен"""
+import logging
+
+from django.db import transaction
+from django.db.models import Case, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .attempt_state import forget_attempts
+from .breakdown import store_breakdowns
+from .caching import bump_results_version
+from .models import Exam, ExamResult, StudentAnswer
+from .stats import apply_deltas, collect_deltas
+
+logger = logging.getLogger(__name__)
+
+
+def due_attempts(now):
+    """Незавершенные попытки с истекшим сроком (по индексу status+deadline или по закрытию экзамена)"""
+    closed_exams = Exam.objects.filter(close_time__lte=now)
+    return ExamResult.objects.filter(status='in_progress').filter(
+        Q(deadline__lte=now) | Q(exam__in=closed_exams)
+    )
+
+
+def score_subquery():
+    """Сумма баллов попытки, посчитанная в SQL"""
+    points = StudentAnswer.objects.filter(
+        exam_result=OuterRef('pk')
+    ).values('exam_result').annotate(total=Sum('points_earned')).values('total')
+    return Coalesce(Subquery(points, output_field=FloatField()), Value(0.0))
+
+
+def expire_batch(now, batch_size):
+    """
+    Завершает одну пачку просроченных попыток несколькими запросами:
+    выборка id, UPDATE со счетом в SQL, разбор по предметам, чтение итогов для статистики,
+    версии результатов студентов; сбрасывает закэшированное состояние попыток.
+    Возвращает количество завершенных попыток.
+    """
+    with transaction.atomic():
+        rows = list(
+            due_attempts(now).select_for_update(skip_locked=True)
+            .order_by('deadline', 'id')
+            .values_list('id', 'exam_id', 'student_id')[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        ids = [result_id for result_id, _, _ in rows]
+        exams = Exam.objects.filter(id__in={exam_id for _, exam_id, _ in rows}).prefetch_related('exam_subjects')
+        max_scores = Case(
+            *[When(exam_id=exam.id, then=Value(float(exam.max_score()))) for exam in exams],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+
+        ExamResult.objects.filter(id__in=ids, status='in_progress').update(
+            status='time_expired',
+            end_time=now,
+            score=score_subquery(),
+            max_score=max_scores,
+        )
+
+        store_breakdowns(ids)
+        apply_deltas(collect_deltas(
+            ExamResult.objects.filter(id__in=ids).values_list('id', 'exam_id', 'score', 'max_score')
+        ))
+        bump_results_version({student_id for _, _, student_id in rows})
+        forget_attempts(ids)
+    logger.info('Попытки завершены по времени', extra={'event': 'expire', 'attempts': ids})
+    return len(rows)
+
+
+def expire_due_attempts(now=None, batch_size=500):
+    """Завершает все просроченные на момент now попытки пачками; возвращает их количество"""
+    now = now or timezone.now()
+    total = 0
+    while True:
+        expired = expire_batch(now, batch_size)
+        total += expired
+        if expired < batch_size:
+            return total
@@ -0,0 +1,128 @@
+# grading.py
+"""
+Ручная проверка открытых и текстовых ответов.
+
+Непроверенный ответ — is_correct IS NULL (так его сохраняет store_answer). Очередь идет по вопросам,
+ответы вопроса листаются по id (keyset, частичный индекс studentanswer_ungraded). Оценки страницы
+сохраняются одним bulk_update, затем баллы затронутых попыток пересчитываются одним UPDATE,
+а разбор по предметам, статистика экзаменов и версии результатов обновляются (rescoring).
+"""
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .breakdown import store_breakdowns
+from .caching import bump_results_version
+from .expiry import score_subquery
+from .models import FINISHED_STATUSES, ExamResult, ExamSubject, Question, StudentAnswer
+from .stats import apply_deltas, collect_deltas, subtract_deltas
+
+MANUAL_TYPES = ['open', 'text']
+PER_PAGE = 25
+BATCH_SIZE = 500
+
+
+def ungraded_answers():
+    """Непроверенные ответы завершенных попыток; ответы архивных попыток хранятся не в StudentAnswer"""
+    return StudentAnswer.objects.filter(
+        is_correct__isnull=True,
+        question__question_type__in=MANUAL_TYPES,
+        exam_result__status__in=FINISHED_STATUSES,
+        exam_result__archived_at__isnull=True,
+    )
+
+
+def grading_queue():
+    """Вопросы с непроверенными ответами: [(вопрос, количество)] по id вопроса"""
+    counts = dict(ungraded_answers().values_list('question').annotate(count=Count('id')).order_by('question'))
+    questions = Question.objects.select_related('subject__course').in_bulk(counts)
+    return [(questions[question_id], count) for question_id, count in counts.items()]
+
+
+def question_page(question, after=0, per_page=PER_PAGE):
+    """
+    Непроверенные ответы вопроса с id больше after (без данных студента: проверка вслепую).
+    Возвращает (ответы с атрибутом max_points, after следующей страницы или None).
+    """
+    answers = list(
+        ungraded_answers().filter(question=question, id__gt=after)
+        .select_related('question', 'exam_result__exam').order_by('id')[:per_page + 1]
+    )
+    next_after = answers[per_page - 1].id if len(answers) > per_page else None
+    answers = answers[:per_page]
+    limits = max_points(answers)
+    for student_answer in answers:
+        student_answer.max_points = limits[student_answer.id]
+    return answers, next_after
+
+
+def max_points(student_answers):
+    """Максимальный балл за ответы {id: баллы} по ExamSubject экзамена попытки (нужны question и exam_result)"""
+    exam_subjects = {
+        (exam_subject.exam_id, exam_subject.subject_id): exam_subject
+        for exam_subject in ExamSubject.objects.filter(
+            exam_id__in={student_answer.exam_result.exam_id for student_answer in student_answers},
+            subject_id__in={student_answer.question.subject_id for student_answer in student_answers},
+        )
+    }
+    limits = {}
+    for student_answer in student_answers:
+        exam_subject = exam_subjects.get((student_answer.exam_result.exam_id, student_answer.question.subject_id))
+        limits[student_answer.id] = exam_subject.points(student_answer.question.difficulty) if exam_subject else 0
+    return limits
+
+
+@contextmanager
+def rescoring(result_ids, update_stats=True):
+    """
+    Пересчет завершенных попыток после изменения баллов их ответов внутри блока with:
+    счет одним UPDATE, разбор по предметам, статистика (разница вклада до и после) и версии результатов.
+    update_stats=False — статистику вызывающий пересчитает сам (вклад «до» считается по текущим
+    баллам ExamSubject, поэтому после их изменения разница неверна). Архивные попытки не пересчитываются.
+    """
+    results = ExamResult.objects.filter(id__in=list(result_ids), status__in=FINISHED_STATUSES, archived_at__isnull=True)
+    with transaction.atomic():
+        rows = list(results.select_for_update().values_list('id', 'exam_id', 'score', 'max_score', 'student_id'))
+        before = collect_deltas(row[:4] for row in rows) if update_stats else None
+        yield
+        ids = [row[0] for row in rows]
+        if not ids:
+            return
+        ExamResult.objects.filter(id__in=ids).update(score=score_subquery())
+        store_breakdowns(ids)
+        if update_stats:
+            after = collect_deltas(ExamResult.objects.filter(id__in=ids).values_list('id', 'exam_id', 'score', 'max_score'))
+            apply_deltas(subtract_deltas(after, before))
+        bump_results_version({row[4] for row in rows})
+
+
+def grade_answers(grades, grader=''):
+    """
+    Сохраняет оценки {student_answer_id: баллы} одной пачкой; проверенные ранее ответы можно переоценить.
+    Полный балл за вопрос считается правильным ответом. Возвращает число сохраненных оценок,
+    ValueError — если балл вне пределов от 0 до максимума за вопрос (тогда не сохраняется ничего).
+    """
+    student_answers = list(StudentAnswer.objects.select_related('question', 'exam_result').filter(
+        id__in=list(grades),
+        question__question_type__in=MANUAL_TYPES,
+        exam_result__status__in=FINISHED_STATUSES,
+        exam_result__archived_at__isnull=True,
+    ))
+    limits = max_points(student_answers)
+    now = timezone.now()
+    for student_answer in student_answers:
+        points, limit = grades[student_answer.id], limits[student_answer.id]
+        if not 0 <= points <= limit:
+            raise ValueError(f'Балл за ответ #{student_answer.id} должен быть от 0 до {limit}')
+        student_answer.points_earned = points
+        student_answer.is_correct = points == limit > 0
+        student_answer.graded_by = grader
+        student_answer.graded_at = now
+
+    with rescoring({student_answer.exam_result_id for student_answer in student_answers}):
+        StudentAnswer.objects.bulk_update(
+            student_answers, ['is_correct', 'points_earned', 'graded_by', 'graded_at'], batch_size=BATCH_SIZE
+        )
+    return len(student_answers)
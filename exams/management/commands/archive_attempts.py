@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from exams.archive import archive_after_days, archive_attempts
+
+
+class Command(BaseCommand):
+    help = 'Переносит ответы старых завершенных попыток в сжатый архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Архивировать попытки, завершенные раньше стольких дней назад '
+                                 '(по умолчанию EXAM_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        days = archive_after_days() if options['days'] is None else options['days']
+        archived = archive_attempts(days, options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Перенесено в архив попыток старше {days} дн.: {archived}')
+        )
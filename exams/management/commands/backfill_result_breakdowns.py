@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from exams.breakdown import store_breakdowns
+from exams.models import ExamResult
+from exams.models import FINISHED_STATUSES
+
+
+class Command(BaseCommand):
+    help = 'Сохраняет разбор по предметам и сложности для завершенных результатов без него (кроме архивных)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--all', action='store_true',
+                            help='Пересчитать разбор и для результатов, где он уже есть')
+
+    def handle(self, *args, **options):
+        results = ExamResult.objects.filter(status__in=FINISHED_STATUSES, archived_at__isnull=True)
+        if not options['all']:
+            results = results.filter(breakdown__isnull=True)
+
+        batch_size = options['batch_size']
+        processed = 0
+        last_id = 0
+        while True:
+            ids = list(results.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            store_breakdowns(ids, batch_size)
+            processed += len(ids)
+            last_id = ids[-1]
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Разбор сохранен для результатов: {processed}')
+        )
@@ -0,0 +1,71 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from exams.caching import student_question_cards
+from exams.models import *
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает рендер страницы экзамена с кэшем карточек вопросов и без него (данные откатываются)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=150)
+        parser.add_argument('--answers', type=int, default=4)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            exam_result = self.create_attempt(options['questions'], options['answers'])
+            student_answers = exam_result.student_answers.select_related('question', 'question__subject').order_by('id')
+
+            cold = self.measure(lambda: (cache.clear(), self.render(exam_result, student_answers)), options['repeat'])
+            self.render(exam_result, student_answers)
+            warm = self.measure(lambda: self.render(exam_result, student_answers), options['repeat'])
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"Вопросов: {options['questions']}, повторов: {options['repeat']}")
+        self.stdout.write(f'Без кэша:   {cold * 1000:.1f} мс на страницу')
+        self.stdout.write(f'Из кэша:    {warm * 1000:.1f} мс на страницу')
+        self.stdout.write(self.style.SUCCESS(f'Ускорение: x{cold / warm:.1f}'))
+
+    def render(self, exam_result, student_answers):
+        return render_to_string('exams/take_exam.html', {
+            'exam_result': exam_result,
+            'question_cards': student_question_cards(student_answers),
+            'time_remaining': exam_result.time_remaining(),
+        })
+
+    def measure(self, func, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - started) / repeat
+
+    def create_attempt(self, questions_count, answers_count):
+        course = Course.objects.create(name='Benchmark')
+        subject = Subject.objects.create(name='Benchmark', course=course)
+        student = Student.objects.create(student_id='BENCH-0001', first_name='Bench', last_name='Mark')
+        now = timezone.now()
+        exam = Exam.objects.create(
+            course=course, name='Benchmark', open_time=now, close_time=now + timedelta(hours=3),
+            duration_minutes=180,
+        )
+        exam_result = ExamResult.objects.create(exam=exam, student=student, start_time=now)
+        for i in range(questions_count):
+            question = Question.objects.create(
+                subject=subject,
+                text_md=f'Вопрос {i}: **Markdown** текст с формулой $x^{i}$',
+                question_type='multiple_choice' if i % 2 else 'single_choice',
+                next_answer_position=answers_count,
+            )
+            Answer.objects.bulk_create([
+                Answer(question=question, position=j, text_md=f'Вариант {j}', is_correct=(j == 0))
+                for j in range(answers_count)
+            ])
+            StudentAnswer.objects.create(exam_result=exam_result, question=question)
+        return exam_result
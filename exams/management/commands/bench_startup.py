@@ -0,0 +1,106 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Загрузка воркера в отдельном интерпретаторе: приложение и URLconf (его Django иначе грузит на первом запросе)
+WORKER_SCRIPT = '''
+import importlib, json, sys
+importlib.import_module(sys.argv[1])
+from django.urls import get_resolver
+get_resolver().url_patterns
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+except ImportError:
+    rss = None
+print(json.dumps({'rss': rss, 'modules': sorted(sys.modules)}))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Время импорта (python -X importtime) и память воркера при запуске в отдельном процессе; '
+        'ошибка, если превышен бюджет или загружены тяжелые модули (pandas, openpyxl — см. exams/excel.py)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--app', default='exam_system.asgi', help='Модуль приложения, который грузит воркер')
+        parser.add_argument('--repeat', type=int, default=3, help='Запусков; берется самый быстрый')
+        parser.add_argument('--budget-ms', type=float, default=settings.WORKER_IMPORT_BUDGET_MS,
+                            help='Предел времени импорта, мс (по умолчанию WORKER_IMPORT_BUDGET_MS)')
+        parser.add_argument('--max-rss-mb', type=float, default=settings.WORKER_RSS_BUDGET_MB,
+                            help='Предел памяти процесса, МБ (по умолчанию WORKER_RSS_BUDGET_MB)')
+        parser.add_argument('--forbid', action='append', default=None,
+                            help='Модуль, который не должен загружаться при запуске (можно несколько раз)')
+        parser.add_argument('--top', type=int, default=10, help='Сколько пакетов показать')
+
+    def handle(self, *args, **options):
+        forbidden = options['forbid'] or settings.WORKER_LAZY_MODULES
+        runs = [self.run_worker(options['app']) for _ in range(max(options['repeat'], 1))]
+        run = min(runs, key=lambda run: run['import_ms'])
+
+        self.stdout.write(f"Импорт: {run['import_ms']:.0f} мс (лучший из {len(runs)}), "
+                          f"запуск процесса: {run['wall_ms']:.0f} мс, модулей: {len(run['modules'])}")
+        if run['rss'] is not None:
+            self.stdout.write(f"Память: {run['rss'] / 2 ** 20:.1f} МБ")
+        self.stdout.write('Собственное время импорта по пакетам:')
+        for package, us in sorted(run['packages'].items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'  {package:<30}{us / 1000:>8.1f} мс')
+
+        problems = []
+        if run['import_ms'] > options['budget_ms']:
+            problems.append(f"импорт {run['import_ms']:.0f} мс больше бюджета {options['budget_ms']:.0f} мс")
+        if run['rss'] is not None and run['rss'] / 2 ** 20 > options['max_rss_mb']:
+            problems.append(f"память {run['rss'] / 2 ** 20:.1f} МБ больше бюджета {options['max_rss_mb']:.0f} МБ")
+        for module in forbidden:
+            if module in run['modules']:
+                importer = run['importers'].get(module)
+                problems.append(f'загружен {module}' + (f' (импортирует {importer})' if importer else ''))
+        if problems:
+            raise CommandError('Запуск воркера вне бюджета: ' + '; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('Запуск воркера в пределах бюджета'))
+
+    def run_worker(self, app):
+        started = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', WORKER_SCRIPT, app],
+            capture_output=True, text=True, env=os.environ.copy(),
+        )
+        wall_ms = (time.perf_counter() - started) * 1000
+        if process.returncode:
+            raise CommandError(f'Воркер не запустился:\n{process.stderr[-2000:]}')
+        report = json.loads(process.stdout.strip().splitlines()[-1])
+        report.update(parse_importtime(process.stderr), wall_ms=wall_ms)
+        return report
+
+
+def parse_importtime(output):
+    """
+    Разбор вывода -X importtime: общее время (сумма модулей верхнего уровня), собственное время
+    по пакетам и кто первым импортировал каждый модуль (вывод идет от вложенных импортов к родителю)
+    """
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((int(self_us), int(cumulative_us), name.strip(), depth))
+
+    packages = {}
+    importers = {}
+    for index, (self_us, _, name, depth) in enumerate(entries):
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+        parent = next((entry[2] for entry in entries[index + 1:] if entry[3] < depth), None)
+        importers.setdefault(name, parent)
+    return {
+        'import_ms': sum(cumulative_us for _, cumulative_us, _, depth in entries if depth == 0) / 1000,
+        'packages': packages,
+        'importers': importers,
+    }
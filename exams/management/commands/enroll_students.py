@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from exams.enrollment import enroll_groups, enroll_roster
+from exams.excel import read_roster
+from exams.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Записывает студентов на курс по группам и/или по списку из файла (.xlsx, .xls, .csv с колонкой student_id)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, required=True, help='id курса')
+        parser.add_argument('--group', action='append', default=[], help='Группа студентов (можно несколько)')
+        parser.add_argument('--roster', help='Файл со списком студентов')
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.get(pk=options['course'])
+        except Course.DoesNotExist:
+            raise CommandError(f"Курс {options['course']} не найден")
+        if not options['group'] and not options['roster']:
+            raise CommandError('Укажите --group или --roster')
+
+        matched = created = 0
+        if options['group']:
+            result = enroll_groups(course, options['group'])
+            matched += result['matched']
+            created += result['created']
+        if options['roster']:
+            try:
+                numbers = read_roster(options['roster'])
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Не удалось прочитать список: {e}')
+            result = enroll_roster(course, numbers)
+            matched += result['matched']
+            created += result['created']
+            for number in result['missing']:
+                self.stdout.write(self.style.WARNING(f'Студент {number} не найден'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Курс «{course.name}»: найдено студентов {matched}, записано новых {created}'
+        ))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from exams.expiry import expire_due_attempts
+
+
+class Command(BaseCommand):
+    help = 'Завершает попытки, у которых истекло время или закрылся экзамен'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Количество попыток, завершаемых одним запросом')
+        parser.add_argument('--loop', action='store_true',
+                            help='Работать постоянно, проверяя просроченные попытки с интервалом')
+        parser.add_argument('--interval', type=int, default=30,
+                            help='Интервал проверки в секундах (для --loop)')
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expire_due_attempts(batch_size=options['batch_size'])
+            if expired or not options['loop']:
+                self.stdout.write(
+                    self.style.SUCCESS(f'Завершено попыток: {expired}')
+                )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from exams.dedup import DEFAULT_THRESHOLD, find_duplicates
+
+
+class Command(BaseCommand):
+    help = (
+        'Ищет почти одинаковые вопросы внутри предметов (MinHash/LSH). По умолчанию пересчитывает '
+        'только новые и измененные вопросы и группы их предметов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subject', type=int, action='append', help='id предмета (можно несколько)')
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='Минимальное сходство дубликатов, 0..1 (по умолчанию %(default)s)')
+        parser.add_argument('--rebuild', action='store_true', help='Пересчитать все подписи и группы')
+
+    def handle(self, *args, **options):
+        result = find_duplicates(
+            subject_ids=options['subject'],
+            threshold=options['threshold'],
+            rebuild=options['rebuild'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Подписей пересчитано: {result['signatures']}, предметов перегруппировано: {result['subjects']}, "
+            f"групп дубликатов в них: {result['clusters']}"
+        ))
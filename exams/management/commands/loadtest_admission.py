@@ -0,0 +1,235 @@
+import json
+import multiprocessing
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from exams.models import *
+
+STATUS_URL_RE = re.compile(r'const statusUrl = "([^"]+)"')
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест начала экзамена: задержка save_answer у отвечающих студентов во время наплыва '
+        'стартов без допуска и с допуском (exams/admission.py). Тестовые данные удаляются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=200, help='Студентов, одновременно начинающих экзамен')
+        parser.add_argument('--active', type=int, default=20, help='Студентов, уже отвечающих на вопросы')
+        parser.add_argument('--save-interval', type=float, default=0.2, help='Пауза между сохранениями, сек')
+        parser.add_argument('--rate', type=float, help='Попыток в секунду с допуском (по умолчанию EXAM_ADMISSION_RATE)')
+        parser.add_argument('--burst', type=int, help='Стартов без очереди (по умолчанию EXAM_ADMISSION_BURST)')
+        parser.add_argument('--arrival', type=float, default=5, help='За сколько секунд приходит вся волна стартов')
+        parser.add_argument('--baseline', type=float, default=5, help='Длительность замера без стартов, сек')
+        parser.add_argument('--timeout', type=float, default=300, help='Предел ожидания одного старта, сек')
+
+    def handle(self, *args, **options):
+        self.options = options
+        rate = options['rate'] or getattr(settings, 'EXAM_ADMISSION_RATE', 0) or 10
+        burst = options['burst'] or getattr(settings, 'EXAM_ADMISSION_BURST', 20)
+
+        course, exams, savers, starters = self.create_data(options['students'], options['active'])
+        try:
+            with override_settings(EXAM_ADMISSION_RATE=0):
+                attempts = [self.start_attempt(student, exams[0]) for student in savers]
+
+            # Отвечающие — в отдельном процессе, как другой воркер сервера: общая у них только база,
+            # поэтому их задержка показывает конкуренцию за базу, а не за GIL процесса со стартами
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            stop = context.Event()
+            samples = context.Queue()
+            process = context.Process(target=self.save_process, args=(savers, attempts, stop, samples))
+            process.start()
+
+            rows = []
+            started = time.time()
+            time.sleep(options['baseline'])
+            rows.append(('Без стартов', started, time.time(), None))
+
+            started = time.time()
+            with override_settings(EXAM_ADMISSION_RATE=0):
+                rush = self.rush(starters, exams[1])
+            rows.append(('Старты без допуска', started, time.time(), rush))
+
+            started = time.time()
+            with override_settings(EXAM_ADMISSION_RATE=rate, EXAM_ADMISSION_BURST=burst):
+                rush = self.rush(starters, exams[2])
+            rows.append((f'Старты с допуском ({rate:g}/с)', started, time.time(), rush))
+
+            stop.set()
+            saves = samples.get()
+            process.join()
+            self.report(rows, saves)
+        finally:
+            self.cleanup(course, savers + starters)
+
+    # ----------------------
+    # Данные
+    # ----------------------
+
+    def create_data(self, students_count, active_count):
+        course = Course.objects.create(name='Loadtest')
+        subject = Subject.objects.create(name='Loadtest', course=course)
+        for i in range(60):
+            question = Question.objects.create(
+                subject=subject, text_md=f'Вопрос нагрузочного теста {i}',
+                difficulty=['easy', 'medium', 'hard'][i % 3],
+            )
+            for j in range(4):
+                Answer.objects.create(question=question, text_md=f'Вариант {j}', is_correct=(j == 0))
+
+        now = timezone.now()
+        exams = []
+        for name in ['Отвечающие', 'Без допуска', 'С допуском']:
+            exam = Exam.objects.create(
+                course=course, name=f'Loadtest: {name}', open_time=now - timedelta(minutes=1),
+                close_time=now + timedelta(hours=3), duration_minutes=180,
+            )
+            ExamSubject.objects.create(exam=exam, subject=subject, easy_count=5, medium_count=5, hard_count=5)
+            exams.append(exam)
+
+        students = Student.objects.bulk_create([
+            Student(student_id=f'LOADTEST-{i:05d}', first_name='Load', last_name=f'Test {i}')
+            for i in range(students_count + active_count)
+        ])
+        CourseStudent.objects.bulk_create([CourseStudent(course=course, student=student) for student in students])
+        return course, exams, students[:active_count], students[active_count:]
+
+    def cleanup(self, course, students):
+        ExamResult.objects.filter(student__in=students).delete()
+        course.delete()
+        Student.objects.filter(id__in=[student.id for student in students]).delete()
+
+    # ----------------------
+    # Клиенты
+    # ----------------------
+
+    def login(self, student):
+        # Ошибки запросов других потоков не должны выбрасываться в этом клиенте: считаем их по статусу
+        client = Client(raise_request_exception=False)
+        client.post(reverse('student_login'), {'student_id': student.student_id})
+        return client
+
+    def start_attempt(self, student, exam):
+        client = self.login(student)
+        client.get(reverse('start_exam', args=[exam.id]))
+        return ExamResult.objects.get(exam=exam, student=student)
+
+    def save_process(self, students, attempts, stop, samples):
+        """Сохранения ответов до stop; в samples уходит список (время, секунд, успех)"""
+        saves = []
+        threads = [
+            threading.Thread(target=self.save_loop, args=(student, attempt, stop, saves))
+            for student, attempt in zip(students, attempts)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        samples.put(saves)
+
+    def save_loop(self, student, attempt, stop, saves):
+        client = self.login(student)
+        url = reverse('save_answer', args=[attempt.id])
+        questions = [
+            (student_answer.id, [answer.id for answer in student_answer.question.answers.all()])
+            for student_answer in attempt.student_answers.prefetch_related('question__answers')
+        ]
+        try:
+            while not stop.is_set():
+                student_answer_id, answer_ids = random.choice(questions)
+                payload = json.dumps({'student_answer_id': student_answer_id, 'answer_ids': [random.choice(answer_ids)]})
+                sent = time.time()
+                started = time.perf_counter()
+                response = client.post(url, payload, content_type='application/json')
+                elapsed = time.perf_counter() - started
+                ok = response.status_code == 200 and response.json().get('success')
+                saves.append((sent, elapsed, bool(ok)))  # list.append потокобезопасен
+                time.sleep(self.options['save_interval'])
+        finally:
+            connections.close_all()
+
+    def start_one(self, client, exam):
+        """Старт как в браузере: при очереди — опрос статуса, затем повтор старта; (секунд, ошибка или None)"""
+        time.sleep(random.random() * self.options['arrival'])
+        started = time.perf_counter()
+        start_url = reverse('start_exam', args=[exam.id])
+        waiting_url = reverse('exam_waiting_room', args=[exam.id])
+        take_prefix = reverse('take_exam', args=[0])[:-2]
+        try:
+            while time.perf_counter() - started < self.options['timeout']:
+                response = client.get(start_url)
+                if response.status_code == 302 and response.url.startswith(take_prefix):
+                    return time.perf_counter() - started, None
+                if response.status_code != 302 or response.url != waiting_url:
+                    return time.perf_counter() - started, f'start_exam: {response.status_code}'
+                page = client.get(waiting_url)
+                if page.status_code != 200:
+                    continue  # очередь уже подошла — страница ожидания вернула на старт
+                status_url = STATUS_URL_RE.search(page.content.decode()).group(1)
+                # Как страница ожидания: пауза retry_after со случайным сдвигом между опросами
+                status = None
+                while status is None or not status['admitted']:
+                    if status is not None:
+                        time.sleep(status['retry_after'] * (1 + random.random() / 2))
+                    response = client.get(status_url)
+                    status = response.json() if response.status_code == 200 else {'admitted': False, 'retry_after': 1}
+            return time.perf_counter() - started, 'timeout'
+        finally:
+            connections.close_all()
+
+    def rush(self, students, exam):
+        # Студенты вошли заранее: измеряется только наплыв стартов
+        clients = [self.login(student) for student in students]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+            results = list(executor.map(lambda client: self.start_one(client, exam), clients))
+        errors = {}
+        for _, error in results:
+            if error:
+                errors[error] = errors.get(error, 0) + 1
+        return {
+            'seconds': time.perf_counter() - started,
+            'started': ExamResult.objects.filter(exam=exam).count(),
+            'errors': errors,
+            'p99_start': percentile([elapsed for elapsed, _ in results], 99),
+        }
+
+    # ----------------------
+    # Отчет
+    # ----------------------
+
+    def report(self, rows, saves):
+        self.stdout.write(f"{'Фаза':<28}{'сохранений':>11}{'p50, мс':>9}{'p99, мс':>9}{'ошибок':>8}"
+                          f"{'стартов':>9}{'за, с':>8}{'p99 старта, с':>15}")
+        for phase, started, finished, rush in rows:
+            phase_saves = [(elapsed, ok) for sent, elapsed, ok in saves if started <= sent < finished]
+            latencies = [elapsed for elapsed, _ in phase_saves]
+            errors = sum(1 for _, ok in phase_saves if not ok)
+            line = (f'{phase:<28}{len(latencies):>11}{percentile(latencies, 50) * 1000:>9.1f}'
+                    f'{percentile(latencies, 99) * 1000:>9.1f}{errors:>8}')
+            if rush:
+                line += f"{rush['started']:>9}{rush['seconds']:>8.1f}{rush['p99_start']:>15.1f}"
+                if rush['errors']:
+                    line += '  ошибки старта: ' + ', '.join(f'{error} ×{count}' for error, count in rush['errors'].items())
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS('Нагрузочный тест завершен'))
+
+
+def percentile(values, percent):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
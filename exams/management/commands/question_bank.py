@@ -0,0 +1,60 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from exams.bank import export_bank, import_bank
+from exams.models import Course, Subject
+
+
+class Command(BaseCommand):
+    help = 'Импорт и экспорт банка вопросов курса в формате JSONL (см. exams/bank.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['import', 'export'])
+        parser.add_argument('path', nargs='?', default='-',
+                            help='Файл JSONL (по умолчанию stdin/stdout)')
+        parser.add_argument('--course', type=int, required=True, help='ID курса')
+        parser.add_argument('--subject', type=int, help='ID предмета (только для экспорта)')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.get(pk=options['course'])
+        except Course.DoesNotExist:
+            raise CommandError(f'Курс {options["course"]} не найден')
+
+        if options['action'] == 'export':
+            self.export(course, options)
+        else:
+            self.import_(course, options)
+
+    def export(self, course, options):
+        subject = None
+        if options['subject']:
+            subject = Subject.objects.filter(pk=options['subject'], course=course).first()
+            if subject is None:
+                raise CommandError(f'Предмет {options["subject"]} не найден в курсе')
+
+        lines = export_bank(course, subject, options['chunk_size'])
+        if options['path'] == '-':
+            sys.stdout.writelines(lines)
+            return
+        count = 0
+        with open(options['path'], 'w', encoding='utf-8') as f:
+            for line in lines:
+                f.write(line)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f'Выгружено вопросов: {count}'))
+
+    def import_(self, course, options):
+        if options['path'] == '-':
+            result = import_bank(course, sys.stdin, options['chunk_size'])
+        else:
+            with open(options['path'], encoding='utf-8') as f:
+                result = import_bank(course, f, options['chunk_size'])
+
+        for line_number, error in result['errors'][:20]:
+            self.stderr.write(f'Строка {line_number}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт завершен! Создано: {result["created"]}, пропущено (уже есть): {result["skipped"]}, '
+            f'ошибок: {len(result["errors"])}'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from exams.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает материализованную статистику экзаменов (ExamStats)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', type=int, action='append', dest='exams',
+                            help='ID экзамена (можно указать несколько раз)')
+
+    def handle(self, *args, **options):
+        rebuild_stats(options['exams'])
+        self.stdout.write(
+            self.style.SUCCESS('Статистика экзаменов пересчитана')
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from exams.search import enabled, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Полностью перестраивает полнотекстовый индекс вопросов и вариантов ответов'
+
+    def handle(self, *args, **options):
+        if not enabled():
+            self.stdout.write(self.style.WARNING('Полнотекстовый поиск не поддерживается этой СУБД'))
+            return
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс перестроен'))
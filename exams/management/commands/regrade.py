@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from exams.models import Exam
+from exams.regrade import diff_rows, exams_with_questions, regrade
+
+
+class Command(BaseCommand):
+    help = (
+        'Перепроверяет ответы с вариантами по текущему ключу и баллам ExamSubject '
+        'и пересчитывает счет попыток (exams/regrade.py)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', type=int, action='append', dest='exams',
+                            help='ID экзамена (можно указать несколько раз)')
+        parser.add_argument('--question', type=int, action='append', dest='questions',
+                            help='ID вопроса с исправленным ключом (можно указать несколько раз)')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать разницу, ничего не записывать')
+        parser.add_argument('--show', type=int, default=20, help='Сколько попыток показать по каждому экзамену')
+
+    def handle(self, *args, **options):
+        if options['exams']:
+            exams = Exam.objects.filter(id__in=options['exams'])
+        elif options['questions']:
+            exams = exams_with_questions(options['questions'])
+        else:
+            raise CommandError('Укажите --exam или --question')
+
+        report = regrade(exams.order_by('id'), options['questions'], options['dry_run'])
+        for exam, diff in report:
+            self.stdout.write(
+                f"{exam.name} (#{exam.id}): ответов {diff['answers']}, попыток {len(diff['results'])}"
+            )
+            for result, before, after in diff_rows(diff, options['show']):
+                if before is None:
+                    self.stdout.write(f'  #{result.id} {result.student}: не завершена')
+                else:
+                    self.stdout.write(
+                        f'  #{result.id} {result.student}: {before[0]:g}/{before[1]:g} -> {after[0]:g}/{after[1]:g}'
+                    )
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Пробный прогон: изменится экзаменов {len(report)}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Перепроверено экзаменов: {len(report)}'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from exams.models import ExamResult
+from exams.reports import report_results, report_workers, zip_reports
+
+
+class Command(BaseCommand):
+    help = 'ZIP с ведомостями (.xlsx) завершенных попыток экзамена по студентам (exams/reports.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Путь к создаваемому .zip')
+        parser.add_argument('--exam', type=int, action='append', dest='exams', required=True,
+                            help='ID экзамена (можно указать несколько раз)')
+        parser.add_argument('--group', action='append', dest='groups',
+                            help='Только студенты группы (можно указать несколько раз)')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Процессов пула (по умолчанию EXAM_REPORT_WORKERS)')
+
+    def handle(self, *args, **options):
+        results = ExamResult.objects.filter(exam_id__in=options['exams'])
+        if options['groups']:
+            results = results.filter(student__group__in=options['groups'])
+        if not report_results(results).exists():
+            raise CommandError('Нет завершенных попыток для ведомостей')
+
+        workers = options['workers'] or report_workers()
+        size = 0
+        with open(options['output'], 'wb') as output:
+            for chunk in zip_reports(results, workers):
+                output.write(chunk)
+                size += len(chunk)
+        self.stdout.write(self.style.SUCCESS(
+            f"Ведомости записаны в {options['output']} ({size / 2 ** 20:.1f} МБ, процессов: {workers})"
+        ))
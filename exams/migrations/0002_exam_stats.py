@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('results_count', models.IntegerField(default=0, verbose_name='Результатов')),
+                ('passed_count', models.IntegerField(default=0, verbose_name='Сдали')),
+                ('score_sum', models.FloatField(default=0)),
+                ('score_sq_sum', models.FloatField(default=0)),
+                ('max_score_sum', models.FloatField(default=0)),
+                ('histogram', models.JSONField(default=list, verbose_name='Распределение, %')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='exams.exam')),
+                ('subject', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='exams.subject', verbose_name='Предмет')),
+            ],
+            options={
+                'verbose_name': 'Статистика экзамена',
+                'verbose_name_plural': 'Статистика экзаменов',
+                'constraints': [models.UniqueConstraint(fields=('exam', 'subject'), name='unique_exam_subject_stats'), models.UniqueConstraint(condition=models.Q(('subject__isnull', True)), fields=('exam',), name='unique_exam_total_stats')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:01
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def fill_deadlines(apps, schema_editor):
+    """Крайний срок для уже начатых попыток"""
+    ExamResult = apps.get_model('exams', 'ExamResult')
+    results = ExamResult.objects.filter(status='in_progress', start_time__isnull=False).select_related('exam')
+    for result in results.iterator():
+        result.deadline = min(
+            result.start_time + timedelta(minutes=result.exam.duration_minutes),
+            result.exam.close_time,
+        )
+        result.save(update_fields=['deadline'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0002_exam_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examresult',
+            name='deadline',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Крайний срок'),
+        ),
+        migrations.AddIndex(
+            model_name='examresult',
+            index=models.Index(fields=['status', 'deadline'], name='examresult_status_deadline'),
+        ),
+        migrations.RunPython(fill_deadlines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0003_exam_result_deadline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='content_version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
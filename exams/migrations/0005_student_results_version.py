@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0004_question_content_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='results_version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0005_student_results_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='examresult',
+            index=models.Index(fields=['student', '-start_time', '-id'], name='examresult_student_history'),
+        ),
+        migrations.AddIndex(
+            model_name='examresult',
+            index=models.Index(fields=['-start_time', '-id'], name='examresult_start_time_id'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0006_exam_result_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examresult',
+            name='breakdown',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0007_exam_result_breakdown'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAttempt',
+            fields=[
+                ('exam_result', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archive', serialize=False, to='exams.examresult')),
+                ('data', models.BinaryField(verbose_name='Ответы (zlib + JSON)')),
+                ('answers_count', models.IntegerField(default=0, verbose_name='Ответов')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Архив попытки',
+                'verbose_name_plural': 'Архив попыток',
+            },
+        ),
+        migrations.AddField(
+            model_name='examresult',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='В архиве с'),
+        ),
+    ]
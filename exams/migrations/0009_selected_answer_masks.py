@@ -0,0 +1,136 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:40
+
+import json
+import zlib
+from collections import defaultdict
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def unpack(data):
+    return json.loads(zlib.decompress(bytes(data)))
+
+
+def pack(answers):
+    return zlib.compress(json.dumps(answers, separators=(',', ':')).encode(), 9)
+
+
+def mask_of(positions):
+    mask = 0
+    for position in positions:
+        mask |= 1 << position
+    return mask
+
+
+def fill_masks(apps, schema_editor):
+    """Позиции вариантов по порядку id, маски правильных ответов, выбранные варианты из M2M и архива"""
+    Answer = apps.get_model('exams', 'Answer')
+    Question = apps.get_model('exams', 'Question')
+    StudentAnswer = apps.get_model('exams', 'StudentAnswer')
+    ArchivedAttempt = apps.get_model('exams', 'ArchivedAttempt')
+
+    positions = {}
+    correct = defaultdict(list)
+    answers = []
+    last_question, position = None, 0
+    for answer in Answer.objects.order_by('question_id', 'id').only('id', 'question_id', 'is_correct').iterator():
+        position = position + 1 if answer.question_id == last_question else 0
+        last_question = answer.question_id
+        answer.position = position
+        positions[answer.id] = position
+        if answer.is_correct:
+            correct[answer.question_id].append(position)
+        answers.append(answer)
+    Answer.objects.bulk_update(answers, ['position'], batch_size=BATCH_SIZE)
+    Question.objects.bulk_update(
+        [Question(id=question_id, correct_mask=mask_of(items)) for question_id, items in correct.items()],
+        ['correct_mask'], batch_size=BATCH_SIZE,
+    )
+
+    selected = defaultdict(list)
+    through = StudentAnswer.selected_answers.through.objects.values_list('studentanswer_id', 'answer_id')
+    for student_answer_id, answer_id in through.iterator():
+        selected[student_answer_id].append(positions[answer_id])
+    StudentAnswer.objects.bulk_update(
+        [StudentAnswer(id=student_answer_id, selected_mask=mask_of(items)) for student_answer_id, items in selected.items()],
+        ['selected_mask'], batch_size=BATCH_SIZE,
+    )
+
+    for archive in ArchivedAttempt.objects.iterator():
+        rows = unpack(archive.data)
+        for row in rows:
+            row['selected_mask'] = mask_of(positions[answer_id] for answer_id in row.pop('selected') if answer_id in positions)
+        archive.data = pack(rows)
+        archive.save(update_fields=['data'])
+
+
+def fill_selected_answers(apps, schema_editor):
+    Answer = apps.get_model('exams', 'Answer')
+    StudentAnswer = apps.get_model('exams', 'StudentAnswer')
+    ArchivedAttempt = apps.get_model('exams', 'ArchivedAttempt')
+    Through = StudentAnswer.selected_answers.through
+
+    answer_ids = {
+        (question_id, position): answer_id
+        for answer_id, question_id, position in Answer.objects.values_list('id', 'question_id', 'position')
+    }
+
+    def ids_of(question_id, mask):
+        position, ids = 0, []
+        while mask:
+            if mask & 1 and (question_id, position) in answer_ids:
+                ids.append(answer_ids[(question_id, position)])
+            mask >>= 1
+            position += 1
+        return ids
+
+    rows = []
+    for student_answer_id, question_id, mask in StudentAnswer.objects.exclude(selected_mask=0).values_list(
+        'id', 'question_id', 'selected_mask'
+    ).iterator():
+        rows.extend(Through(studentanswer_id=student_answer_id, answer_id=answer_id) for answer_id in ids_of(question_id, mask))
+    Through.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+    for archive in ArchivedAttempt.objects.iterator():
+        rows = unpack(archive.data)
+        for row in rows:
+            row['selected'] = ids_of(row['question'], row.pop('selected_mask'))
+        archive.data = pack(rows)
+        archive.save(update_fields=['data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0008_archived_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='position',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Позиция'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='correct_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='studentanswer',
+            name='selected_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_masks, fill_selected_answers),
+        migrations.AddConstraint(
+            model_name='answer',
+            constraint=models.UniqueConstraint(fields=('question', 'position'), name='unique_answer_position'),
+        ),
+        migrations.RemoveField(
+            model_name='studentanswer',
+            name='selected_answers',
+        ),
+    ]
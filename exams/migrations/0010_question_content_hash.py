@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-19 00:05
+
+import hashlib
+import json
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def fill_content_hashes(apps, schema_editor):
+    Question = apps.get_model('exams', 'Question')
+    Answer = apps.get_model('exams', 'Answer')
+
+    answers = defaultdict(list)
+    for question_id, text_md, text, is_correct in Answer.objects.order_by('question_id', 'position').values_list(
+        'question_id', 'text_md', 'text', 'is_correct'
+    ).iterator():
+        answers[question_id].append([text_md, text, is_correct])
+
+    questions = []
+    for question in Question.objects.only('id', 'question_type', 'difficulty', 'text_md', 'text').iterator():
+        content = [question.question_type, question.difficulty, question.text_md, question.text, answers[question.id]]
+        question.content_hash = hashlib.sha256(json.dumps(content, ensure_ascii=False).encode()).hexdigest()
+        questions.append(question)
+    Question.objects.bulk_update(questions, ['content_hash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0009_selected_answer_masks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['subject', 'content_hash'], name='question_subject_hash'),
+        ),
+        migrations.RunPython(fill_content_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.6 on 2026-10-19 00:40
+
+from django.db import migrations
+
+QUESTION_TEXT = "replace(replace(q.text_md || ' ' || q.text, 'ё', 'е'), 'Ё', 'Е')"
+ANSWER_TEXT = "replace(replace(a.text_md || ' ' || a.text, 'ё', 'е'), 'Ё', 'Е')"
+
+SQLITE = [
+    "CREATE VIRTUAL TABLE exams_question_fts USING fts5(question, answers, tokenize = 'unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE exams_answer_fts USING fts5(body, tokenize = 'unicode61 remove_diacritics 2')",
+    "INSERT INTO exams_question_fts (rowid, question, answers) "
+    f"SELECT q.id, {QUESTION_TEXT}, coalesce((SELECT group_concat({ANSWER_TEXT}, ' ') "
+    "FROM exams_answer a WHERE a.question_id = q.id), '') FROM exams_question q",
+    f"INSERT INTO exams_answer_fts (rowid, body) SELECT a.id, {ANSWER_TEXT} FROM exams_answer a",
+]
+SQLITE_DROP = [
+    "DROP TABLE exams_question_fts",
+    "DROP TABLE exams_answer_fts",
+]
+
+POSTGRESQL = [
+    "CREATE TABLE exams_question_search (object_id integer PRIMARY KEY, document tsvector NOT NULL)",
+    "CREATE INDEX exams_question_search_document ON exams_question_search USING GIN (document)",
+    "CREATE TABLE exams_answer_search (object_id integer PRIMARY KEY, document tsvector NOT NULL)",
+    "CREATE INDEX exams_answer_search_document ON exams_answer_search USING GIN (document)",
+    "INSERT INTO exams_question_search (object_id, document) "
+    f"SELECT q.id, setweight(to_tsvector('simple', {QUESTION_TEXT}), 'A') || "
+    f"setweight(to_tsvector('simple', coalesce((SELECT string_agg({ANSWER_TEXT}, ' ') "
+    "FROM exams_answer a WHERE a.question_id = q.id), '')), 'B') FROM exams_question q",
+    "INSERT INTO exams_answer_search (object_id, document) "
+    f"SELECT a.id, to_tsvector('simple', {ANSWER_TEXT}) FROM exams_answer a",
+]
+POSTGRESQL_DROP = [
+    "DROP TABLE exams_question_search",
+    "DROP TABLE exams_answer_search",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0010_question_content_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE, 'postgresql': POSTGRESQL}),
+            run({'sqlite': SQLITE_DROP, 'postgresql': POSTGRESQL_DROP}),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0011_question_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionSignature',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='exams.question')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('minhash', models.BinaryField()),
+                ('cluster', models.IntegerField(blank=True, null=True, verbose_name='Группа дубликатов')),
+                ('similarity', models.FloatField(blank=True, null=True, verbose_name='Сходство')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='exams.subject')),
+            ],
+            options={
+                'verbose_name': 'Подпись вопроса',
+                'verbose_name_plural': 'Подписи вопросов',
+                'indexes': [models.Index(fields=['subject', 'cluster'], name='signature_subject_cluster')],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0012_question_signatures'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='examresult',
+            name='questions',
+        ),
+        migrations.AddField(
+            model_name='examresult',
+            name='seed',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='QuestionBankSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(verbose_name='Версия')),
+                ('digest', models.CharField(max_length=64)),
+                ('data', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bank_snapshots', to='exams.exam')),
+            ],
+            options={
+                'verbose_name': 'Снимок банка вопросов',
+                'verbose_name_plural': 'Снимки банка вопросов',
+            },
+        ),
+        migrations.AddField(
+            model_name='examresult',
+            name='bank_snapshot',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='exams.questionbanksnapshot'),
+        ),
+        migrations.AddConstraint(
+            model_name='questionbanksnapshot',
+            constraint=models.UniqueConstraint(fields=('exam', 'version'), name='unique_snapshot_version'),
+        ),
+        migrations.AddConstraint(
+            model_name='questionbanksnapshot',
+            constraint=models.UniqueConstraint(fields=('exam', 'digest'), name='unique_snapshot_digest'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 00:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0013_attempt_seed_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentanswer',
+            name='client_seq',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='studentanswer',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=8),
+        ),
+    ]
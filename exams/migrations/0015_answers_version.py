@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 00:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0014_answer_save_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examresult',
+            name='answers_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='studentanswer',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-19 00:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0015_answers_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentanswer',
+            name='graded_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Проверен'),
+        ),
+        migrations.AddField(
+            model_name='studentanswer',
+            name='graded_by',
+            field=models.CharField(blank=True, editable=False, max_length=150, verbose_name='Проверил'),
+        ),
+        migrations.AlterField(
+            model_name='studentanswer',
+            name='is_correct',
+            field=models.BooleanField(default=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='studentanswer',
+            name='points_earned',
+            field=models.IntegerField(default=0, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='studentanswer',
+            index=models.Index(condition=models.Q(('is_correct__isnull', True)), fields=['question', 'id'], name='studentanswer_ungraded'),
+        ),
+    ]
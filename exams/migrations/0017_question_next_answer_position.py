@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 01:20
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_next_positions(apps, schema_editor):
+    """Следующая позиция — после наибольшей из существующих вариантов вопроса"""
+    Answer = apps.get_model('exams', 'Answer')
+    Question = apps.get_model('exams', 'Question')
+    last = Answer.objects.filter(question=OuterRef('pk')).values('question').annotate(last=Max('position')).values('last')
+    Question.objects.update(next_answer_position=Coalesce(Subquery(last) + 1, Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0016_manual_grading'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='next_answer_position',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_next_positions, migrations.RunPython.noop),
+    ]
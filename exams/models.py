@@ -1,7 +1,13 @@
 # models.py
-from django.db import models
+import hashlib
+import json
+from django.db import models, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Least
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+from django.utils.functional import cached_property
 import uuid
 from datetime import timedelta
 
@@ -14,6 +20,7 @@ class Student(models.Model):
     email = models.EmailField(blank=True, verbose_name="Email")
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True, verbose_name="Активен")
+    results_version = models.PositiveIntegerField(default=1, editable=False)  # для ETag страниц студента
     
     class Meta:
         verbose_name = "Студент"
@@ -61,6 +68,45 @@ class Subject(models.Model):
     def __str__(self):
         return f"{self.course.name} - {self.name}"
 
+# Выбранные и правильные варианты хранятся битовыми масками по Answer.position (BigIntegerField, 63 бита)
+MAX_ANSWER_POSITION = 62
+
+def answers_mask(positions):
+    """Битовая маска по позициям вариантов ответа"""
+    mask = 0
+    for position in positions:
+        mask |= 1 << position
+    return mask
+
+def question_content_hash(question_type, difficulty, text_md, text, answers):
+    """
+    Хэш содержимого вопроса для идемпотентного импорта банков.
+    answers — [(text_md, text, is_correct)] в порядке позиций.
+    """
+    content = [question_type, difficulty, text_md, text, [list(answer) for answer in answers]]
+    return hashlib.sha256(json.dumps(content, ensure_ascii=False).encode()).hexdigest()
+
+def mask_positions(mask):
+    """Позиции вариантов, отмеченных в маске"""
+    position = 0
+    while mask:
+        if mask & 1:
+            yield position
+        mask >>= 1
+        position += 1
+
+def answer_content_hash(answer_ids, answer_text):
+    """
+    FNV-1a (32 бита) присланного ответа: id вариантов по возрастанию и текст.
+    Та же функция есть в take_exam.html (answerHash): страница не отправляет неизмененные ответы.
+    """
+    content = ','.join(str(answer_id) for answer_id in sorted({int(answer_id) for answer_id in answer_ids}))
+    content += '|' + (answer_text or '').strip()
+    value = 0x811c9dc5
+    for byte in content.encode():
+        value = ((value ^ byte) * 0x01000193) & 0xFFFFFFFF
+    return f'{value:08x}'
+
 class Question(models.Model):
     DIFFICULTY_CHOICES = [
         ('easy', 'Легкий'),
@@ -81,10 +127,18 @@ class Question(models.Model):
     difficulty = models.CharField(max_length=10, choices=DIFFICULTY_CHOICES, default='medium')
     question_type = models.CharField(max_length=15, choices=TYPE_CHOICES, default='single_choice')
     created_at = models.DateTimeField(auto_now_add=True)
+    content_version = models.PositiveIntegerField(default=1, editable=False)  # для ключей кэша
+    correct_mask = models.BigIntegerField(default=0, editable=False)  # позиции правильных вариантов
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)  # см. question_content_hash
+    # Позиция следующего нового варианта: только растет, позиция удаленного варианта не выдается снова
+    next_answer_position = models.PositiveSmallIntegerField(default=0, editable=False)
     
     class Meta:
         verbose_name = "Вопрос"
         verbose_name_plural = "Вопросы"
+        indexes = [
+            models.Index(fields=['subject', 'content_hash'], name='question_subject_hash'),
+        ]
     
     def __str__(self):
         text_preview = self.text_md or self.text or "Без текста"
@@ -95,15 +149,39 @@ class Answer(models.Model):
     text_md = models.TextField(verbose_name="Текст ответа (Markdown)")
     text = models.TextField(blank=True, verbose_name="Текст ответа (обычный)")
     is_correct = models.BooleanField(default=False, verbose_name="Правильный ответ")
+    position = models.PositiveSmallIntegerField(editable=False, verbose_name="Позиция")  # бит в масках, не переиспользуется
     
     class Meta:
         verbose_name = "Вариант ответа"
         verbose_name_plural = "Варианты ответов"
+        constraints = [
+            models.UniqueConstraint(fields=['question', 'position'], name='unique_answer_position'),
+        ]
     
     def __str__(self):
         question_preview = self.question.text_md or self.question.text or "Без вопроса"
         answer_preview = self.text_md or self.text or "Без ответа"
         return f"{question_preview[:30]}... - {answer_preview[:30]}..."
+    
+    def next_position(self):
+        return Question.objects.filter(pk=self.question_id).values_list('next_answer_position', flat=True).get()
+    
+    def clean(self):
+        if self.position is None and self.question_id and self.next_position() > MAX_ANSWER_POSITION:
+            raise ValidationError(f'У вопроса может быть не больше {MAX_ANSWER_POSITION + 1} вариантов ответа')
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        # Счетчик вопроса меняется под блокировкой его строки: параллельные варианты получают разные позиции
+        with transaction.atomic():
+            questions = Question.objects.select_for_update().filter(pk=self.question_id)
+            if self.position is None:
+                self.position = questions.values_list('next_answer_position', flat=True).get()
+                if self.position > MAX_ANSWER_POSITION:
+                    raise ValidationError(f'У вопроса может быть не больше {MAX_ANSWER_POSITION + 1} вариантов ответа')
+            questions.filter(next_answer_position__lte=self.position).update(next_answer_position=self.position + 1)
+            super().save(*args, **kwargs)
 
 class Exam(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='exams')
@@ -138,6 +216,25 @@ class Exam(models.Model):
     def duration(self):
         """Возвращает продолжительность экзамена как timedelta"""
         return timedelta(minutes=self.duration_minutes)
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Продолжительность или время закрытия могли измениться
+        self.refresh_attempt_deadlines()
+    
+    def max_score(self):
+        """Максимальный балл экзамена по всем предметам"""
+        return sum(exam_subject.max_score() for exam_subject in self.exam_subjects.all())
+    
+    def attempt_deadline(self, start_time):
+        """Крайний срок попытки: конец отведенного времени, но не позже закрытия экзамена"""
+        return min(start_time + self.duration, self.close_time)
+    
+    def refresh_attempt_deadlines(self):
+        """Пересчитывает крайние сроки незавершенных попыток"""
+        self.results.filter(status='in_progress', start_time__isnull=False).update(
+            deadline=Least(F('start_time') + self.duration, Value(self.close_time))
+        )
 
 class ExamSubject(models.Model):
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='exam_subjects')
@@ -166,11 +263,37 @@ class ExamSubject(models.Model):
                 self.medium_count * self.medium_points + 
                 self.hard_count * self.hard_points)
 
+    def points(self, difficulty):
+        """Баллы за вопрос указанной сложности"""
+        return {'easy': self.easy_points, 'medium': self.medium_points}.get(difficulty, self.hard_points)
+
+class QuestionBankSnapshot(models.Model):
+    """Версия банка вопросов экзамена, из которой выбираются вопросы попыток (см. selection.py)"""
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='bank_snapshots')
+    version = models.PositiveIntegerField(verbose_name="Версия")
+    digest = models.CharField(max_length=64)  # sha256 содержимого: одинаковые снимки не дублируются
+    data = models.JSONField()  # [{'subject', 'counts': {сложность: N}, 'ids': {сложность: [id]}}]
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Снимок банка вопросов"
+        verbose_name_plural = "Снимки банка вопросов"
+        constraints = [
+            models.UniqueConstraint(fields=['exam', 'version'], name='unique_snapshot_version'),
+            models.UniqueConstraint(fields=['exam', 'digest'], name='unique_snapshot_digest'),
+        ]
+
+    def __str__(self):
+        return f"{self.exam} - версия {self.version}"
+
+FINISHED_STATUSES = ['finished', 'time_expired']
+
 class ExamResult(models.Model):
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name="results")
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="exam_results")
     start_time = models.DateTimeField(null=True, blank=True)
     end_time = models.DateTimeField(null=True, blank=True)
+    deadline = models.DateTimeField(null=True, blank=True, verbose_name="Крайний срок")
     status = models.CharField(
         max_length=20,
         choices=[("in_progress", "В процессе"), ("finished", "Завершен"), ("time_expired", "Время вышло")],
@@ -178,11 +301,26 @@ class ExamResult(models.Model):
     )
     score = models.FloatField(default=0)
     max_score = models.FloatField(default=0)
-    questions = models.ManyToManyField("Question", related_name="exam_results", blank=True)
+    breakdown = models.JSONField(null=True, blank=True, editable=False)  # разбор по предметам и сложности
+    archived_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="В архиве с")
+    # Вопросы попытки выводятся из зерна и снимка банка (selection.draw_questions)
+    seed = models.BigIntegerField(null=True, blank=True, editable=False)
+    bank_snapshot = models.ForeignKey(
+        QuestionBankSnapshot, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+'
+    )
+    # Растет с каждой записью ответа; StudentAnswer.version — версия последней записи ответа (синхронизация)
+    answers_version = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name = "Результат экзамена"
         verbose_name_plural = "Результаты экзаменов"
+        indexes = [
+            # Поиск просроченных попыток фоновым завершением
+            models.Index(fields=['status', 'deadline'], name='examresult_status_deadline'),
+            # Keyset-пагинация истории студента и списка в админке
+            models.Index(fields=['student', '-start_time', '-id'], name='examresult_student_history'),
+            models.Index(fields=['-start_time', '-id'], name='examresult_start_time_id'),
+        ]
 
     def __str__(self):
         return f"{self.student.full_name} - {self.exam} ({self.status})"
@@ -200,6 +338,8 @@ class ExamResult(models.Model):
     attempt_number.short_description = "Попытка №"
 
     def is_expired(self):
+        if self.deadline:
+            return timezone.now() > self.deadline
         if self.start_time and self.exam.duration_minutes:
             elapsed = timezone.now() - self.start_time
             return elapsed.total_seconds() > (self.exam.duration_minutes * 60)
@@ -208,26 +348,124 @@ class ExamResult(models.Model):
     def time_remaining(self):
         if not self.start_time:
             return None
+        if self.deadline:
+            return max(self.deadline - timezone.now(), timedelta(0))
         elapsed = timezone.now() - self.start_time
         return max(self.exam.duration - elapsed, timedelta(0))
 
 class StudentAnswer(models.Model):
     exam_result = models.ForeignKey(ExamResult, on_delete=models.CASCADE, related_name='student_answers')
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
-    selected_answers = models.ManyToManyField(Answer, blank=True)  # For single/multiple choice
+    selected_mask = models.BigIntegerField(default=0, editable=False)  # For single/multiple choice: биты Answer.position
     answer_text = models.TextField(blank=True)  # For open questions
-    is_correct = models.BooleanField(default=False)
-    points_earned = models.IntegerField(default=0)
+    # None — открытый или текстовый ответ ждет проверки преподавателем (grading.py)
+    is_correct = models.BooleanField(null=True, default=False)
+    points_earned = models.IntegerField(null=True, default=0)
     answered_at = models.DateTimeField(auto_now=True)
+    graded_by = models.CharField(max_length=150, blank=True, editable=False, verbose_name="Проверил")
+    graded_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Проверен")
+    # Номер последнего сохраненного изменения со страницы и хэш присланного ответа (answer_content_hash):
+    # повторы пропускаются, запоздавшие сохранения не перезаписывают более новые
+    client_seq = models.PositiveIntegerField(default=0, editable=False)
+    content_hash = models.CharField(max_length=8, blank=True, editable=False)
+    version = models.PositiveIntegerField(default=0, editable=False)  # ExamResult.answers_version этой записи
     
     class Meta:
         unique_together = ['exam_result', 'question']
         verbose_name = "Ответ студента"
         verbose_name_plural = "Ответы студентов"
+        indexes = [
+            # Очередь проверки: непроверенные ответы вопроса по id
+            models.Index(fields=['question', 'id'], condition=Q(is_correct__isnull=True), name='studentanswer_ungraded'),
+        ]
     
     def __str__(self):
         return f"{self.exam_result.student.full_name} - {self.question.text_md[:30] if self.question.text_md else 'Без текста'}..."
 
+    @cached_property
+    def selected_ids(self):
+        """id выбранных вариантов (варианты лучше загрузить через prefetch question__answers)"""
+        return {answer.id for answer in self.question.answers.all() if self.selected_mask >> answer.position & 1}
+
+class ArchivedAttempt(models.Model):
+    """Ответы старой завершенной попытки, вынесенные из живых таблиц (сжатый JSON, см. archive.py)"""
+    exam_result = models.OneToOneField(ExamResult, on_delete=models.CASCADE, primary_key=True, related_name='archive')
+    data = models.BinaryField(verbose_name="Ответы (zlib + JSON)")
+    answers_count = models.IntegerField(default=0, verbose_name="Ответов")
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Архив попытки"
+        verbose_name_plural = "Архив попыток"
+
+class QuestionSignature(models.Model):
+    """MinHash-подпись вопроса для поиска почти одинаковых вопросов предмета (см. dedup.py)"""
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='+')
+    content_hash = models.CharField(max_length=64)  # Question.content_hash на момент расчета подписи
+    minhash = models.BinaryField()
+    cluster = models.IntegerField(null=True, blank=True, verbose_name="Группа дубликатов")  # наименьший id вопроса группы
+    similarity = models.FloatField(null=True, blank=True, verbose_name="Сходство")  # с ближайшим вопросом группы
+
+    class Meta:
+        verbose_name = "Подпись вопроса"
+        verbose_name_plural = "Подписи вопросов"
+        indexes = [
+            models.Index(fields=['subject', 'cluster'], name='signature_subject_cluster'),
+        ]
+
+class ExamStats(models.Model):
+    """Материализованная статистика экзамена: по экзамену целиком (subject=None) и по предметам"""
+    HISTOGRAM_BUCKETS = 10  # корзины по 10% результата
+
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='stats')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Предмет")
+    results_count = models.IntegerField(default=0, verbose_name="Результатов")
+    passed_count = models.IntegerField(default=0, verbose_name="Сдали")
+    score_sum = models.FloatField(default=0)
+    score_sq_sum = models.FloatField(default=0)
+    max_score_sum = models.FloatField(default=0)
+    histogram = models.JSONField(default=list, verbose_name="Распределение, %")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Статистика экзамена"
+        verbose_name_plural = "Статистика экзаменов"
+        constraints = [
+            models.UniqueConstraint(fields=['exam', 'subject'], name='unique_exam_subject_stats'),
+            models.UniqueConstraint(fields=['exam'], condition=Q(subject__isnull=True), name='unique_exam_total_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.exam} - {self.subject.name if self.subject else 'Итого'}"
+
+    def average_score(self):
+        if self.results_count:
+            return round(self.score_sum / self.results_count, 2)
+        return 0
+    average_score.short_description = "Средний балл"
+
+    def std_deviation(self):
+        """Стандартное отклонение балла по сумме и сумме квадратов"""
+        if self.results_count < 2:
+            return 0
+        mean = self.score_sum / self.results_count
+        variance = max(self.score_sq_sum / self.results_count - mean * mean, 0)
+        return round(variance ** 0.5, 2)
+    std_deviation.short_description = "Ст. отклонение"
+
+    def average_percentage(self):
+        if self.max_score_sum > 0:
+            return round(self.score_sum / self.max_score_sum * 100, 2)
+        return 0
+    average_percentage.short_description = "Средний %"
+
+    def pass_rate(self):
+        if self.results_count:
+            return round(self.passed_count / self.results_count * 100, 2)
+        return 0
+    pass_rate.short_description = "Сдали, %"
+
 # Модель для импорта студентов из Excel
 class StudentImport(models.Model):
     """Модель для хранения информации об импорте студентов"""
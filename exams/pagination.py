@@ -0,0 +1,76 @@
+# pagination.py
+"""Keyset-пагинация результатов по (start_time, id): глубокие страницы стоят столько же, сколько первая"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib.admin.views.main import ChangeList
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Round
+
+CURSOR_VAR = 'cursor'
+
+
+def encode_cursor(exam_result):
+    """Курсор на строку: микросекунды start_time (UTC) и id"""
+    timestamp = int(exam_result.start_time.timestamp() * 1_000_000)
+    return f'{timestamp}.{exam_result.id}'
+
+
+def decode_cursor(value):
+    try:
+        timestamp, result_id = value.split('.')
+        start_time = datetime.fromtimestamp(int(timestamp) / 1_000_000, tz=dt_timezone.utc)
+        return start_time, int(result_id)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def with_percentage(queryset):
+    """Процент результата, посчитанный в SQL"""
+    return queryset.annotate(percentage=Case(
+        When(max_score__gt=0, then=Round(F('score') * 100.0 / F('max_score'), 2)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    ))
+
+
+def keyset_page(queryset, cursor, per_page):
+    """
+    Страница результатов начиная после курсора (новые сверху).
+    Возвращает (строки, курсор следующей страницы или None).
+    """
+    queryset = queryset.filter(start_time__isnull=False).order_by('-start_time', '-id')
+    if cursor:
+        start_time, result_id = cursor
+        queryset = queryset.filter(
+            Q(start_time__lt=start_time) | Q(start_time=start_time, id__lt=result_id)
+        )
+    rows = list(queryset[:per_page + 1])
+    if len(rows) > per_page:
+        return rows[:per_page], encode_cursor(rows[per_page - 1])
+    return rows, None
+
+
+class KeysetChangeList(ChangeList):
+    """Список админки с переходом «Далее» по курсору вместо номеров страниц и COUNT(*)"""
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_results(self, request):
+        self.cursor = decode_cursor(request.GET.get(CURSOR_VAR))
+        self.result_list, self.next_cursor = keyset_page(self.queryset, self.cursor, self.list_per_page)
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = len(self.result_list)
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = bool(self.cursor or self.next_cursor)
+
+    def first_page_url(self):
+        return self.get_query_string(remove=[CURSOR_VAR])
+
+    def next_page_url(self):
+        return self.get_query_string({CURSOR_VAR: self.next_cursor})
@@ -0,0 +1,234 @@
+# regrade.py
+"""
+Перепроверка ответов с вариантами после исправления ключа (Answer.is_correct -> Question.correct_mask)
+или баллов ExamSubject.
+
+Новые is_correct и points_earned считаются в SQL выражениями без соединений: маска правильных вариантов
+и баллы берутся коррелированными подзапросами по строке вопроса, баллы — через CASE по предметам
+и сложностям экзамена. Одни и те же выражения дают разницу для пробного прогона (SELECT с группировкой)
+и запись (UPDATE только изменившихся ответов). Попытки пересчитываются пачками через grading.rescoring,
+статистика экзамена после этого строится заново: баллы предметов могли измениться.
+Ответы архивных попыток хранятся сжатым JSON (archive.py): они перепроверяются по тем же правилам в Python
+пачками по ARCHIVE_CHUNK_SIZE, счет и разбор таких попыток поправляются на разницу баллов.
+"""
+from django.db import transaction
+from django.db.models import (
+    BooleanField, Case, Count, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When,
+)
+
+from .archive import pack, unpack
+from .caching import bump_results_version
+from .grading import rescoring
+from .models import (
+    FINISHED_STATUSES, ArchivedAttempt, Exam, ExamResult, Question, QuestionBankSnapshot, StudentAnswer,
+)
+from .selection import snapshot_questions
+from .stats import rebuild_stats
+
+CHOICE_TYPES = ['single_choice', 'multiple_choice']
+CHUNK_SIZE = 2000  # попыток в одной транзакции
+ARCHIVE_CHUNK_SIZE = 200  # архивных попыток, распакованных в памяти одновременно
+
+
+def answer_expressions(exam):
+    """(is_correct, points_earned) ответа по текущему ключу и баллам экзамена — как check_answer_correctness"""
+    question = Question.objects.filter(pk=OuterRef('question_id'))
+    whens = [
+        When(subject_id=exam_subject.subject_id, difficulty=difficulty, then=Value(exam_subject.points(difficulty)))
+        for exam_subject in exam.exam_subjects.all()
+        for difficulty, _ in Question.DIFFICULTY_CHOICES
+    ]
+    points = Subquery(
+        question.annotate(points=Case(*whens, default=Value(0), output_field=IntegerField())).values('points')[:1]
+    )
+    correct = Q(selected_mask=Subquery(question.values('correct_mask')[:1])) & ~Q(selected_mask=0)
+    return (
+        Case(When(correct, then=Value(True)), default=Value(False), output_field=BooleanField()),
+        Case(When(correct, then=points), default=Value(0), output_field=IntegerField()),
+    )
+
+
+def stale_answers(exam, question_ids=None):
+    """Ответы с вариантами у неархивных попыток экзамена, чьи сохраненные оценки расходятся с пересчетом"""
+    is_correct, points = answer_expressions(exam)
+    answers = StudentAnswer.objects.filter(
+        exam_result__exam=exam,
+        exam_result__archived_at__isnull=True,
+        question__question_type__in=CHOICE_TYPES,
+    )
+    if question_ids:
+        answers = answers.filter(question_id__in=question_ids)
+    return answers.alias(new_correct=is_correct, new_points=points).filter(
+        ~Q(is_correct=F('new_correct')) | ~Q(points_earned=F('new_points')) | Q(is_correct__isnull=True)
+    )
+
+
+def choice_grades(exam, question_ids):
+    """{question_id: (маска правильных вариантов, баллы, предмет, сложность)} вопросов с вариантами"""
+    points = {
+        (exam_subject.subject_id, difficulty): exam_subject.points(difficulty)
+        for exam_subject in exam.exam_subjects.all()
+        for difficulty, _ in Question.DIFFICULTY_CHOICES
+    }
+    rows = Question.objects.filter(id__in=question_ids, question_type__in=CHOICE_TYPES).values_list(
+        'id', 'correct_mask', 'subject_id', 'subject__name', 'difficulty'
+    )
+    return {
+        question_id: (correct_mask, points.get((subject_id, difficulty), 0), subject_name or 'Без предмета', difficulty)
+        for question_id, correct_mask, subject_id, subject_name, difficulty in rows
+    }
+
+
+def regrade_rows(rows, grades, breakdown):
+    """
+    Перепроверяет ответы из архива на месте, как answer_expressions, и поправляет разбор попытки.
+    Возвращает (изменено ответов, разница баллов).
+    """
+    changed = delta = 0
+    for row in rows:
+        grade = grades.get(row['question'])
+        if grade is None:
+            continue
+        correct_mask, points, subject, difficulty = grade
+        is_correct = row['selected_mask'] == correct_mask and row['selected_mask'] != 0
+        points = points if is_correct else 0
+        if row['is_correct'] is is_correct and row['points_earned'] == points:
+            continue
+        difference = points - (row['points_earned'] or 0)
+        if breakdown:
+            for stats in (breakdown['subjects'].get(subject), breakdown['difficulty'].get(difficulty)):
+                if stats is not None:
+                    stats['correct'] += int(is_correct) - int(bool(row['is_correct']))
+                    stats['points'] += difference
+        row['is_correct'], row['points_earned'] = is_correct, points
+        changed += 1
+        delta += difference
+    return changed, delta
+
+
+def regrade_archived(exam, question_ids=None, dry_run=False, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """
+    Перепроверка завершенных архивных попыток экзамена: {result_id: (изменено ответов, разница баллов)}
+    только для изменившихся. Без dry_run записываются ответы архива, счет и разбор попыток.
+    """
+    archives = ArchivedAttempt.objects.filter(exam_result__exam=exam, exam_result__status__in=FINISHED_STATUSES)
+    result_ids = list(archives.order_by('exam_result_id').values_list('exam_result_id', flat=True))
+    grades, seen, changes = {}, set(), {}
+    for start in range(0, len(result_ids), chunk_size):
+        chunk = archives.filter(exam_result_id__in=result_ids[start:start + chunk_size])
+        with transaction.atomic():
+            if not dry_run:
+                chunk = chunk.select_for_update()
+            archived, results, student_ids = [], [], set()
+            for result_id, data, score, breakdown, student_id in chunk.values_list(
+                'exam_result_id', 'data', 'exam_result__score', 'exam_result__breakdown', 'exam_result__student_id'
+            ):
+                rows = unpack(data)
+                questions = {row['question'] for row in rows}
+                if question_ids:
+                    questions &= set(question_ids)
+                grades.update(choice_grades(exam, questions - seen))
+                seen |= questions
+                changed, delta = regrade_rows(
+                    [row for row in rows if row['question'] in questions], grades, breakdown
+                )
+                if not changed:
+                    continue
+                changes[result_id] = (changed, delta)
+                archived.append(ArchivedAttempt(exam_result_id=result_id, data=pack(rows)))
+                results.append(ExamResult(id=result_id, score=score + delta, breakdown=breakdown))
+                student_ids.add(student_id)
+            if not dry_run and archived:
+                ArchivedAttempt.objects.bulk_update(archived, ['data'])
+                ExamResult.objects.bulk_update(results, ['score', 'breakdown'])
+                bump_results_version(student_ids)
+    return changes
+
+
+def exam_diff(exam, question_ids=None):
+    """
+    Что изменит перепроверка экзамена: {'answers': N, 'results': {id: ((счет, максимум), (новый счет, максимум))}};
+    у незавершенных попыток вместо пар None. Новый счет — счет попытки плюс разница баллов изменившихся ответов.
+    """
+    rows = stale_answers(exam, question_ids).order_by().values('exam_result_id').annotate(
+        answers=Count('id'), before=Sum('points_earned'), after=Sum('new_points'),
+    )
+    changes = {row['exam_result_id']: (row['answers'], (row['after'] or 0) - (row['before'] or 0)) for row in rows}
+    changes.update(regrade_archived(exam, question_ids, dry_run=True))
+    max_score = float(exam.max_score())
+    results = {}
+    for result_id, score, old_max_score, status in ExamResult.objects.filter(exam=exam).values_list(
+        'id', 'score', 'max_score', 'status'
+    ):
+        change = changes.get(result_id)
+        finished = status in FINISHED_STATUSES
+        if change is None and not (finished and old_max_score != max_score):
+            continue
+        if finished:
+            delta = change[1] if change else 0
+            results[result_id] = ((score, old_max_score), (score + delta, max_score))
+        else:
+            results[result_id] = None  # счет незавершенной попытки посчитается при ее завершении
+    return {'answers': sum(answers for answers, _ in changes.values()), 'results': results}
+
+
+def regrade_exam(exam, question_ids=None, dry_run=False, chunk_size=CHUNK_SIZE):
+    """Перепроверяет экзамен; возвращает разницу exam_diff (при dry_run ничего не записывается)"""
+    diff = exam_diff(exam, question_ids)
+    if dry_run:
+        return diff
+    is_correct, points = answer_expressions(exam)
+    max_score = float(exam.max_score())
+    result_ids = sorted(diff['results'])
+    for start in range(0, len(result_ids), chunk_size):
+        chunk = result_ids[start:start + chunk_size]
+        with rescoring(chunk, update_stats=False):
+            stale_answers(exam, question_ids).filter(exam_result_id__in=chunk).update(
+                is_correct=is_correct, points_earned=points,
+            )
+            ExamResult.objects.filter(id__in=chunk, status__in=FINISHED_STATUSES).exclude(
+                max_score=max_score
+            ).update(max_score=max_score)
+    regrade_archived(exam, question_ids)
+    if result_ids:
+        rebuild_stats([exam.id])
+    return diff
+
+
+def regrade(exams, question_ids=None, dry_run=False):
+    """Перепроверка нескольких экзаменов: [(экзамен, разница)] только для экзаменов с изменениями"""
+    report = []
+    for exam in exams.prefetch_related('exam_subjects'):
+        diff = regrade_exam(exam, question_ids, dry_run)
+        if diff['results']:
+            report.append((exam, diff))
+    return report
+
+
+def diff_rows(diff, limit=None):
+    """Первые limit попыток разницы для показа: [(попытка со студентом, (счет, максимум) или None, новые)]"""
+    result_ids = sorted(diff['results'])[:limit]
+    results = ExamResult.objects.select_related('student').in_bulk(result_ids)
+    return [(results[result_id], *(diff['results'][result_id] or (None, None))) for result_id in result_ids]
+
+
+def exams_with_questions(question_ids):
+    """
+    Экзамены, в попытках которых встречаются вопросы (после исправления ключа вопроса).
+    Живые попытки — по StudentAnswer. Ответы архивных попыток сжаты, поэтому для них экзамен находится
+    по снимку банка попытки (вопрос среди кандидатов снимка), а для попыток без снимка — по предметам экзамена.
+    """
+    question_ids = set(question_ids)
+    archived = ExamResult.objects.filter(archived_at__isnull=False)
+    snapshots = QuestionBankSnapshot.objects.filter(
+        id__in=archived.filter(bank_snapshot__isnull=False).values('bank_snapshot_id')
+    ).only('exam_id', 'data')
+    snapshot_exam_ids = {snapshot.exam_id for snapshot in snapshots.iterator() if snapshot_questions(snapshot) & question_ids}
+    return Exam.objects.filter(
+        Q(id__in=StudentAnswer.objects.filter(question_id__in=question_ids).values('exam_result__exam_id'))
+        | Q(id__in=snapshot_exam_ids)
+        | Q(id__in=archived.filter(
+            bank_snapshot__isnull=True,
+            exam__exam_subjects__subject__questions__in=question_ids,
+        ).values('exam_id'))
+    )
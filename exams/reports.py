@@ -0,0 +1,197 @@
+# reports.py
+"""
+Ведомости результатов по студентам: по файлу .xlsx на каждую завершенную попытку, все вместе в ZIP.
+
+Данные попыток читает основной процесс пачками по REPORT_CHUNK_SIZE. Ответы берутся через load_answers_bulk,
+поэтому архивные попытки тоже попадают в ведомости. Файлы собирают процессы пула (excel.result_sheet:
+только openpyxl, без Django и базы), процессы запускаются через spawn, чтобы не копировать fork'ом
+потоки и соединения сервера. ZIP отдается потоком по мере готовности файлов: в работе одновременно
+не больше REPORTS_PER_WORKER ведомостей на процесс пула, так что память зависит от числа процессов,
+а не от числа студентов.
+"""
+import multiprocessing
+import os
+import re
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, OuterRef, Subquery
+from django.utils import timezone
+
+from .archive import load_answers_bulk
+from .breakdown import compute_breakdowns, difficulty_rows
+from .excel import result_sheet
+from .models import FINISHED_STATUSES, ExamResult
+
+REPORT_CHUNK_SIZE = 100
+REPORTS_PER_WORKER = 2
+UNSAFE_NAME_RE = re.compile(r'[^\w.-]+')
+
+
+def report_workers():
+    return getattr(settings, 'EXAM_REPORT_WORKERS', None) or min(4, os.cpu_count() or 1)
+
+
+def report_results(queryset):
+    """Завершенные попытки выборки для ведомостей: по группе и фамилии, с номером попытки"""
+    attempts = ExamResult.objects.filter(
+        exam=OuterRef('exam'), student=OuterRef('student'), id__lte=OuterRef('id')
+    ).values('exam').annotate(count=Count('id')).values('count')
+    return queryset.filter(status__in=FINISHED_STATUSES).select_related(
+        'student', 'exam__course', 'archive'
+    ).annotate(attempt=Subquery(attempts)).order_by(
+        'student__group', 'student__last_name', 'student__first_name', 'exam_id', 'id'
+    )
+
+
+def report_name(exam_result):
+    """Путь файла в архиве: группа/Фамилия_Имя_номер_экзамен_попытка.xlsx"""
+    student = exam_result.student
+    parts = [student.last_name, student.first_name, student.student_id, exam_result.exam.name, str(exam_result.attempt)]
+    name = '_'.join(UNSAFE_NAME_RE.sub('-', part).strip('-') for part in parts)
+    return f"{UNSAFE_NAME_RE.sub('-', student.group).strip('-') or 'Без группы'}/{name}.xlsx"
+
+
+def answer_text(answer):
+    return answer.text_md or answer.text or ''
+
+
+def local_time(value):
+    return timezone.localtime(value).strftime('%d.%m.%Y %H:%M') if value else ''
+
+
+def report_data(exam_result, breakdown, student_answers):
+    """Все, что нужно ведомости, простыми значениями: передается в процесс пула"""
+    rows = []
+    for number, student_answer in enumerate(student_answers, start=1):
+        question = student_answer.question
+        if question.question_type in ['open', 'text']:
+            given, correct = student_answer.answer_text, ''
+        else:
+            selected = student_answer.selected_ids
+            options = list(question.answers.all())
+            given = '; '.join(answer_text(answer) for answer in options if answer.id in selected)
+            correct = '; '.join(answer_text(answer) for answer in options if answer.is_correct)
+        if student_answer.is_correct:
+            verdict = 'Правильно'
+        elif student_answer.is_correct is False:
+            verdict = 'Неправильно'
+        else:
+            verdict = 'На проверке'
+        rows.append((
+            number, question.subject.name if question.subject else '', question.get_difficulty_display(),
+            question.text_md or question.text or '', given, correct, verdict, student_answer.points_earned or 0,
+        ))
+
+    student = exam_result.student
+    return {
+        'exam': exam_result.exam.name,
+        'course': exam_result.exam.course.name,
+        'student': student.full_name,
+        'student_id': student.student_id,
+        'group': student.group,
+        'attempt': exam_result.attempt,
+        'status': exam_result.get_status_display(),
+        'start_time': local_time(exam_result.start_time),
+        'end_time': local_time(exam_result.end_time),
+        'score': exam_result.score,
+        'max_score': exam_result.max_score,
+        'percentage': exam_result.percentage_score(),
+        'subjects': [
+            (name, stats['correct'], stats['total'], stats['points'])
+            for name, stats in breakdown['subjects'].items()
+        ],
+        'difficulty': [
+            (label, stats['correct'], stats['total'], stats['points'])
+            for label, stats in difficulty_rows(breakdown)
+        ],
+        'answers': rows,
+    }
+
+
+def report_items(results):
+    """(имя файла, данные ведомости) по попыткам; ответы и разбор для результатов без него — пачкой"""
+    chunk = []
+    for exam_result in results.iterator(chunk_size=REPORT_CHUNK_SIZE):
+        chunk.append(exam_result)
+        if len(chunk) == REPORT_CHUNK_SIZE:
+            yield from chunk_items(chunk)
+            chunk = []
+    yield from chunk_items(chunk)
+
+
+def chunk_items(chunk):
+    missing = compute_breakdowns([exam_result.id for exam_result in chunk if not exam_result.breakdown])
+    answers = load_answers_bulk(chunk)
+    for exam_result in chunk:
+        breakdown = exam_result.breakdown or missing[exam_result.id]
+        yield report_name(exam_result), report_data(exam_result, breakdown, answers[exam_result.id])
+
+
+def generate_reports(results, workers=None):
+    """
+    Файлы ведомостей (имя, байты) в порядке выборки. Следующая ведомость отправляется в пул,
+    только когда в работе меньше workers * REPORTS_PER_WORKER.
+    """
+    workers = workers or report_workers()
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+    pending = deque()
+    try:
+        for name, report in report_items(results):
+            pending.append((name, pool.submit(result_sheet, report)))
+            if len(pending) >= workers * REPORTS_PER_WORKER:
+                name, future = pending.popleft()
+                yield name, future.result()
+        while pending:
+            name, future = pending.popleft()
+            yield name, future.result()
+    finally:
+        # Клиент мог прервать загрузку: ведомости из очереди уже не нужны
+        pool.shutdown(cancel_futures=True)
+
+
+class ZipBuffer:
+    """Поток только для записи: ZipFile пишет в него, zip_reports забирает готовые байты"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def zip_reports(results, workers=None):
+    """
+    ZIP с ведомостями завершенных попыток из results кусками байтов — по одному на файл и каталог
+    архива в конце. .xlsx уже сжат, поэтому файлы кладутся без повторного сжатия.
+    """
+    buffer = ZipBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for name, content in generate_reports(report_results(results), workers):
+            archive.writestr(name, content)
+            yield buffer.take()
+    yield buffer.take()
+
+
+async def async_chunks(chunks):
+    """
+    Синхронный генератор как асинхронный итератор для потокового ответа под ASGI: иначе Django
+    сначала собрал бы весь ответ в память. Каждый кусок готовится в потоке запросов к базе
+    """
+    try:
+        while (chunk := await sync_to_async(next)(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
@@ -0,0 +1,244 @@
+# search.py
+"""
+Полнотекстовый индекс банка вопросов для поиска в админке.
+
+SQLite: виртуальные таблицы FTS5 (tokenize unicode61 — без учета регистра и диакритики для латиницы
+и кириллицы), ранжирование bm25. PostgreSQL: таблицы tsvector с GIN-индексом (конфигурация 'simple' —
+без стемминга, одинаково для русского и английского), ранжирование ts_rank. Таблицы создаются
+миграцией 0011; на других СУБД поиск в админке остается обычным icontains.
+
+Индекс обновляется сигналами Question/Answer и импортом банка; полная перестройка —
+manage.py rebuild_search_index. Буква «ё» индексируется и ищется как «е».
+
+Поиск — подзапрос к индексу внутри запроса списка админки: фильтры списка применяются вместе
+с ним, без предварительного отбора лучших совпадений по всему банку. Запись в индекс идет
+в базу для записи, поиск — в базу чтения queryset (реплику в запросах отчетов).
+"""
+import re
+
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.db import connections, router
+from django.db.models import F, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+TERM_RE = re.compile(r'\w+')
+MAX_TERMS = 10
+BATCH_SIZE = 500  # id в одном IN (...), с запасом до лимита параметров SQLite
+
+
+def normalize(text):
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def normalized_sql(expression):
+    return f"replace(replace({expression}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+QUESTION_TEXT = normalized_sql("q.text_md || ' ' || q.text")
+ANSWER_TEXT = normalized_sql("a.text_md || ' ' || a.text")
+
+
+class SQLiteSearch:
+    tables = {'question': 'exams_question_fts', 'answer': 'exams_answer_fts'}
+    key = 'rowid'
+    index_sql = {
+        'question': (
+            "INSERT INTO exams_question_fts (rowid, question, answers) "
+            f"SELECT q.id, {QUESTION_TEXT}, coalesce(("
+            f"SELECT group_concat({ANSWER_TEXT}, ' ') FROM exams_answer a WHERE a.question_id = q.id"
+            "), '') FROM exams_question q {where}"
+        ),
+        'answer': f"INSERT INTO exams_answer_fts (rowid, body) SELECT a.id, {ANSWER_TEXT} FROM exams_answer a {{where}}",
+    }
+    match_sql = {
+        kind: f"SELECT rowid FROM {table} WHERE {table} MATCH %s"
+        for kind, table in tables.items()
+    }
+    # bm25 меньше — лучше; текст вопроса весит вдвое больше текста вариантов.
+    # Считается только для строк, прошедших фильтры списка (поиск по rowid внутри индекса)
+    rank_sql = {
+        'question': "(SELECT -bm25(exams_question_fts, 2.0, 1.0) FROM exams_question_fts "
+                    "WHERE exams_question_fts MATCH %s AND rowid = {table}.id)",
+        'answer': "(SELECT -bm25(exams_answer_fts) FROM exams_answer_fts "
+                  "WHERE exams_answer_fts MATCH %s AND rowid = {table}.id)",
+    }
+
+    @staticmethod
+    def query(terms):
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    @classmethod
+    def text_query(cls, terms):
+        """Только по тексту вопроса (колонка question), без текстов вариантов"""
+        return f'question : ({cls.query(terms)})'
+
+
+class PostgreSQLSearch:
+    tables = {'question': 'exams_question_search', 'answer': 'exams_answer_search'}
+    key = 'object_id'
+    index_sql = {
+        'question': (
+            "INSERT INTO exams_question_search (object_id, document) "
+            f"SELECT q.id, setweight(to_tsvector('simple', {QUESTION_TEXT}), 'A') || "
+            f"setweight(to_tsvector('simple', coalesce(("
+            f"SELECT string_agg({ANSWER_TEXT}, ' ') FROM exams_answer a WHERE a.question_id = q.id"
+            "), '')), 'B') FROM exams_question q {where}"
+        ),
+        'answer': (
+            "INSERT INTO exams_answer_search (object_id, document) "
+            f"SELECT a.id, to_tsvector('simple', {ANSWER_TEXT}) FROM exams_answer a {{where}}"
+        ),
+    }
+    match_sql = {
+        kind: f"SELECT object_id FROM {table} WHERE document @@ to_tsquery('simple', %s)"
+        for kind, table in tables.items()
+    }
+    rank_sql = {
+        kind: f"(SELECT ts_rank(document, to_tsquery('simple', %s)) FROM {table} "
+              "WHERE object_id = {table}.id)"
+        for kind, table in tables.items()
+    }
+
+    @staticmethod
+    def query(terms):
+        return ' & '.join(f'{term}:*' for term in terms)
+
+    @staticmethod
+    def text_query(terms):
+        """Только по тексту вопроса (вес A), без текстов вариантов"""
+        return ' & '.join(f'{term}:*A' for term in terms)
+
+
+def write_db():
+    from .models import Question
+
+    return router.db_for_write(Question)
+
+
+def backend(using=None):
+    vendor = connections[using or write_db()].vendor
+    if vendor == 'sqlite':
+        return SQLiteSearch
+    if vendor == 'postgresql':
+        return PostgreSQLSearch
+    return None
+
+
+def enabled():
+    return backend() is not None
+
+
+def search_terms(query):
+    """Слова запроса (только буквы и цифры — их безопасно подставлять в синтаксис FTS)"""
+    return TERM_RE.findall(normalize(query).lower())[:MAX_TERMS]
+
+
+# ----------------------
+# Обновление индекса
+# ----------------------
+
+def _batches(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = ids[start:start + BATCH_SIZE]
+        yield batch, ', '.join(['%s'] * len(batch))
+
+
+def _reindex(kind, ids):
+    search = backend()
+    if search is None:
+        return
+    alias = 'q' if kind == 'question' else 'a'
+    with connections[write_db()].cursor() as cursor:
+        for batch, placeholders in _batches(ids):
+            cursor.execute(f'DELETE FROM {search.tables[kind]} WHERE {search.key} IN ({placeholders})', batch)
+            cursor.execute(search.index_sql[kind].format(where=f'WHERE {alias}.id IN ({placeholders})'), batch)
+
+
+def _remove(kind, ids):
+    search = backend()
+    if search is None:
+        return
+    with connections[write_db()].cursor() as cursor:
+        for batch, placeholders in _batches(ids):
+            cursor.execute(f'DELETE FROM {search.tables[kind]} WHERE {search.key} IN ({placeholders})', batch)
+
+
+def index_questions(question_ids):
+    """Переиндексирует вопросы (текст вопроса + тексты всех его вариантов)"""
+    _reindex('question', question_ids)
+
+
+def index_answers(answer_ids):
+    _reindex('answer', answer_ids)
+
+
+def remove_questions(question_ids):
+    _remove('question', question_ids)
+
+
+def remove_answers(answer_ids):
+    _remove('answer', answer_ids)
+
+
+def rebuild_index():
+    """Полная перестройка индекса одним INSERT ... SELECT на таблицу"""
+    search = backend()
+    if search is None:
+        return
+    with connections[write_db()].cursor() as cursor:
+        for kind in ('question', 'answer'):
+            cursor.execute(f'DELETE FROM {search.tables[kind]}')
+            cursor.execute(search.index_sql[kind].format(where=''))
+
+
+# ----------------------
+# Поиск
+# ----------------------
+
+def matches(queryset, kind, query):
+    """
+    (условие для filter, выражение релевантности) поиска по индексу для queryset (Question или Answer,
+    kind — 'question' или 'answer'); больше релевантность — лучше, у ненайденных индексом — NULL.
+    Оба — подзапросы в SQL самого queryset, в его базе. None, если индекс недоступен или в запросе нет слов.
+    """
+    search = backend(queryset.db)
+    terms = search_terms(query)
+    if search is None or not terms:
+        return None
+    match = search.query(terms)
+    rank = RawSQL(
+        search.rank_sql[kind].format(table=queryset.model._meta.db_table), [match], output_field=FloatField()
+    )
+    return Q(id__in=RawSQL(search.match_sql[kind], [match])), rank
+
+
+def question_text_ids(query, using):
+    """
+    Подзапрос id вопросов, в тексте которых (без вариантов) есть слова запроса, — для поиска по
+    связанному вопросу (ответы по тексту их вопроса) через индекс, а не LIKE по таблице. None — как у matches.
+    """
+    search = backend(using)
+    terms = search_terms(query)
+    if search is None or not terms:
+        return None
+    return RawSQL(search.match_sql['question'], [search.text_query(terms)])
+
+
+def ranked(queryset, kind, query):
+    """Записи queryset, найденные индексом, с аннотацией search_rank; None — как у matches"""
+    found = matches(queryset, kind, query)
+    if found is None:
+        return None
+    condition, rank = found
+    return queryset.filter(condition).annotate(search_rank=rank)
+
+
+class RankedChangeList(ChangeList):
+    """Список админки: результаты полнотекстового поиска по релевантности, если не выбрана сортировка"""
+
+    def get_ordering(self, request, queryset):
+        if 'search_rank' in queryset.query.annotations and ORDER_VAR not in self.params:
+            # Найденные не индексом, а по остальным полям поиска (search_rank NULL), — в конце
+            return [F('search_rank').desc(nulls_last=True), '-pk']
+        return super().get_ordering(request, queryset)
@@ -0,0 +1,110 @@
+# selection.py
+"""
+Детерминированный выбор вопросов попытки.
+
+Набор вопросов попытки не хранится отдельно: на ExamResult записываются зерно (seed) и снимок банка
+(QuestionBankSnapshot). Снимок содержит id вопросов-кандидатов каждого предмета по сложности и
+количества из ExamSubject на момент старта. Одинаковые снимки экзамена переиспользуются, новая версия
+появляется только при изменении банка или настроек экзамена. Повторный вызов draw_questions(seed, snapshot)
+дает тот же набор в том же порядке; снимок остается у попытки и после архивации, по нему
+regrade.exams_with_questions находит экзамены архивированных попыток.
+
+Порядок вариантов ответа не перемешивается: карточки вопросов кэшируются общими для всех студентов
+(см. caching.py), а выбранные варианты хранятся битами Answer.position.
+
+Чтобы не собирать банк при каждом старте, id текущего снимка экзамена хранится в общем кэше
+под версией банка (caching.question_bank_version): любое изменение вопросов или ExamSubject дает новую
+версию, и следующий старт сверяет банк заново.
+"""
+import hashlib
+import json
+import random
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils.crypto import salted_hmac
+
+from .caching import card_timeout, question_bank_version
+from .models import Question, QuestionBankSnapshot
+
+DIFFICULTIES = ['easy', 'medium', 'hard']
+
+
+def attempt_seed(exam_id, student_id, attempt):
+    """Зерно попытки из (экзамен, студент, номер попытки); соль SECRET_KEY не дает предсказать набор"""
+    digest = salted_hmac('exams.selection', f'{exam_id}:{student_id}:{attempt}').digest()
+    return int.from_bytes(digest[:8], 'big') >> 1  # влезает в BigIntegerField
+
+
+def bank_contents(exam):
+    """Кандидаты и количества вопросов экзамена: [{'subject', 'counts', 'ids'}] по ExamSubject"""
+    exam_subjects = list(exam.exam_subjects.order_by('id'))
+    ids = {}
+    for subject_id, difficulty, question_id in Question.objects.filter(
+        subject__in=[exam_subject.subject_id for exam_subject in exam_subjects]
+    ).order_by('id').values_list('subject_id', 'difficulty', 'id'):
+        ids.setdefault((subject_id, difficulty), []).append(question_id)
+
+    return [
+        {
+            'subject': exam_subject.subject_id,
+            'counts': {difficulty: getattr(exam_subject, f'{difficulty}_count') for difficulty in DIFFICULTIES},
+            'ids': {difficulty: ids.get((exam_subject.subject_id, difficulty), []) for difficulty in DIFFICULTIES},
+        }
+        for exam_subject in exam_subjects
+    ]
+
+
+def snapshot_key(exam_id):
+    return f'bank_snapshot:{exam_id}:{question_bank_version()}'
+
+
+def current_snapshot(exam):
+    """Снимок банка экзамена для новой попытки: из кэша, пока версия банка не изменилась, иначе build_snapshot"""
+    key = snapshot_key(exam.id)
+    snapshot_id = cache.get(key)
+    snapshot = QuestionBankSnapshot.objects.filter(pk=snapshot_id).first() if snapshot_id else None
+    if snapshot is None:
+        snapshot = build_snapshot(exam)
+        cache.set(key, snapshot.id, card_timeout())
+    return snapshot
+
+
+def build_snapshot(exam):
+    """Снимок по текущему банку: существующий с тем же содержимым или новая версия"""
+    data = bank_contents(exam)
+    digest = hashlib.sha256(json.dumps(data, separators=(',', ':')).encode()).hexdigest()
+    snapshots = QuestionBankSnapshot.objects.filter(exam=exam)
+    while True:
+        snapshot = snapshots.filter(digest=digest).first()
+        if snapshot is not None:
+            return snapshot
+        try:
+            with transaction.atomic():
+                version = (snapshots.aggregate(Max('version'))['version__max'] or 0) + 1
+                return QuestionBankSnapshot.objects.create(exam=exam, version=version, digest=digest, data=data)
+        except IntegrityError:
+            # Параллельный старт занял эту версию: снимком с тем же содержимым или другим —
+            # тогда пробуем следующую версию
+            continue
+
+
+def snapshot_questions(snapshot):
+    """id всех вопросов-кандидатов снимка"""
+    return {
+        question_id for entry in snapshot.data for ids in entry['ids'].values() for question_id in ids
+    }
+
+
+def draw_questions(seed, snapshot):
+    """id вопросов попытки в порядке показа: по предметам экзамена, внутри — легкие, средние, сложные"""
+    rng = random.Random(seed)
+    question_ids = []
+    for entry in snapshot.data:
+        for difficulty in DIFFICULTIES:
+            candidates = entry['ids'][difficulty]
+            count = min(entry['counts'][difficulty], len(candidates))
+            if count > 0:
+                question_ids.extend(rng.sample(candidates, count))
+    return question_ids
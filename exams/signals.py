@@ -0,0 +1,112 @@
+# signals.py
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from exam_system.cache import create_cache_tables
+
+from .attempt_state import forget_attempts, forget_exam_attempts
+from .caching import bump_exam_catalog_version, bump_question_bank_version, bump_results_version
+from .search import index_answers, index_questions, remove_answers, remove_questions
+from .models import (
+    Answer, Course, CourseStudent, Exam, ExamResult, ExamSubject, Question, Subject, answers_mask,
+    question_content_hash,
+)
+
+
+def refresh_question_content(question):
+    """
+    Пересчет маски правильных вариантов и хэша содержимого,
+    новая версия содержимого (сбрасывает закэшированные карточки)
+    """
+    answers = list(Answer.objects.filter(question_id=question.pk).order_by('position').values_list(
+        'position', 'text_md', 'text', 'is_correct'
+    ))
+    Question.objects.filter(pk=question.pk).update(
+        correct_mask=answers_mask(position for position, _, _, is_correct in answers if is_correct),
+        content_hash=question_content_hash(
+            question.question_type, question.difficulty, question.text_md, question.text,
+            [answer[1:] for answer in answers],
+        ),
+        content_version=F('content_version') + 1,
+    )
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, **kwargs):
+    refresh_question_content(instance)
+    index_questions([instance.pk])
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    remove_questions([instance.pk])
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+@receiver(post_save, sender=ExamSubject)
+@receiver(post_delete, sender=ExamSubject)
+def question_bank_changed(sender, instance, **kwargs):
+    # После фиксации: иначе параллельный старт успел бы закэшировать снимок прежнего банка под новой версией
+    transaction.on_commit(bump_question_bank_version)
+
+
+@receiver(post_save, sender=Subject)
+def subject_saved(sender, instance, created, **kwargs):
+    # Карточка вопроса показывает название предмета: новая версия содержимого сбрасывает закэшированные
+    if not created:
+        Question.objects.filter(subject=instance).update(content_version=F('content_version') + 1)
+
+
+@receiver(post_save, sender=Answer)
+def answer_saved(sender, instance, **kwargs):
+    index_answers([instance.pk])
+    answer_changed(instance)
+
+
+@receiver(post_delete, sender=Answer)
+def answer_deleted(sender, instance, **kwargs):
+    remove_answers([instance.pk])
+    answer_changed(instance)
+
+
+def answer_changed(answer):
+    try:
+        question = answer.question
+    except Question.DoesNotExist:  # вариант удаляется каскадом вместе с вопросом
+        return
+    refresh_question_content(question)
+    index_questions([question.pk])
+
+
+@receiver(post_save, sender=ExamResult)
+@receiver(post_delete, sender=ExamResult)
+def exam_result_changed(sender, instance, **kwargs):
+    bump_results_version([instance.student_id])
+    forget_attempts([instance.pk])
+
+
+@receiver(post_save, sender=Exam)
+def exam_saved(sender, instance, **kwargs):
+    # Время открытия, закрытия или продолжительность могли измениться (см. Exam.refresh_attempt_deadlines)
+    forget_exam_attempts(instance.pk)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Exam)
+@receiver(post_delete, sender=Exam)
+@receiver(post_save, sender=ExamSubject)
+@receiver(post_delete, sender=ExamSubject)
+@receiver(post_save, sender=CourseStudent)
+@receiver(post_delete, sender=CourseStudent)
+def exam_catalog_changed(sender, instance, **kwargs):
+    bump_exam_catalog_version()
+
+
+@receiver(post_migrate)
+def create_cache_table(sender, **kwargs):
+    # Таблица общего кэша миграциями не создается; повторный вызов ничего не меняет
+    if sender.name == 'exams':
+        create_cache_tables()
@@ -0,0 +1,132 @@
+# stats.py
+"""Инкрементальное обновление материализованной статистики экзаменов (ExamStats)"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+
+from .archive import archived_subject_points
+from .models import FINISHED_STATUSES, ExamResult, ExamStats, ExamSubject, StudentAnswer
+
+
+def pass_percentage():
+    return getattr(settings, 'EXAM_PASS_PERCENTAGE', 60)
+
+
+def percentage_bucket(percentage):
+    """Номер корзины гистограммы для процента результата"""
+    bucket = int(percentage // (100 / ExamStats.HISTOGRAM_BUCKETS))
+    return min(max(bucket, 0), ExamStats.HISTOGRAM_BUCKETS - 1)
+
+
+def _empty_delta():
+    return {
+        'results_count': 0,
+        'passed_count': 0,
+        'score_sum': 0.0,
+        'score_sq_sum': 0.0,
+        'max_score_sum': 0.0,
+        'histogram': [0] * ExamStats.HISTOGRAM_BUCKETS,
+    }
+
+
+def _add_score(delta, score, max_score):
+    percentage = (score / max_score * 100) if max_score > 0 else 0
+    delta['results_count'] += 1
+    delta['passed_count'] += int(percentage >= pass_percentage())
+    delta['score_sum'] += score
+    delta['score_sq_sum'] += score * score
+    delta['max_score_sum'] += max_score
+    delta['histogram'][percentage_bucket(percentage)] += 1
+
+
+def collect_deltas(results):
+    """
+    Собирает вклад результатов в статистику.
+    results — итерируемое (id, exam_id, score, max_score); возвращает {(exam_id, subject_id): delta}.
+    Баллы по предметам считаются одним сгруппированным запросом на всю пачку.
+    """
+    results = list(results)
+    deltas = defaultdict(_empty_delta)
+    if not results:
+        return deltas
+
+    for _, exam_id, score, max_score in results:
+        _add_score(deltas[(exam_id, None)], score or 0, max_score or 0)
+
+    exam_ids = {exam_id for _, exam_id, _, _ in results}
+    subject_max = {
+        (es.exam_id, es.subject_id): es.max_score()
+        for es in ExamSubject.objects.filter(exam_id__in=exam_ids)
+    }
+
+    subject_scores = defaultdict(float)
+    rows = StudentAnswer.objects.filter(
+        exam_result_id__in=[result_id for result_id, _, _, _ in results]
+    ).values('exam_result_id', 'question__subject_id').annotate(points=Sum('points_earned'))
+    for row in rows:
+        subject_scores[(row['exam_result_id'], row['question__subject_id'])] = row['points'] or 0
+    # Ответы архивных попыток хранятся не в StudentAnswer (нужно для rebuild_stats)
+    subject_scores.update(archived_subject_points([result_id for result_id, _, _, _ in results]))
+
+    for result_id, exam_id, _, _ in results:
+        for (es_exam_id, subject_id), max_score in subject_max.items():
+            if es_exam_id == exam_id:
+                _add_score(deltas[(exam_id, subject_id)], subject_scores[(result_id, subject_id)], max_score)
+
+    return deltas
+
+
+def apply_deltas(deltas):
+    """Прибавляет собранный вклад к строкам ExamStats (строки блокируются на время обновления)"""
+    with transaction.atomic():
+        for (exam_id, subject_id), delta in sorted(deltas.items(), key=lambda item: (item[0][0], item[0][1] or 0)):
+            stats, _ = ExamStats.objects.select_for_update().get_or_create(exam_id=exam_id, subject_id=subject_id)
+            stats.results_count += delta['results_count']
+            stats.passed_count += delta['passed_count']
+            stats.score_sum += delta['score_sum']
+            stats.score_sq_sum += delta['score_sq_sum']
+            stats.max_score_sum += delta['max_score_sum']
+            histogram = stats.histogram or [0] * ExamStats.HISTOGRAM_BUCKETS
+            stats.histogram = [a + b for a, b in zip(histogram, delta['histogram'])]
+            stats.save()
+
+
+def subtract_deltas(after, before):
+    """Изменение вклада в статистику: вклад результатов после пересчета баллов минус вклад до него"""
+    deltas = defaultdict(_empty_delta)
+    for key in set(after) | set(before):
+        new, old = after.get(key, _empty_delta()), before.get(key, _empty_delta())
+        deltas[key] = {
+            name: [a - b for a, b in zip(new[name], old[name])] if name == 'histogram' else new[name] - old[name]
+            for name in new
+        }
+    return deltas
+
+
+def record_results(exam_results):
+    """Учитывает только что завершенные попытки в статистике"""
+    apply_deltas(collect_deltas(
+        (r.id, r.exam_id, r.score, r.max_score) for r in exam_results
+    ))
+
+
+def rebuild_stats(exam_ids=None, chunk_size=2000):
+    """Полностью пересчитывает статистику (по всем экзаменам или по указанным)"""
+    results = ExamResult.objects.filter(status__in=FINISHED_STATUSES)
+    stats = ExamStats.objects.all()
+    if exam_ids is not None:
+        results = results.filter(exam_id__in=exam_ids)
+        stats = stats.filter(exam_id__in=exam_ids)
+
+    with transaction.atomic():
+        stats.delete()
+        chunk = []
+        for row in results.order_by('id').values_list('id', 'exam_id', 'score', 'max_score').iterator(chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                apply_deltas(collect_deltas(chunk))
+                chunk = []
+        if chunk:
+            apply_deltas(collect_deltas(chunk))
@@ -1,3 +1,416 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import admission, attempt_state
+from .archive import archive_attempts
+from .consumers import current_time
+from .expiry import expire_due_attempts
+from .grading import grade_answers, grading_queue
+from .models import (
+    Answer, Course, CourseStudent, Exam, ExamResult, ExamStats, ExamSubject, Question, QuestionBankSnapshot, Student,
+    StudentAnswer, Subject,
+)
+from .regrade import exam_diff, exams_with_questions, regrade_exam
+from .selection import build_snapshot
+from .views import finalize_exam, process_answer, process_sync
+
+
+class ExamTestCase(TestCase):
+    """Курс с одним предметом, экзамен на три вопроса и начатая студентом попытка"""
+    databases = {'default', 'cache'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = Course.objects.create(name='Курс')
+        cls.subject = Subject.objects.create(course=cls.course, name='Предмет')
+        for number, difficulty in enumerate(['easy', 'medium', 'hard']):
+            question = Question.objects.create(
+                subject=cls.subject, text_md=f'Вопрос {number}', difficulty=difficulty, question_type='single_choice',
+            )
+            for position in range(3):
+                Answer.objects.create(
+                    question=question, position=position, text_md=f'Вариант {position}', is_correct=position == 0,
+                )
+        now = timezone.now()
+        cls.exam = Exam.objects.create(
+            course=cls.course, name='Экзамен', open_time=now - timedelta(hours=1), close_time=now + timedelta(hours=2),
+            duration_minutes=60, attempts_allowed=3,
+        )
+        ExamSubject.objects.create(exam=cls.exam, subject=cls.subject, easy_count=1, medium_count=1, hard_count=1)
+        cls.student = Student.objects.create(student_id='S1', first_name='Иван', last_name='Петров', group='Г1')
+        CourseStudent.objects.create(course=cls.course, student=cls.student)
+
+    def setUp(self):
+        # Копии состояния попыток в процессе переживают откат транзакции теста
+        attempt_state._local.clear()
+
+    def start_attempt(self, student=None):
+        client = Client()
+        client.post('/', {'student_id': (student or self.student).student_id})
+        client.get(f'/exams/start/{self.exam.id}/')
+        return ExamResult.objects.filter(student=student or self.student).latest('id')
+
+    def option(self, student_answer, correct=True):
+        return student_answer.question.answers.filter(is_correct=correct).values_list('id', flat=True)[0]
+
+    def answer(self, exam_result, student_answer, answer_ids, seq=None):
+        return process_answer(self.student.id, exam_result.id, {
+            'student_answer_id': student_answer.id, 'answer_ids': answer_ids, 'seq': seq,
+        })
+
+    def answer_all(self, exam_result, correct=True):
+        for student_answer in exam_result.student_answers.select_related('question'):
+            self.answer(exam_result, student_answer, [self.option(student_answer, correct)])
+
+
+class StoreAnswerTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam_result = self.start_attempt()
+        self.student_answer = self.exam_result.student_answers.select_related('question').first()
+
+    def test_newer_seq_is_saved(self):
+        result = self.answer(self.exam_result, self.student_answer, [self.option(self.student_answer)], seq=1)
+        self.assertEqual(result, {'success': True, 'saved': True, 'seq': 1})
+        self.student_answer.refresh_from_db()
+        self.assertTrue(self.student_answer.is_correct)
+        self.assertEqual(self.student_answer.client_seq, 1)
+
+    def test_stale_seq_is_skipped(self):
+        self.answer(self.exam_result, self.student_answer, [self.option(self.student_answer)], seq=2)
+        result = self.answer(self.exam_result, self.student_answer, [self.option(self.student_answer, False)], seq=1)
+        self.assertEqual(result, {'success': True, 'saved': False, 'seq': 2})
+        self.student_answer.refresh_from_db()
+        self.assertTrue(self.student_answer.is_correct)
+
+    def test_same_content_is_not_rewritten(self):
+        option = self.option(self.student_answer)
+        self.answer(self.exam_result, self.student_answer, [option], seq=1)
+        version = ExamResult.objects.get(pk=self.exam_result.pk).answers_version
+        result = self.answer(self.exam_result, self.student_answer, [option], seq=2)
+        self.assertEqual(result, {'success': True, 'saved': False, 'seq': 2})
+        self.assertEqual(ExamResult.objects.get(pk=self.exam_result.pk).answers_version, version)
+        # Запоздавшее изменение до повторного ответа тоже устарело
+        self.student_answer.refresh_from_db()
+        self.assertEqual(self.student_answer.client_seq, 2)
+
+    def test_finished_attempt_is_not_written(self):
+        finalize_exam(self.exam_result, 'finished')
+        result = self.answer(self.exam_result, self.student_answer, [self.option(self.student_answer)], seq=1)
+        self.assertFalse(result['success'])
+
+
+class SyncAnswersTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam_result = self.start_attempt()
+
+    def test_sync_acks_and_changes_from_other_device(self):
+        first, second = self.exam_result.student_answers.select_related('question')[:2]
+        self.answer(self.exam_result, second, [self.option(second)], seq=3)
+
+        result = process_sync(self.student.id, self.exam_result.id, {'base_version': 0, 'answers': [
+            {'student_answer_id': first.id, 'seq': 1, 'answer_ids': [self.option(first)]},
+        ]})
+        self.assertTrue(result['success'])
+        self.assertEqual(result['acks'], {first.id: 1})
+        self.assertEqual(result['changed'], [{
+            'student_answer_id': second.id, 'seq': 3, 'answer_ids': [self.option(second)], 'answer_text': '',
+        }])
+
+        # Повтор того же пакета ничего не меняет
+        repeated = process_sync(self.student.id, self.exam_result.id, {'base_version': result['version'], 'answers': [
+            {'student_answer_id': first.id, 'seq': 1, 'answer_ids': [self.option(first)]},
+        ]})
+        self.assertEqual(repeated['version'], result['version'])
+        self.assertEqual(repeated['acks'], {first.id: 1})
+        self.assertEqual(repeated['changed'], [])
+
+
+class RegradeTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam_result = self.start_attempt()
+        self.answer_all(self.exam_result)
+        finalize_exam(self.exam_result, 'finished')
+        self.exam_result.refresh_from_db()
+        self.full_score = self.exam_result.score
+
+    def change_key(self):
+        """Правильным становится второй вариант первого вопроса (он есть в каждой попытке)"""
+        question = Question.objects.order_by('id').first()
+        old, new = question.answers.order_by('position')[:2]
+        old.is_correct = False
+        old.save()
+        new.is_correct = True
+        new.save()
+        return question
+
+    def test_nothing_to_regrade(self):
+        self.assertEqual(exam_diff(self.exam), {'answers': 0, 'results': {}})
+
+    def test_dry_run_does_not_write(self):
+        question = self.change_key()
+        diff = regrade_exam(self.exam, dry_run=True)
+        points = ExamSubject.objects.get(exam=self.exam).points(question.difficulty)
+        self.assertEqual(diff['answers'], 1)
+        self.assertEqual(diff['results'], {
+            self.exam_result.id: ((self.full_score, self.exam_result.max_score),
+                                  (self.full_score - points, self.exam_result.max_score)),
+        })
+        self.exam_result.refresh_from_db()
+        self.assertEqual(self.exam_result.score, self.full_score)
+        self.assertTrue(StudentAnswer.objects.get(exam_result=self.exam_result, question=question).is_correct)
+
+    def test_apply_writes_diff(self):
+        question = self.change_key()
+        diff = regrade_exam(self.exam)
+        self.exam_result.refresh_from_db()
+        self.assertEqual(self.exam_result.score, diff['results'][self.exam_result.id][1][0])
+        self.assertFalse(StudentAnswer.objects.get(exam_result=self.exam_result, question=question).is_correct)
+        self.assertEqual(exam_diff(self.exam), {'answers': 0, 'results': {}})
+
+    def test_archived_attempt_is_regraded(self):
+        ExamResult.objects.filter(pk=self.exam_result.pk).update(end_time=timezone.now() - timedelta(days=365))
+        self.assertEqual(archive_attempts(older_than_days=30), 1)
+        self.change_key()
+        diff = regrade_exam(self.exam)
+        self.assertIsNotNone(diff['results'][self.exam_result.id])
+        self.exam_result.refresh_from_db()
+        self.assertLess(self.exam_result.score, self.full_score)
+        self.assertEqual(exam_diff(self.exam), {'answers': 0, 'results': {}})
+
+    def test_archived_attempt_is_found_by_question(self):
+        ExamResult.objects.filter(pk=self.exam_result.pk).update(end_time=timezone.now() - timedelta(days=365))
+        archive_attempts(older_than_days=30)
+        question = Question.objects.order_by('id').first()
+        self.assertEqual(list(exams_with_questions([question.id])), [self.exam])
+        # Попытка без снимка банка — по предметам экзамена
+        ExamResult.objects.filter(pk=self.exam_result.pk).update(bank_snapshot=None)
+        self.assertEqual(list(exams_with_questions([question.id])), [self.exam])
+        other = Question.objects.create(
+            subject=Subject.objects.create(course=self.course, name='Другой'), text_md='Вне экзамена',
+        )
+        self.assertEqual(list(exams_with_questions([other.id])), [])
+
+
+class ExpiryTests(ExamTestCase):
+    def test_is_expired_uses_deadline(self):
+        exam_result = ExamResult.objects.select_related('exam').get(pk=self.start_attempt().pk)
+        self.assertFalse(exam_result.is_expired())
+        exam_result.deadline = timezone.now() - timedelta(seconds=1)
+        self.assertTrue(exam_result.is_expired())
+
+    def test_due_attempt_is_finished_with_score(self):
+        exam_result = self.start_attempt()
+        self.answer_all(exam_result)
+        ExamResult.objects.filter(pk=exam_result.pk).update(deadline=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(expire_due_attempts(), 1)
+        exam_result.refresh_from_db()
+        self.assertEqual(exam_result.status, 'time_expired')
+        self.assertEqual(exam_result.score, exam_result.max_score)
+        self.assertEqual(expire_due_attempts(), 0)
+
+    def test_attempt_before_deadline_is_kept(self):
+        exam_result = self.start_attempt()
+        self.assertEqual(expire_due_attempts(), 0)
+        exam_result.refresh_from_db()
+        self.assertEqual(exam_result.status, 'in_progress')
+
+
+@override_settings(EXAM_ADMISSION_RATE=1, EXAM_ADMISSION_BURST=2)
+class AdmissionTests(ExamTestCase):
+    def test_burst_is_admitted_then_queued(self):
+        tickets = [admission.take_ticket(self.exam.id) for _ in range(4)]
+        statuses = [admission.status(ticket, self.exam.id) for ticket in tickets]
+        self.assertEqual([status['admitted'] for status in statuses], [True, True, False, False])
+        self.assertEqual([status['position'] for status in statuses[2:]], [1, 2])
+
+    def test_admitted_ticket_while_bucket_is_locked(self):
+        ticket = admission.take_ticket(self.exam.id)
+        self.assertTrue(admission.status(ticket, self.exam.id)['admitted'])
+        with admission._locked(self.exam.id):
+            self.assertTrue(admission.status(ticket, self.exam.id)['admitted'])
+
+    def test_ticket_is_released_without_questions(self):
+        exam = Exam.objects.create(
+            course=self.course, name='Пустой экзамен', open_time=self.exam.open_time, close_time=self.exam.close_time,
+            duration_minutes=60,
+        )
+        client = Client()
+        client.post('/', {'student_id': self.student.student_id})
+        client.get(f'/exams/start/{exam.id}/')
+        self.assertNotIn(admission.session_key(exam.id), client.session)
+        self.assertFalse(ExamResult.objects.filter(exam=exam).exists())
+
+
+class AttemptStateTests(ExamTestCase):
+    def test_deadline_is_taken_from_result(self):
+        exam_result = self.start_attempt()
+        ExamResult.objects.filter(pk=exam_result.pk).update(deadline=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(attempt_state.time_error(attempt_state.load_state(exam_result.id)), 'Время истекло')
+
+    def test_finished_attempt_is_forgotten(self):
+        exam_result = self.start_attempt()
+        self.assertTrue(attempt_state.writable(attempt_state.get_attempt_state(exam_result.id), self.student.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            finalize_exam(exam_result, 'finished')
+        self.assertFalse(attempt_state.writable(attempt_state.get_attempt_state(exam_result.id), self.student.id))
+
+
+class GradingTests(ExamTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        essays = Subject.objects.create(course=cls.course, name='Эссе')
+        Question.objects.create(subject=essays, text_md='Опишите', difficulty='hard', question_type='open')
+        ExamSubject.objects.create(exam=cls.exam, subject=essays, hard_count=1, hard_points=5)
+
+    def setUp(self):
+        super().setUp()
+        self.exam_result = self.start_attempt()
+        self.answer_all_choices()
+        self.open_answer = self.exam_result.student_answers.get(question__question_type='open')
+        process_answer(self.student.id, self.exam_result.id, {
+            'student_answer_id': self.open_answer.id, 'answer_text': 'Ответ',
+        })
+        finalize_exam(self.exam_result, 'finished')
+        self.exam_result.refresh_from_db()
+
+    def answer_all_choices(self):
+        for student_answer in self.exam_result.student_answers.select_related('question').exclude(
+            question__question_type='open'
+        ):
+            self.answer(self.exam_result, student_answer, [self.option(student_answer)])
+
+    def exam_stats(self):
+        return ExamStats.objects.get(exam=self.exam, subject__isnull=True)
+
+    def test_answer_waits_in_queue(self):
+        self.assertEqual([(question.id, count) for question, count in grading_queue()], [(self.open_answer.question_id, 1)])
+        self.open_answer.refresh_from_db()
+        self.assertIsNone(self.open_answer.is_correct)
+
+    def test_points_are_capped_by_exam_subject(self):
+        with self.assertRaises(ValueError):
+            grade_answers({self.open_answer.id: 6}, 'teacher')
+        self.open_answer.refresh_from_db()
+        self.assertIsNone(self.open_answer.is_correct)
+
+    def test_grade_rescores_attempt_and_stats(self):
+        score, score_sum = self.exam_result.score, self.exam_stats().score_sum
+        self.assertEqual(grade_answers({self.open_answer.id: 5}, 'teacher'), 1)
+
+        self.open_answer.refresh_from_db()
+        self.assertTrue(self.open_answer.is_correct)
+        self.assertEqual(self.open_answer.graded_by, 'teacher')
+        self.exam_result.refresh_from_db()
+        self.assertEqual(self.exam_result.score, score + 5)
+        self.assertEqual(self.exam_result.breakdown['subjects']['Эссе'], {'correct': 1, 'total': 1, 'points': 5})
+        self.assertEqual(self.exam_stats().score_sum, score_sum + 5)
+        self.assertEqual(grading_queue(), [])
+
+    def test_partial_points_are_not_correct(self):
+        grade_answers({self.open_answer.id: 2}, 'teacher')
+        self.open_answer.refresh_from_db()
+        self.assertIs(self.open_answer.is_correct, False)
+        self.assertEqual(self.open_answer.points_earned, 2)
+
+    def test_grading_view_saves_page(self):
+        staff = User.objects.create_user('teacher', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        url = reverse('admin:exams_grading_question', args=[self.open_answer.question_id])
+        response = self.client.post(url, {f'points_{self.open_answer.id}': '4'})
+        self.assertRedirects(response, f'{url}?after=0', fetch_redirect_response=False)
+        self.open_answer.refresh_from_db()
+        self.assertEqual((self.open_answer.points_earned, self.open_answer.graded_by), (4, 'teacher'))
+
+        self.client.post(url, {f'points_{self.open_answer.id}': '9'})  # больше максимума — не сохраняется
+        self.open_answer.refresh_from_db()
+        self.assertEqual(self.open_answer.points_earned, 4)
+
+
+class AdminSearchTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+        self.algebra = Subject.objects.create(course=self.course, name='Алгебра')
+        self.question = Question.objects.create(subject=self.algebra, text_md='Интеграл Римана', question_type='single_choice')
+        self.option = Answer.objects.create(question=self.question, text_md='Сумма площадей', is_correct=True)
+
+    def found(self, model, term, **params):
+        response = self.client.get(reverse(f'admin:exams_{model}_changelist'), {'q': term, **params})
+        return set(response.context['cl'].queryset.values_list('pk', flat=True))
+
+    def test_question_text_and_options(self):
+        self.assertEqual(self.found('question', 'интеграл'), {self.question.id})
+        self.assertEqual(self.found('question', 'площад'), {self.question.id})
+
+    def test_question_by_subject_name(self):
+        self.assertEqual(self.found('question', 'Алгеб'), {self.question.id})
+        self.assertEqual(self.found('question', 'Алгеб', subject__id__exact=self.subject.id), set())
+
+    def test_answer_by_question_text(self):
+        self.assertEqual(self.found('answer', 'римана'), {self.option.id})
+        # Текст вариантов в индексе вопроса не делает найденными все варианты вопроса
+        other = Answer.objects.create(question=self.question, text_md='Предел', is_correct=False)
+        self.assertEqual(self.found('answer', 'площад'), {self.option.id})
+        self.assertEqual(self.found('answer', 'римана'), {self.option.id, other.id})
+
+
+class AnswerPositionTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.question = Question.objects.order_by('id').first()
+
+    def test_deleted_position_is_not_reused(self):
+        self.question.answers.get(position=2).delete()
+        answer = Answer.objects.create(question=self.question, text_md='Новый вариант')
+        self.assertEqual(answer.position, 3)
+
+    def test_explicit_position_moves_counter(self):
+        Answer.objects.create(question=self.question, position=7, text_md='Вариант 7')
+        answer = Answer.objects.create(question=self.question, text_md='Следующий вариант')
+        self.assertEqual(answer.position, 8)
+
+
+class SnapshotTests(ExamTestCase):
+    def test_same_bank_reuses_snapshot(self):
+        self.assertEqual(build_snapshot(self.exam), build_snapshot(self.exam))
+
+    def test_version_taken_by_parallel_start(self):
+        # Параллельный старт со старым банком записал версию 1 после того, как этот прочитал наибольшую
+        QuestionBankSnapshot.objects.create(exam=self.exam, version=1, digest='other', data=[])
+        aggregate = QuerySet.aggregate
+        reads = iter([{'version__max': None}])
+        with mock.patch.object(QuerySet, 'aggregate', lambda qs, *args: next(reads, None) or aggregate(qs, *args)):
+            snapshot = build_snapshot(self.exam)
+        self.assertEqual(snapshot.version, 2)
+        self.assertNotEqual(snapshot.digest, 'other')
+
+
+class SocketTimeTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam_result = self.start_attempt()
+
+    def test_time_is_read_from_cached_state(self):
+        attempt_state.get_attempt_state(self.exam_result.id)
+        with self.assertNumQueries(0):
+            state = current_time(self.student.id, self.exam_result.id)
+        self.assertEqual(state['status'], 'in_progress')
+        self.assertGreater(state['remaining'], 0)
+
+    def test_expired_attempt_is_finished(self):
+        ExamResult.objects.filter(pk=self.exam_result.pk).update(deadline=timezone.now() - timedelta(seconds=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            attempt_state.forget_attempts([self.exam_result.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            state = current_time(self.student.id, self.exam_result.id)
+        self.assertEqual(state, {'status': 'time_expired', 'remaining': 0})
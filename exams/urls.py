@@ -10,10 +10,13 @@ urlpatterns = [
     # Экзамены для студентов
     path('exams/', views.exam_list, name='exam_list'),
     path('exams/start/<int:exam_id>/', views.start_exam, name='start_exam'),
+    path('exams/start/<int:exam_id>/wait/', views.exam_waiting_room, name='exam_waiting_room'),
+    path('exams/start/<int:exam_id>/status/', views.exam_admission_status, name='exam_admission_status'),
     path('exams/take/<int:exam_result_id>/', views.take_exam, name='take_exam'),
     
     # Работа с ответами
     path('exams/answer/<int:exam_result_id>/', views.save_answer, name='save_answer'),
+    path('exams/answer/<int:exam_result_id>/sync/', views.sync_answers, name='sync_answers'),
     path('exams/finish/<int:exam_result_id>/', views.finish_exam, name='finish_exam'),
     
     # Результаты
@@ -1,19 +1,38 @@
 import json
-import random
-import pandas as pd
+import logging
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, HttpResponse
+from django.urls import reverse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_POST
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import content_disposition_header
+from django.conf import settings
 from django.contrib import messages
 from django.db import transaction
-from django.db.models import Sum
+from django.db.models import F, Subquery, Sum
 from django.core.files.storage import FileSystemStorage
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from exam_system.db_router import read_from_primary, replica_reads, stick_to_primary
 
 from .models import *
+from . import admission
+from .archive import load_answers
+from .attempt_state import forget_attempts, get_attempt_state, time_error, writable
+from .breakdown import compute_breakdowns, difficulty_rows
+from .caching import exam_catalog_version, make_etag, student_exam_schedule, student_question_cards
+from .enrollment import enroll_groups, enroll_roster, enroll_students, student_groups
+from .excel import XLSX_CONTENT_TYPE, read_roster, read_students, students_template
+from .grading import grade_answers, grading_queue, question_page, ungraded_answers
+from .pagination import CURSOR_VAR, decode_cursor, keyset_page, with_percentage
+from .reports import async_chunks, zip_reports
+from .selection import attempt_seed, current_snapshot, draw_questions
+from .stats import record_results
+
+logger = logging.getLogger(__name__)
 
 # ----------------------
 # Сессии для студентов
@@ -45,6 +64,52 @@ def student_required(view_func):
         return view_func(request, *args, **kwargs)
     return wrapper
 
+# ----------------------
+# Условные GET (ETag)
+# ----------------------
+
+def has_pending_messages(request):
+    """Флеш-сообщения выводятся в base.html, страницу с ними нельзя отвечать 304"""
+    return bool(request.COOKIES.get('messages')) or bool(request.session.get('_messages'))
+
+def exam_list_etag(request):
+    """Версия результатов студента + версия расписания + текущая фаза каждого экзамена"""
+    if has_pending_messages(request):
+        return None
+    now = timezone.now()
+    phases = ''.join(
+        'u' if now < open_time else ('o' if now <= close_time else 'c')
+        for _, open_time, close_time in student_exam_schedule(request.student)
+    )
+    student = request.student
+    return make_etag('exam_list', student.id, student.results_version, exam_catalog_version(), phases)
+
+def exam_results_list_etag(request):
+    if has_pending_messages(request):
+        return None
+    student = request.student
+    return make_etag('exam_results_list', student.id, student.results_version, request.GET.urlencode())
+
+def finished_result(request, exam_result_id):
+    """(status, end_time) завершенной попытки студента одним запросом по PK"""
+    if not hasattr(request, '_finished_result'):
+        row = ExamResult.objects.filter(
+            id=exam_result_id, student=request.student
+        ).exclude(status='in_progress').values_list('status', 'end_time').first()
+        request._finished_result = row
+    return request._finished_result
+
+def exam_result_detail_etag(request, exam_result_id):
+    row = finished_result(request, exam_result_id)
+    if row is None or has_pending_messages(request):
+        return None
+    status, end_time = row
+    return make_etag('exam_result_detail', exam_result_id, request.student.results_version, status, end_time)
+
+def exam_result_detail_last_modified(request, exam_result_id):
+    row = finished_result(request, exam_result_id)
+    return row[1] if row else None
+
 # ----------------------
 # Аутентификация
 # ----------------------
@@ -72,6 +137,7 @@ def student_logout(request):
 # ----------------------
 
 @student_required
+@condition(etag_func=exam_list_etag)
 def exam_list(request):
     """Список доступных экзаменов"""
     now = timezone.now()
@@ -158,36 +224,67 @@ def start_exam(request, exam_id):
     if existing_exam:
         return redirect('take_exam', exam_result_id=existing_exam.id)
     
-    # Создаем новый результат экзамена
-    exam_result = ExamResult.objects.create(
-        exam=exam,
-        student=student,
-        start_time=timezone.now(),
-        status="in_progress"
-    )
-    
-    # Генерируем вопросы
-    selected_questions = []
-    for exam_subject in exam.exam_subjects.all():
-        selected_questions.extend(get_random_questions(exam_subject))
+    # В час пик новые попытки создаются с ограниченной скоростью, остальные ждут своей очереди
+    if not admission.admit(request, exam.id):
+        return redirect('exam_waiting_room', exam_id=exam.id)
     
-    if not selected_questions:
+    # Вопросы выводятся из зерна попытки и снимка банка; набор отдельно не хранится
+    snapshot = current_snapshot(exam)
+    seed = attempt_seed(exam.id, student.id, attempts + 1)
+    question_ids = draw_questions(seed, snapshot)
+    if not question_ids:
+        admission.release(request, exam.id)
         messages.error(request, 'Не найдено вопросов для этого экзамена')
-        exam_result.delete()
         return redirect('exam_list')
     
-    exam_result.questions.set(selected_questions)
-    
-    # Создаем записи StudentAnswer
-    for question in selected_questions:
-        StudentAnswer.objects.create(
-            exam_result=exam_result,
-            question=question
+    # Создаем новый результат экзамена и записи StudentAnswer (порядок id — порядок показа)
+    start_time = timezone.now()
+    with transaction.atomic():
+        exam_result = ExamResult.objects.create(
+            exam=exam,
+            student=student,
+            start_time=start_time,
+            deadline=exam.attempt_deadline(start_time),
+            status="in_progress",
+            seed=seed,
+            bank_snapshot=snapshot,
         )
-    
+        StudentAnswer.objects.bulk_create([
+            StudentAnswer(exam_result=exam_result, question_id=question_id) for question_id in question_ids
+        ])
+    
+    admission.release(request, exam.id)
+    logger.info('Попытка начата', extra={
+        'event': 'start', 'attempt': exam_result.id, 'exam': exam.id, 'student': student.id,
+        'questions': len(question_ids),
+    })
+    stick_to_primary(request)
     messages.success(request, f'Экзамен "{exam.name}" начат. Удачи!')
     return redirect('take_exam', exam_result_id=exam_result.id)
 
+@student_required
+def exam_waiting_room(request, exam_id):
+    """Ожидание очереди на начало экзамена"""
+    exam = get_object_or_404(Exam, pk=exam_id)
+    status = admission.request_status(request, exam.id)
+    if status['admitted']:
+        return redirect('start_exam', exam_id=exam.id)
+    return render(request, 'exams/waiting_room.html', {
+        'exam': exam,
+        'status': status,
+        'ticket': admission.ticket_token(request, exam.id),
+        'poll_seconds': admission.poll_seconds(),
+    })
+
+def exam_admission_status(request, exam_id):
+    """Опрос очереди со страницы ожидания (JSON) по подписанному номеру очереди"""
+    # Сессия не нужна: без нее SessionMiddleware не сохраняет ее в базу на каждый опрос
+    # (SESSION_SAVE_EVERY_REQUEST), и ожидающие не нагружают базу
+    del request.session
+    response = JsonResponse(admission.token_status(exam_id, request.GET.get('ticket', '')))
+    patch_cache_control(response, no_store=True)
+    return response
+
 @student_required
 def take_exam(request, exam_result_id):
     """Прохождение экзамена"""
@@ -202,17 +299,15 @@ def take_exam(request, exam_result_id):
     if exam_result.is_expired():
         return finalize_exam(exam_result, "time_expired")
     
+    # Карточки вопросов берутся из кэша, поверх накладывается состояние студента
     student_answers = exam_result.student_answers.select_related(
         'question', 
         'question__subject'
-    ).prefetch_related(
-        'question__answers',
-        'selected_answers'
-    )
+    ).order_by('id')
     
     return render(request, 'exams/take_exam.html', {
         'exam_result': exam_result,
-        'student_answers': student_answers,
+        'question_cards': student_question_cards(student_answers),
         'time_remaining': exam_result.time_remaining()
     })
 
@@ -226,69 +321,178 @@ def take_exam(request, exam_result_id):
 def save_answer(request, exam_result_id):
     try:
         data = json.loads(request.body)
-        student_answer_id = data.get('student_answer_id')
-        answer_ids = data.get('answer_ids', [])
-        answer_text = data.get('answer_text', '')
-
-        student_answer = get_object_or_404(
-            StudentAnswer,
-            id=student_answer_id,
-            exam_result__student=request.student,
-            exam_result__status='in_progress'
-        )
-        
-        # Проверяем что экзамен еще открыт
-        if not student_answer.exam_result.exam.is_open():
-            return JsonResponse({'success': False, 'error': 'Время проведения экзамена истекло'})
-        
-        # Проверяем время экзамена студента
-        if student_answer.exam_result.is_expired():
-            return JsonResponse({'success': False, 'error': 'Время истекло'})
-
-        with transaction.atomic():
-            if student_answer.question.question_type in ['open', 'text']:
-                student_answer.answer_text = answer_text
-                student_answer.is_correct = None
-                student_answer.points_earned = None
-            else:
-                student_answer.selected_answers.clear()
-                if answer_ids:
-                    answers = Answer.objects.filter(
-                        id__in=answer_ids, 
-                        question=student_answer.question
-                    )
-                    student_answer.selected_answers.set(answers)
-                check_answer_correctness(student_answer)
-            
-            student_answer.save()
+        return JsonResponse(process_answer(request.student.id, exam_result_id, data))
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
 
-        return JsonResponse({'success': True})
+@student_required
+@require_POST
+@csrf_exempt
+def sync_answers(request, exam_result_id):
+    """Пакет ответов из очереди страницы (take_exam.html); см. process_sync"""
+    try:
+        data = json.loads(request.body)
+        return JsonResponse(process_sync(request.student.id, exam_result_id, data))
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
+def process_sync(student_id, exam_result_id, data):
+    """
+    Синхронизация ответов (общая логика для HTTP и WebSocket).
+    data: {'base_version': N, 'answers': [{'student_answer_id', 'seq', 'answer_ids', 'answer_text'}]} —
+    только ответы, не подтвержденные сервером. Ответ: новая версия попытки, подтвержденные номера
+    {student_answer_id: seq} и ответы, записанные после base_version из другой вкладки или устройства.
+    """
+    state = get_attempt_state(exam_result_id)
+    if not writable(state, student_id):
+        return {'success': False, 'error': 'Попытка не найдена'}
+    error = time_error(state)
+    if error:
+        return {'success': False, 'error': error}
+
+    items = {int(item['student_answer_id']): item for item in data.get('answers', [])}
+    student_answers = StudentAnswer.objects.select_related('question').filter(
+        id__in=[student_answer_id for student_answer_id in items if student_answer_id in state['answers']]
+    )
+    acks = {}
+    with transaction.atomic():
+        for student_answer in student_answers:
+            item = items[student_answer.id]
+            result = store_answer(student_answer, item.get('answer_ids', []), item.get('answer_text', ''), item.get('seq'))
+            if not result['success']:
+                return result
+            acks[student_answer.id] = result['seq']
+    # Несуществующие ответы тоже подтверждаются, чтобы страница не присылала их снова
+    acks.update({student_answer_id: item.get('seq') for student_answer_id, item in items.items() if student_answer_id not in acks})
+
+    version = ExamResult.objects.filter(pk=exam_result_id).values_list('answers_version', flat=True).get()
+    return {
+        'success': True,
+        'version': version,
+        'acks': acks,
+        'changed': changed_answers(exam_result_id, int(data.get('base_version') or 0), exclude=list(items)),
+    }
+
+def changed_answers(exam_result_id, base_version, exclude=()):
+    """Ответы попытки, записанные после base_version, в виде сообщений синхронизации"""
+    changed = list(StudentAnswer.objects.filter(
+        exam_result_id=exam_result_id, version__gt=base_version
+    ).exclude(id__in=exclude).only(
+        'id', 'question_id', 'selected_mask', 'answer_text', 'client_seq'
+    ))
+    positions = {}
+    for answer_id, question_id, position in Answer.objects.filter(
+        question_id__in=[student_answer.question_id for student_answer in changed]
+    ).values_list('id', 'question_id', 'position'):
+        positions[question_id, position] = answer_id
+    return [{
+        'student_answer_id': student_answer.id,
+        'seq': student_answer.client_seq,
+        'answer_ids': [
+            positions[student_answer.question_id, position] for position in mask_positions(student_answer.selected_mask)
+            if (student_answer.question_id, position) in positions
+        ],
+        'answer_text': student_answer.answer_text,
+    } for student_answer in changed]
+
+def process_answer(student_id, exam_result_id, data):
+    """
+    Сохраняет ответ студента (общая логика для HTTP и WebSocket).
+    Попытка, ответ и время проверяются по закэшированному состоянию попытки (attempt_state.py) без чтения базы.
+    """
+    state = get_attempt_state(exam_result_id)
+    try:
+        student_answer_id = int(data.get('student_answer_id'))
+    except (TypeError, ValueError):
+        student_answer_id = None
+    if not writable(state, student_id) or student_answer_id not in state['answers']:
+        return {'success': False, 'error': 'Ответ не найден'}
+
+    # Открыт ли экзамен и не истекло ли время попытки
+    error = time_error(state)
+    if error:
+        return {'success': False, 'error': error}
+
+    student_answer = StudentAnswer.objects.select_related('question').get(pk=student_answer_id)
+    return store_answer(
+        student_answer, data.get('answer_ids', []), data.get('answer_text', ''), data.get('seq')
+    )
+
+def store_answer(student_answer, answer_ids, answer_text, seq=None):
+    """
+    Записывает выбранные варианты (битовая маска) или текст ответа одним UPDATE и проверяет правильность.
+    seq — номер изменения ответа на странице: сохранение с номером не больше записанного устарело
+    (повтор или запоздавший запрос) и пропускается. Неизмененный ответ (тот же хэш) не перезаписывается.
+    """
+    content_hash = answer_content_hash(answer_ids, answer_text)
+    if seq is not None:
+        seq = int(seq)
+        if seq <= student_answer.client_seq:
+            return {'success': True, 'saved': False, 'seq': student_answer.client_seq}
+    answers = StudentAnswer.objects.filter(pk=student_answer.pk)
+    if seq is not None:
+        # Условие в самом UPDATE: из параллельных запросов запишется только более новый
+        answers = answers.filter(client_seq__lt=seq)
+
+    if content_hash == student_answer.content_hash:
+        if seq is not None:
+            # Студент вернул прежний ответ: запоздавшие изменения до него тоже устарели
+            answers.update(client_seq=seq)
+        return {'success': True, 'saved': False, 'seq': seq if seq is not None else student_answer.client_seq}
+
+    if student_answer.question.question_type in ['open', 'text']:
+        student_answer.answer_text = answer_text
+        student_answer.is_correct = None
+        student_answer.points_earned = None
+    else:
+        positions = Answer.objects.filter(
+            id__in=answer_ids, 
+            question_id=student_answer.question_id
+        ).values_list('position', flat=True) if answer_ids else []
+        student_answer.selected_mask = answers_mask(positions)
+        check_answer_correctness(student_answer)
+
+    fields = {
+        'selected_mask': student_answer.selected_mask,
+        'answer_text': student_answer.answer_text,
+        'is_correct': student_answer.is_correct,
+        'points_earned': student_answer.points_earned,
+        'answered_at': timezone.now(),
+        'content_hash': content_hash,
+    }
+    if seq is not None:
+        fields['client_seq'] = seq
+    # Строка попытки заблокирована до конца транзакции: версии ответов идут в порядке записи.
+    # Статус проверяется в самом UPDATE: состояние попытки в кэше могло устареть после завершения
+    attempt = ExamResult.objects.filter(pk=student_answer.exam_result_id)
+    with transaction.atomic(savepoint=False):
+        if not attempt.filter(status='in_progress').update(answers_version=F('answers_version') + 1):
+            forget_attempts([student_answer.exam_result_id])
+            return {'success': False, 'error': 'Попытка завершена'}
+        fields['version'] = Subquery(attempt.values('answers_version')[:1])
+        saved = answers.update(**fields) == 1
+    logger.info('Ответ сохранен', extra={
+        'event': 'save', 'attempt': student_answer.exam_result_id, 'student_answer': student_answer.pk,
+        'seq': seq, 'saved': saved,
+    })
+    return {'success': True, 'saved': saved, 'seq': seq if seq is not None else student_answer.client_seq}
+
 def check_answer_correctness(student_answer):
     """Проверка ответа"""
     question = student_answer.question
-    correct_answers = set(question.answers.filter(is_correct=True).values_list('id', flat=True))
-    selected_answers = set(student_answer.selected_answers.values_list('id', flat=True))
-    
     student_answer.is_correct = (
-        correct_answers == selected_answers and len(selected_answers) > 0
+        student_answer.selected_mask == question.correct_mask and student_answer.selected_mask != 0
     )
     
     if student_answer.is_correct:
+        # Экзамен — через попытку в том же запросе: попытку и экзамен отдельно не читаем
         exam_subject = ExamSubject.objects.filter(
-            exam=student_answer.exam_result.exam, 
-            subject=question.subject
+            exam__results=student_answer.exam_result_id,
+            subject_id=question.subject_id
         ).first()
         
         if exam_subject:
-            if question.difficulty == 'easy':
-                student_answer.points_earned = exam_subject.easy_points
-            elif question.difficulty == 'medium':
-                student_answer.points_earned = exam_subject.medium_points
-            else:
-                student_answer.points_earned = exam_subject.hard_points
+            student_answer.points_earned = exam_subject.points(question.difficulty)
     else:
         student_answer.points_earned = 0
 
@@ -306,11 +510,19 @@ def finish_exam(request, exam_result_id):
         finalize_exam(exam_result, "finished")
         return JsonResponse({'success': True})
     except Exception as e:
+        logger.exception('Ошибка завершения попытки', extra={'event': 'finish', 'attempt': exam_result_id})
         return JsonResponse({'success': False, 'error': str(e)})
 
 def finalize_exam(exam_result, status):
     """Финализирует экзамен"""
     with transaction.atomic():
+        # Блокируем попытку: уже завершенную повторно не пересчитываем и не учитываем в статистике
+        in_progress = ExamResult.objects.select_for_update().filter(
+            pk=exam_result.pk, status='in_progress'
+        ).exists()
+        if not in_progress:
+            return redirect('exam_result_detail', exam_result_id=exam_result.id)
+
         exam_result.end_time = timezone.now()
         exam_result.status = status
         exam_result.score = exam_result.student_answers.aggregate(
@@ -318,55 +530,84 @@ def finalize_exam(exam_result, status):
         )['total'] or 0
         
         # Расчет максимального балла
-        max_score = 0
-        for exam_subject in exam_result.exam.exam_subjects.all():
-            max_score += exam_subject.max_score()
-        exam_result.max_score = max_score
+        exam_result.max_score = exam_result.exam.max_score()
+        
+        # Разбор по предметам и сложности считается один раз: завершенная попытка не меняется
+        exam_result.breakdown = compute_breakdowns([exam_result.id])[exam_result.id]
         
         exam_result.save()
+        record_results([exam_result])
+    logger.info('Попытка завершена', extra={
+        'event': 'finish' if status == 'finished' else 'expire', 'attempt': exam_result.id,
+        'exam': exam_result.exam_id, 'student': exam_result.student_id, 'status': status,
+        'score': exam_result.score, 'max_score': exam_result.max_score,
+    })
     return redirect('exam_result_detail', exam_result_id=exam_result.id)
 
 # ----------------------
 # Результаты
 # ----------------------
 
+@replica_reads
 @student_required
+@condition(etag_func=exam_results_list_etag)
 def exam_results_list(request):
-    """Все экзамены студента"""
-    results = ExamResult.objects.filter(student=request.student).order_by('-start_time')
-    return render(request, 'exams/exam_results_list.html', {"results": results})
+    """Все экзамены студента (постранично по курсору)"""
+    cursor = decode_cursor(request.GET.get(CURSOR_VAR))
+    results, next_cursor = keyset_page(
+        with_percentage(ExamResult.objects.filter(student=request.student).select_related('exam')),
+        cursor,
+        settings.RESULTS_PER_PAGE,
+    )
+    return render(request, 'exams/exam_results_list.html', {
+        "results": results,
+        "is_first_page": cursor is None,
+        "next_cursor": next_cursor,
+    })
 
+@replica_reads
 @student_required
+@condition(etag_func=exam_result_detail_etag, last_modified_func=exam_result_detail_last_modified)
 def exam_result_detail(request, exam_result_id):
     """Детальный результат экзамена"""
     exam_result = get_object_or_404(ExamResult, id=exam_result_id, student=request.student)
     
     if exam_result.status == 'in_progress':
+        # Реплика могла еще не получить завершение попытки (через WebSocket cookie закрепления
+        # не ставится) — тогда вся страница читается с основной базы
+        with read_from_primary():
+            exam_result.refresh_from_db()
+            if exam_result.status != 'in_progress':
+                return render_result_detail(request, exam_result)
         return redirect('take_exam', exam_result_id=exam_result.id)
 
-    student_answers = exam_result.student_answers.select_related(
-        'question'
-    ).prefetch_related(
-        'question__answers', 
-        'selected_answers'
-    )
+    return render_result_detail(request, exam_result)
+
+def render_result_detail(request, exam_result):
+    # Ответы старых попыток читаются из архива
+    student_answers = load_answers(exam_result)
     
-    subject_stats = {}
-    for answer in student_answers:
-        subject = answer.question.subject.name if answer.question.subject else "Без предмета"
-        if subject not in subject_stats:
-            subject_stats[subject] = {'correct': 0, 'total': 0, 'points': 0}
-        
-        subject_stats[subject]['total'] += 1
-        if answer.is_correct:
-            subject_stats[subject]['correct'] += 1
-        subject_stats[subject]['points'] += answer.points_earned or 0
+    # Разбор сохранен при завершении; для старых результатов без backfill считаем на лету
+    breakdown = exam_result.breakdown or compute_breakdowns([exam_result.id])[exam_result.id]
 
-    return render(request, 'exams/exam_result_detail.html', {
+    response = render(request, 'exams/exam_result_detail.html', {
         'exam_result': exam_result,
         'student_answers': student_answers,
-        'subject_stats': subject_stats,
+        'subject_stats': breakdown['subjects'],
+        'difficulty_stats': difficulty_rows(breakdown),
     })
+    # Завершенная попытка не меняется: браузер может держать страницу у себя
+    patch_cache_control(response, private=True, max_age=settings.RESULT_PAGE_MAX_AGE)
+    return response
+
+def result_reports_response(request, results, filename):
+    """ZIP с ведомостями завершенных попыток из results (см. reports.py), отдается по мере готовности"""
+    chunks = zip_reports(results)
+    if isinstance(request, ASGIRequest):
+        chunks = async_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
 
 # ----------------------
 # Импорт из Excel
@@ -379,8 +620,9 @@ def import_students_view(request):
         return process_excel_import(request)
     
     recent_imports = StudentImport.objects.all()[:10]
-    return render(request, 'admin/import_students.html', {
-        'recent_imports': recent_imports
+    return render(request, 'exams/import_students.html', {
+        'recent_imports': recent_imports,
+        'courses': Course.objects.order_by('name'),
     })
 
 def process_excel_import(request):
@@ -394,54 +636,41 @@ def process_excel_import(request):
     )
     
     try:
-        # Читаем Excel файл
-        df = pd.read_excel(excel_file)
-        
-        # Проверяем наличие необходимых колонок
-        required_columns = ['student_id', 'first_name', 'last_name']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            raise ValueError(f"Отсутствуют колонки: {', '.join(missing_columns)}")
+        # Читаем Excel файл (проверяет и наличие необходимых колонок)
+        rows = read_students(excel_file)
         
         # Обрабатываем каждую строку
         students_created = 0
         students_updated = 0
+        imported_ids = []
         errors = []
         
-        for index, row in df.iterrows():
+        for line_number, row in rows:
             try:
-                student_id = str(row['student_id']).strip()
-                first_name = str(row['first_name']).strip()
-                last_name = str(row['last_name']).strip()
-                
-                if not all([student_id, first_name, last_name]):
-                    errors.append(f"Строка {index + 2}: Пустые обязательные поля")
+                if not all([row['student_id'], row['first_name'], row['last_name']]):
+                    errors.append(f"Строка {line_number}: Пустые обязательные поля")
                     continue
                 
-                # Дополнительные поля
-                group = str(row.get('group', '')).strip() if pd.notna(row.get('group')) else ''
-                email = str(row.get('email', '')).strip() if pd.notna(row.get('email')) else ''
-                
                 # Создаем или обновляем студента
                 student, created = Student.objects.update_or_create(
-                    student_id=student_id,
+                    student_id=row['student_id'],
                     defaults={
-                        'first_name': first_name,
-                        'last_name': last_name,
-                        'group': group,
-                        'email': email,
+                        'first_name': row['first_name'],
+                        'last_name': row['last_name'],
+                        'group': row['group'],
+                        'email': row['email'],
                         'is_active': True
                     }
                 )
                 
+                imported_ids.append(student.id)
                 if created:
                     students_created += 1
                 else:
                     students_updated += 1
                     
             except Exception as e:
-                errors.append(f"Строка {index + 2}: {str(e)}")
+                errors.append(f"Строка {line_number}: {str(e)}")
         
         # Обновляем запись об импорте
         student_import.students_count = students_created + students_updated
@@ -451,6 +680,10 @@ def process_excel_import(request):
             student_import.error_message = '\n'.join(errors[:10])  # Первые 10 ошибок
         
         student_import.save()
+        logger.info('Импорт студентов', extra={
+            'event': 'import', 'import': student_import.id, 'students_created': students_created,
+            'students_updated': students_updated, 'errors': len(errors), 'by': student_import.imported_by,
+        })
         
         # Сообщения пользователю
         if students_created or students_updated:
@@ -461,101 +694,106 @@ def process_excel_import(request):
             messages.warning(request, 
                 f"Обнаружено {len(errors)} ошибок. Проверьте детали импорта.")
         
+        # Запись импортированных студентов на выбранный курс
+        course = Course.objects.filter(pk=request.POST.get('course') or None).first()
+        if course and imported_ids:
+            enrolled = enroll_students(course, imported_ids)
+            messages.success(request, f"На курс «{course.name}» записано новых студентов: {enrolled}")
+        
     except Exception as e:
+        logger.exception('Ошибка импорта студентов', extra={'event': 'import', 'import': student_import.id})
         student_import.success = False
         student_import.error_message = str(e)
         student_import.save()
         messages.error(request, f"Ошибка при импорте: {str(e)}")
     
-    return redirect('import_students')
+    return redirect('admin:import_students')
 
 @login_required
 def export_students_template(request):
     """Экспорт шаблона Excel для импорта студентов"""
-    import io
-    from openpyxl import Workbook
-    from openpyxl.utils.dataframe import dataframe_to_rows
-    
-    # Создаем пример данных
-    sample_data = pd.DataFrame({
-        'student_id': ['STU001', 'STU002', 'STU003'],
-        'first_name': ['Иван', 'Мария', 'Петр'],
-        'last_name': ['Иванов', 'Петрова', 'Сидоров'],
-        'group': ['ИСТ-21', 'ИСТ-21', 'ИСТ-22'],
-        'email': ['ivan@example.com', 'maria@example.com', 'petr@example.com']
-    })
-    
-    # Создаем Excel файл
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Студенты"
-    
-    # Добавляем данные
-    for r in dataframe_to_rows(sample_data, index=False, header=True):
-        ws.append(r)
-    
-    # Настраиваем ширину колонок
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    # Подготавливаем ответ
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    response = HttpResponse(
-        output.read(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
+    response = HttpResponse(students_template(), content_type=XLSX_CONTENT_TYPE)
     response['Content-Disposition'] = 'attachment; filename="students_template.xlsx"'
     return response
 
 # ----------------------
-# Утилиты
+# Запись на курсы
 # ----------------------
 
-def get_random_questions(exam_subject):
-    """Случайные вопросы для экзамена"""
-    def random_subset(queryset, count):
-        ids = list(queryset.values_list('id', flat=True))
-        if not ids:
-            return []
-        return list(Question.objects.filter(id__in=random.sample(ids, min(len(ids), count))))
-
-    questions = []
-    subject = exam_subject.subject
-    
-    # Легкие вопросы
-    if exam_subject.easy_count > 0:
-        easy_questions = random_subset(
-            Question.objects.filter(subject=subject, difficulty='easy'), 
-            exam_subject.easy_count
-        )
-        questions.extend(easy_questions)
-    
-    # Средние вопросы
-    if exam_subject.medium_count > 0:
-        medium_questions = random_subset(
-            Question.objects.filter(subject=subject, difficulty='medium'), 
-            exam_subject.medium_count
-        )
-        questions.extend(medium_questions)
+@staff_member_required
+def enroll_students_view(request, course_id):
+    """Массовая запись студентов на курс: по группам и/или по списку из файла"""
+    course = get_object_or_404(Course, pk=course_id)
     
-    # Сложные вопросы
-    if exam_subject.hard_count > 0:
-        hard_questions = random_subset(
-            Question.objects.filter(subject=subject, difficulty='hard'), 
-            exam_subject.hard_count
-        )
-        questions.extend(hard_questions)
+    if request.method == 'POST':
+        groups = request.POST.getlist('groups')
+        roster = request.FILES.get('roster')
+        if not groups and not roster:
+            messages.error(request, 'Выберите группы или загрузите список студентов')
+            return redirect('admin:exams_course_enroll', course_id=course.id)
+        
+        try:
+            matched = created = 0
+            if groups:
+                result = enroll_groups(course, groups)
+                matched += result['matched']
+                created += result['created']
+            if roster:
+                result = enroll_roster(course, read_roster(roster))
+                matched += result['matched']
+                created += result['created']
+                if result['missing']:
+                    missing = result['missing']
+                    messages.warning(request, 
+                        f"Не найдено студентов: {len(missing)} ({', '.join(missing[:20])}{'…' if len(missing) > 20 else ''})")
+            messages.success(request, f"Найдено студентов: {matched}, записано новых: {created}")
+        except Exception as e:
+            messages.error(request, f"Ошибка при записи: {str(e)}")
+        return redirect('admin:exams_course_enroll', course_id=course.id)
+    
+    return render(request, 'exams/enroll_students.html', {
+        'course': course,
+        'groups': student_groups(),
+        'enrolled_count': CourseStudent.objects.filter(course=course).count(),
+    })
+
+# ----------------------
+# Проверка открытых ответов
+# ----------------------
+
+@staff_member_required
+def grading_queue_view(request):
+    """Очередь ручной проверки: вопросы с непроверенными ответами"""
+    return render(request, 'exams/grading_queue.html', {'questions': grading_queue()})
+
+@staff_member_required
+def grading_question_view(request, question_id):
+    """Непроверенные ответы вопроса постранично (по id); оценки страницы сохраняются одной пачкой"""
+    question = get_object_or_404(Question.objects.select_related('subject__course'), pk=question_id)
+    try:
+        after = int(request.GET.get('after') or 0)
+    except ValueError:
+        after = 0
     
-    return questions
\ No newline at end of file
+    if request.method == 'POST':
+        try:
+            grades = {
+                int(key[len('points_'):]): int(value)
+                for key, value in request.POST.items()
+                if key.startswith('points_') and value.strip()
+            }
+            graded = grade_answers(grades, request.user.get_username())
+            messages.success(request, f"Сохранено оценок: {graded}")
+        except ValueError as e:
+            messages.error(request, f"Оценки не сохранены: {str(e)}")
+        # Проверенные ответы уходят из очереди: та же страница покажет следующие
+        return redirect(f"{reverse('admin:exams_grading_question', args=[question.id])}?after={after}")
+    
+    answers, next_after = question_page(question, after)
+    return render(request, 'exams/grading_question.html', {
+        'question': question,
+        'answers': answers,
+        'after': after,
+        'next_after': next_after,
+        'remaining': ungraded_answers().filter(question=question).count(),
+    })
\ No newline at end of file
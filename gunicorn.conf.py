@@ -0,0 +1,53 @@
+# gunicorn.conf.py
+"""
+Продакшен-запуск на одной машине: `uv run gunicorn` из корня проекта (этот файл gunicorn читает сам).
+main.py остается для разработки (один процесс с автоперезагрузкой).
+
+Мастер один раз импортирует приложение (preload_app), воркеры uvicorn получают его через fork —
+быстрый старт и общая память под код. Кэш общий для воркеров (exam_system/cache.py), сессии и данные — в базе.
+
+Управление мастером:
+  kill -HUP <pid>   — плавная замена воркеров (текущие запросы дорабатывают до graceful_timeout);
+                      код приложения при preload_app не перечитывается
+  kill -USR2 <pid>, затем kill -QUIT <старый pid> — выкладка нового кода без простоя
+  kill -TTIN / -TTOU <pid> — добавить / убрать воркер (например, на время экзамена)
+Воркер перезапускается после max_requests запросов (со случайным сдвигом, чтобы не все сразу).
+Уходящий воркер uvicorn дорабатывает начатые запросы, но закрывает соединения, запрос из которых
+еще не прочитан: такие сохранения ответов страница экзамена повторяет сама (очередь ответов).
+
+Настройки из окружения: EXAM_BIND, EXAM_WORKERS (по умолчанию — по числу ядер), EXAM_MAX_REQUESTS,
+EXAM_GRACEFUL_TIMEOUT, EXAM_ACCESS_LOG (путь или '-' для stdout).
+"""
+import os
+
+wsgi_app = 'exam_system.asgi:application'
+worker_class = 'uvicorn_worker.UvicornWorker'
+bind = os.environ.get('EXAM_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('EXAM_WORKERS', os.cpu_count() or 1))
+preload_app = True
+
+max_requests = int(os.environ.get('EXAM_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+graceful_timeout = int(os.environ.get('EXAM_GRACEFUL_TIMEOUT', 30))
+timeout = 60
+keepalive = 5
+
+accesslog = os.environ.get('EXAM_ACCESS_LOG')
+errorlog = '-'
+
+
+def on_starting(server):
+    """В мастере до запуска воркеров: таблица общего кэша и закрытие соединений перед fork"""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'exam_system.settings')
+        django.setup()
+
+    from django.db import connections
+    from exam_system.cache import create_cache_tables
+
+    create_cache_tables()
+    # Соединение SQLite нельзя делить между процессами: каждый воркер откроет свое
+    connections.close_all()